@@ -3,11 +3,38 @@ from extensions import api, db
 from src.controllers.user import users
 from src.controllers.weights import weights
 from src.controllers.files import files
+from src.controllers.metrics import metrics
+from src.controllers.health import health
+from src.controllers.storage import storage
+from src.helpers.migration_utils import add_missing_columns, add_missing_indexes, run_data_migrations
+from src.helpers.warmup_utils import init_worker, start_warm_up
+from src.helpers.timing_utils import init_server_timing
+from src.helpers.upload_utils import init_uploads
+from src.helpers.json_utils import init_json
+from src.helpers.storage_utils import check_storage_backends
+from src.helpers.compression_utils import init_compression
 from flask_jwt_extended import JWTManager
 from flask_swagger_ui import get_swaggerui_blueprint
 from flask_cors import CORS
 from os import environ, urandom
 
+def get_bool_env(name : str, default : bool = False):
+    """
+    Gets a boolean from an environment variable.
+    
+    Parameters:
+        `name`: The name of the environment variable.
+        
+        `default`: The value used if the environment variable is not set.
+        
+    Returns:
+        `bool`: True if the value is `1`, `true`, `yes`, or `on`, otherwise False.
+    """
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 def create_app(*args, **kwargs):
     test_config = kwargs.get('test_config')
     app = Flask(__name__, instance_relative_config=True)
@@ -22,11 +49,68 @@ def create_app(*args, **kwargs):
             SUPABASE_BUCKET_FILES=environ.get('SUPABASE_BUCKET_FILES'),
             SUPABASE_BUCKET_WEIGHTS=environ.get('SUPABASE_BUCKET_WEIGHTS'),
             SUPABASE_BUCKET_PROFILE_IMAGES=environ.get('SUPABASE_BUCKET_PROFILE_IMAGES'),
+            STORAGE_BACKEND=environ.get('STORAGE_BACKEND', 'supabase'),
+            STORAGE_BACKEND_FILES=environ.get('STORAGE_BACKEND_FILES'),
+            STORAGE_BACKEND_WEIGHTS=environ.get('STORAGE_BACKEND_WEIGHTS'),
+            STORAGE_BACKEND_PROFILE_IMAGES=environ.get('STORAGE_BACKEND_PROFILE_IMAGES'),
+            STORAGE_LOCAL_ROOT=environ.get('STORAGE_LOCAL_ROOT', 'storage'),
+            STORAGE_LOCAL_MAX_AGE=environ.get('STORAGE_LOCAL_MAX_AGE', 3600),
+            STORAGE_PUBLIC_URL=environ.get('STORAGE_PUBLIC_URL'),
+            STORAGE_CONTENT_ADDRESSED=get_bool_env('STORAGE_CONTENT_ADDRESSED'),
+            STORAGE_MAX_CONNECTIONS=environ.get('STORAGE_MAX_CONNECTIONS', 20),
+            STORAGE_MAX_KEEPALIVE_CONNECTIONS=environ.get('STORAGE_MAX_KEEPALIVE_CONNECTIONS', 10),
+            STORAGE_KEEPALIVE_EXPIRY=environ.get('STORAGE_KEEPALIVE_EXPIRY', 30),
+            STORAGE_TIMEOUT=environ.get('STORAGE_TIMEOUT', 20),
+            STORAGE_CONNECT_TIMEOUT=environ.get('STORAGE_CONNECT_TIMEOUT', 5),
+            STORAGE_DELETE_CHUNK_SIZE=environ.get('STORAGE_DELETE_CHUNK_SIZE', 100),
             ROBOFLOW_PRIVATE_API_KEY=environ.get('ROBOFLOW_PRIVATE_API_KEY'),
             ROBOFLOW_PROJECT=environ.get('ROBOFLOW_PROJECT'),
+            MODEL_CACHE_SIZE=environ.get('MODEL_CACHE_SIZE', 8),
+            MODEL_CACHE_TTL=environ.get('MODEL_CACHE_TTL', 3600),
+            INFERENCE_BACKEND=environ.get('INFERENCE_BACKEND', 'roboflow'),
+            LOCAL_MODEL_PATH=environ.get('LOCAL_MODEL_PATH'),
+            LOCAL_INFERENCE_DEVICE=environ.get('LOCAL_INFERENCE_DEVICE', 'cpu'),
+            MODEL_INPUT_SIZE=environ.get('MODEL_INPUT_SIZE', 640),
+            ANNOTATION_PALETTE=environ.get('ANNOTATION_PALETTE', 'Good:green'),
+            ANNOTATION_DEFAULT_COLOR=environ.get('ANNOTATION_DEFAULT_COLOR', 'red'),
+            ANNOTATION_RENDERER=environ.get('ANNOTATION_RENDERER', 'opencv'),
+            ANNOTATION_LAZY=get_bool_env('ANNOTATION_LAZY'),
+            ANNOTATED_CACHE_SIZE=environ.get('ANNOTATED_CACHE_SIZE', 64),
+            ANNOTATED_CACHE_TTL=environ.get('ANNOTATED_CACHE_TTL', 600),
+            ANNOTATED_IMAGE_FORMAT=environ.get('ANNOTATED_IMAGE_FORMAT', 'JPEG'),
+            ANNOTATED_IMAGE_QUALITY=environ.get('ANNOTATED_IMAGE_QUALITY', 85),
+            ANNOTATED_IMAGE_COMPRESS_LEVEL=environ.get('ANNOTATED_IMAGE_COMPRESS_LEVEL', 6),
+            INFERENCE_BATCH_SIZE=environ.get('INFERENCE_BATCH_SIZE', 8),
+            INFERENCE_BATCH_WINDOW_MS=environ.get('INFERENCE_BATCH_WINDOW_MS', 20),
+            INFERENCE_BATCH_CONCURRENCY=environ.get('INFERENCE_BATCH_CONCURRENCY', 4),
+            ANALYZE_BATCH_MAX_ITEMS=environ.get('ANALYZE_BATCH_MAX_ITEMS', 50),
+            INFERENCE_CACHE_BACKEND=environ.get('INFERENCE_CACHE_BACKEND', 'memory'),
+            INFERENCE_CACHE_SIZE=environ.get('INFERENCE_CACHE_SIZE', 1024),
+            INFERENCE_CACHE_TTL=environ.get('INFERENCE_CACHE_TTL', 86400),
+            IO_CONCURRENCY=environ.get('IO_CONCURRENCY', 8),
+            IMAGE_DOWNLOAD_TIMEOUT=environ.get('IMAGE_DOWNLOAD_TIMEOUT', 20),
+            INFERENCE_TIMEOUT=environ.get('INFERENCE_TIMEOUT', 120),
+            ANALYSIS_WORKERS=environ.get('ANALYSIS_WORKERS', 2),
+            ANALYSIS_QUEUE_SIZE=environ.get('ANALYSIS_QUEUE_SIZE', 100),
+            ANALYSIS_JOB_TIMEOUT=environ.get('ANALYSIS_JOB_TIMEOUT', 300),
+            SERVER_TIMING_ENABLED=get_bool_env('SERVER_TIMING_ENABLED'),
+            WARMUP_ENABLED=get_bool_env('WARMUP_ENABLED', True),
+            WARMUP_ASYNC=get_bool_env('WARMUP_ASYNC'),
+            WARMUP_DUMMY_INFERENCE=get_bool_env('WARMUP_DUMMY_INFERENCE'),
+            PRELOAD_APP=get_bool_env('PRELOAD_APP'),
+            PAGE_SIZE_DEFAULT=environ.get('PAGE_SIZE_DEFAULT', 50),
+            PAGE_SIZE_MAX=environ.get('PAGE_SIZE_MAX', 200),
+            COMPRESSION_ENABLED=get_bool_env('COMPRESSION_ENABLED'),
+            COMPRESSION_MIN_SIZE=environ.get('COMPRESSION_MIN_SIZE', 1024),
+            COMPRESSION_LEVEL=environ.get('COMPRESSION_LEVEL', 6),
+            MAX_CONTENT_LENGTH=int(environ.get('UPLOAD_MAX_BYTES', 20 * 1024 * 1024)),
+            UPLOAD_SPOOL_MAX_MEMORY=environ.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024),
+            UPLOAD_MAX_FORM_MEMORY=environ.get('UPLOAD_MAX_FORM_MEMORY', 512 * 1024),
+            UPLOAD_TMP_DIR=environ.get('UPLOAD_TMP_DIR'),
         )
     else: 
         app.config.from_mapping(test_config)
+    check_storage_backends(app)
 
     try:
         db.app = app
@@ -34,13 +118,23 @@ def create_app(*args, **kwargs):
         db.init_app(app)
         with app.app_context():
             db.create_all()
-    except Exception as e:
-        print(e)
+            add_missing_columns()
+            add_missing_indexes()
+            run_data_migrations()
+    except Exception:
+        app.logger.exception('Failed to set up the database.')
 
     JWTManager(app)
+    init_server_timing(app)
+    init_uploads(app)
+    init_json(app)
+    init_compression(app)
     app.register_blueprint(users)
     app.register_blueprint(weights)
     app.register_blueprint(files)
+    app.register_blueprint(metrics)
+    app.register_blueprint(health)
+    app.register_blueprint(storage)
 
     SWAGGER_URL = '/swagger'
     API_URL = '../static/swagger.json'
@@ -54,6 +148,9 @@ def create_app(*args, **kwargs):
 
     app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
     CORS(app)
+    start_warm_up(app)
+    if not app.config.get('PRELOAD_APP'):
+        init_worker(app)
     return app
 
 def serve():
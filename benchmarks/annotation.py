@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of `AnnotationRenderer.render` on images with 1, 10, and 100 detections.
+
+Usage:
+    python -m benchmarks.annotation [--renderer pil] [--repeat 50] [--width 1920] [--height 1080]
+
+Each scenario is measured with the font cache warm, as in a running worker, and with the font cache cleared before
+every render, which is what every box used to pay for when the font was loaded per box.
+The `opencv` renderer draws on an RGB ndarray and has no font cache, so both of its rows are expected to match.
+"""
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+from numpy import zeros, uint8
+from PIL import Image
+from src.helpers.annotation_utils import ANNOTATION_RENDERERS, AnnotationRenderer, ArrayAnnotationRenderer, get_font
+
+DETECTION_COUNTS = (1, 10, 100)
+
+def generate_predictions(count : int, width : int, height : int, seed : int = 0):
+    random = Random(seed)
+    predictions = []
+    for _ in range(count):
+        box_width, box_height = random.uniform(20, width / 4), random.uniform(20, height / 4)
+        predictions.append({
+            'x': random.uniform(box_width / 2, width - box_width / 2),
+            'y': random.uniform(box_height / 2, height - box_height / 2),
+            'width': box_width,
+            'height': box_height,
+            'confidence': random.random(),
+            'class': random.choice(('Good', 'Bad')),
+            'class_id': 0
+        })
+    return predictions
+
+def measure(renderer : AnnotationRenderer, predictions : list[dict], width : int, height : int, repeat : int, cold_fonts : bool):
+    if isinstance(renderer, ArrayAnnotationRenderer):
+        image = zeros((height, width, 3), dtype=uint8)
+    else:
+        image = Image.new('RGB', (width, height))
+    elapsed = 0.0
+    for _ in range(repeat):
+        canvas = image.copy()
+        if cold_fonts:
+            get_font.cache_clear()
+        started_at = perf_counter()
+        renderer.render(canvas, predictions)
+        elapsed += perf_counter() - started_at
+    return elapsed / repeat * 1000
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renderer', choices=ANNOTATION_RENDERERS, default='pil')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    args = parser.parse_args()
+
+    renderer = ANNOTATION_RENDERERS[args.renderer]()
+    print(f"{'detections':>10} {'fonts':>6} {'ms/image':>10} {'us/box':>10}")
+    for count in DETECTION_COUNTS:
+        predictions = generate_predictions(count, args.width, args.height)
+        for cold_fonts in (True, False):
+            per_image = measure(renderer, predictions, args.width, args.height, args.repeat, cold_fonts)
+            print(f"{count:>10} {'cold' if cold_fonts else 'warm':>6} {per_image:>10.3f} {per_image / count * 1000:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+from os import environ
+
+bind = environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(environ.get('GUNICORN_WORKERS', 2))
+timeout = int(environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = environ.get('PRELOAD_APP', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def post_worker_init(worker):
+    """
+    Starts the background work of a forked worker, since the threads of the master process don't survive the fork.
+    
+    Parameters:
+        `worker`: The gunicorn worker whose `wsgi` is the Flask application.
+    """
+    if preload_app:
+        from src.helpers.warmup_utils import init_worker
+        init_worker(worker.wsgi)
@@ -1,12 +1,32 @@
-from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
-from flask import Blueprint, current_app, request, jsonify
-from src.helpers.file_utils import generate_hex, get_file, get_file_base_name, get_image_dimensions, get_image_size, convert_image_to_bytes
-from src.helpers.supabase_utils import delete_file_by_name, upload_file_to_bucket
-from src.helpers.roboflow_utils import perform_inference
+from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, HTTP_207_MULTI_STATUS, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT, HTTP_404_NOT_FOUND, HTTP_413_REQUEST_ENTITY_TOO_LARGE, HTTP_415_UNSUPPORTED_MEDIA_TYPE, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_503_SERVICE_UNAVAILABLE
+from flask import Blueprint, Response, current_app, request, jsonify
+from src.helpers.encoder_utils import encode_image, get_encoder_options, replace_extension
+from src.helpers.file_utils import IMAGE_HEADER_BYTES, ImageMeta, generate_hex, get_file_base_name
+from src.helpers.format_utils import format_dimensions, format_size
+from src.helpers.pagination_utils import get_page_size, paginate, parse_date
+from src.helpers.object_utils import collect_garbage, delete_files, store_file
+from src.helpers.supabase_utils import create_signed_upload_url, delete_files_by_name, get_file_path, get_file_url, get_file_url_by_name, read_file_header, upload_file_to_bucket
+from src.helpers.upload_utils import get_file_stream
+from src.helpers.roboflow_utils import perform_batch_inference, perform_inference, perform_inference_on_image
+from src.helpers.analysis_utils import analyze_file, get_annotated_url, render_annotated_file
+from src.helpers.concurrency_utils import map_concurrently
+from src.helpers.job_utils import get_job_details, submit_job
+from src.helpers.prediction_utils import pack_predictions
+from src.helpers.stats_utils import add_file_stats, get_file_stats
+from src.helpers.timing_utils import span
 from src.models.files import Files
+from src.models.jobs import Jobs
+from src.models.uploads import Uploads
+from src.models.weights import Weights
+from src.serializers.files import FILE_DETAILS, FILE_SCHEMA
 from extensions import db
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from uuid import uuid4
+from datetime import datetime
+from io import BytesIO
+from mimetypes import guess_type
+from re import fullmatch
+from werkzeug.utils import secure_filename
 from sqlalchemy.exc import SQLAlchemyError
 
 files = Blueprint("files", __name__, url_prefix="/api/v1/files")
@@ -18,103 +38,448 @@ def upload():
   
   Body:
     `Multipart-Form/Form-Data`: The multipart-form/form-data as a file with the key 'file'.
+    The file is spooled to the disk past `UPLOAD_SPOOL_MAX_MEMORY` and streamed to the bucket.
     
   Returns:
     `JSON Response (201)`: The response from the server with the file details: `url`, `name`, `dimensions`, and `size`.
     
     `JSON Response (400)`: If no file is uploaded.
     
+    `JSON Response (413)`: If the request is larger than `UPLOAD_MAX_BYTES`.
+    
+    `JSON Response (415)`: If the file is not an image.
+    
     `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
   """  
   if 'file' not in request.files:
     return jsonify({'error': 'No file found.'}), HTTP_400_BAD_REQUEST
   
-  file = get_file(request.files['file'])
+  file = get_file_stream(request.files['file'])
   file_name : str = file['name']
-  file_data : bytes = file['data']
-  supabase_response = upload_file_to_bucket("FILES", f"uploads/users/{generate_hex()}{file_name}", file_data)
+  file_meta = ImageMeta.from_stream(file['stream'], file['size'])
+  if file_meta.format is None:
+    return jsonify({'error': 'File is not an image.'}), HTTP_415_UNSUPPORTED_MEDIA_TYPE
+  
+  supabase_response = store_file(
+    "FILES", f"uploads/users/{generate_hex()}{file_name}", file['stream'], file_meta.content_type
+  )
   if type(supabase_response) is str:
     return jsonify({
-        'url': supabase_response,
+        'url': get_file_url_by_name("FILES", supabase_response),
         'name': file_name,
-        'dimensions': get_image_dimensions(file_data),
-        'size': get_image_size(file_data)
+        'dimensions': file_meta.dimensions,
+        'size': file_meta.size
     }), HTTP_201_CREATED
   else: return supabase_response
     
+@files.post('/upload-url')
+@jwt_required()
+def create_upload_url():
+  """
+  Creates a short-lived signed URL that the client uploads a file to, directly to the bucket instead of through the server.
+  The upload is recorded by `/api/v1/files/uploads/<id>/complete` once the file is written.
+  
+  Body:
+    `JSON Body`: The JSON body that contains the `name` of the file.
+    
+  Returns:
+    `JSON Response (201)`: The response from the server with the upload details: `id`, `path`, `upload_url`, `token`,
+    `expires_in`, `content_type`, and the `url` that the file will have.
+    
+    `JSON Response (400)`: If no file name is given, or if it is longer than 50 characters.
+    
+    `JSON Response (415)`: If the file name is not an image.
+    
+    `JSON Response (501)`: If the storage backend of the files can't sign upload URLs.
+    
+    `JSON Supabase Response`: If there is an error while signing the URL.
+  """
+  file_name = secure_filename((request.get_json(silent=True) or {}).get('name') or '')
+  if not file_name:
+    return jsonify({'error': 'No file name found.'}), HTTP_400_BAD_REQUEST
+  if len(file_name) > Uploads.name.type.length:
+    return jsonify({'error': f"File name is longer than {Uploads.name.type.length} characters."}), HTTP_400_BAD_REQUEST
+  content_type = guess_type(file_name)[0]
+  if content_type is None or not content_type.startswith('image/'):
+    return jsonify({'error': 'File is not an image.'}), HTTP_415_UNSUPPORTED_MEDIA_TYPE
+  
+  current_user = get_jwt_identity()
+  path = f"uploads/users/{current_user}/{generate_hex()}{file_name}"
+  signed_upload = create_signed_upload_url("FILES", path)
+  if type(signed_upload) is not dict:
+    return signed_upload
+  
+  try:
+    upload = Uploads(id=uuid4(), user_id=current_user, name=file_name, path=path)
+    db.session.add(upload)
+    db.session.commit()
+  except SQLAlchemyError as e:
+    db.session.rollback()
+    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  return jsonify({
+    'id': upload.id,
+    'path': path,
+    'url': get_file_url_by_name("FILES", path),
+    'content_type': content_type,
+    **signed_upload
+    }), HTTP_201_CREATED
+
+@files.post('/uploads/<uuid(strict=False):id>/complete')
+@jwt_required()
+def complete_upload(id):
+  """
+  Records an upload written to a signed upload URL. The size of the file is read from its metadata, and only its header
+  is downloaded to get its dimensions, so the image doesn't pass through the server. The SHA-256 hash of the file can be
+  given by the client, and is replaced by the hash of its content once the file is analyzed.
+  
+  Parameters:
+    `id`: The unique identifier of the upload from `/api/v1/files/upload-url`.
+    
+  Body:
+    `JSON Body`: The JSON body that optionally contains the `content_hash` of the file as a SHA-256 hex digest.
+    
+  Returns:
+    `JSON Response (200)`: The response from the server with the file details: `id`, `url`, `name`, `dimensions`, `size`,
+    and `content_hash`. An upload that was already completed returns the same details.
+    
+    `JSON Response (400)`: If the `content_hash` is not a SHA-256 hex digest.
+    
+    `JSON Response (404)`: If the upload is not found.
+    
+    `JSON Response (413)`: If the file is larger than `UPLOAD_MAX_BYTES`. The file is removed.
+    
+    `JSON Response (415)`: If the file is not an image. The file is removed.
+    
+    `JSON Supabase Response`: If the file can't be retrieved, e.g. if it wasn't uploaded yet.
+  """
+  upload = Uploads.query.filter_by(user_id=get_jwt_identity(), id=str(id)).first()
+  if not upload:
+    return jsonify({'message': 'Upload not found'}), HTTP_404_NOT_FOUND
+  
+  if upload.completed_at is None:
+    content_hash = str((request.get_json(silent=True) or {}).get('content_hash') or '').lower() or None
+    if content_hash is not None and not fullmatch('[0-9a-f]{64}', content_hash):
+      return jsonify({'error': 'The content hash is not a SHA-256 hex digest.'}), HTTP_400_BAD_REQUEST
+    
+    header = read_file_header("FILES", upload.path, IMAGE_HEADER_BYTES)
+    if type(header[0]) is not int:
+      return header
+    byte_size, data = header
+    max_bytes = int(current_app.config.get('MAX_CONTENT_LENGTH') or byte_size)
+    file_meta = ImageMeta.from_stream(BytesIO(data), byte_size) if byte_size <= max_bytes else None
+    if file_meta is None or file_meta.format is None:
+      delete_files_by_name("FILES", [upload.path])
+      db.session.delete(upload)
+      db.session.commit()
+      if file_meta is None:
+        return jsonify({'error': 'File is too large.', 'max_bytes': max_bytes}), HTTP_413_REQUEST_ENTITY_TOO_LARGE
+      return jsonify({'error': 'File is not an image.'}), HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    upload.width = file_meta.width
+    upload.height = file_meta.height
+    upload.byte_size = byte_size
+    upload.content_hash = content_hash
+    upload.completed_at = datetime.now()
+    try:
+      db.session.commit()
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  
+  return jsonify({
+    'id': upload.id,
+    'url': get_file_url_by_name("FILES", upload.path),
+    'name': upload.name,
+    'dimensions': format_dimensions(upload.width, upload.height),
+    'size': format_size(upload.byte_size),
+    'content_hash': upload.content_hash
+    }), HTTP_200_OK
+
 @files.post('/analyze')
 @jwt_required()
 def analyze():
   """
   Handles the analysis of the uploaded file using the custom weights of the user.
+  With the `async=1` query parameter, the analysis is queued as a job that can be polled through `/jobs/<id>`.
   
   Body:
-    `JSON Body`: The JSON body that contains: `url`, `api_key`, `project_name`, and `version_number`.
+    `JSON Body`: The JSON body that contains: `url`, `api_key`, `project_name`, `version`, and `weight_id`.
 
   Returns:
     `JSON Response (201)`: The response from the server with the file details: `id`, `name`, `dimensions`, `size`, `url`, `classification`, `accuracy`, and `error_rate`.
     
-    `JSON Response (400)`: If no file is uploaded.
+    `JSON Response (202)`: If the analysis was queued, with the job details: `id`, `type`, `state`, `status`, `result`, `created_at`, and `updated_at`.
+    
+    `JSON Response (400)`: If no file is uploaded, or if the `quality` or the `compress_level` is not an integer.
     
     `JSON Response (409)`: If the file already exists in the database.
     
     `JSON Response (500)`: If there is an SQLAlchemy error.
     
+    `JSON Response (503)`: If the job queue is full.
+    
     `JSON Roboflow Response`: If there is an error while performing inference in Roboflow.
     
     `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
   """  
-  uploaded_file_url = request.json['url']
-  if uploaded_file_url is None:
+  current_user = get_jwt_identity()
+  if request.args.get('async') not in ('1', 'true'):
+    return analyze_file(current_user, request.json)
+  
+  if request.json.get('url') is None:
     return jsonify({'error': 'No uploaded file found.'}), HTTP_400_BAD_REQUEST
+  try:
+    get_encoder_options(request.json)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  
+  try:
+    job = submit_job('analyze', current_user, request.json)
+  except SQLAlchemyError as e:
+    db.session.rollback()
+    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  if job is None:
+    return jsonify({'message': 'Too many pending analyses. Try again later.'}), HTTP_503_SERVICE_UNAVAILABLE
+  
+  return jsonify(get_job_details(job)), HTTP_202_ACCEPTED
+
+@files.get('/jobs/<uuid(strict=False):id>')
+@jwt_required()
+def get_job(id):
+  """
+  Retrieves an analysis job by its id of the current user.
+  
+  Parameters:
+    `id`: The unique identifier of the job returned by `/analyze?async=1`.
+    
+  Returns:
+    `JSON Response (200)`: The response from the server with the job details: `id`, `type`, `state`, `status`,
+    `result`, `created_at`, and `updated_at`. The `result` is the response of `/analyze` once the job is done.
+    
+    `JSON Response (404)`: If the job is not found.
+  """
+  job = Jobs.query.filter_by(user_id=get_jwt_identity(), id=str(id)).first()
+  if not job:
+    return jsonify({'message': 'Job not found'}), HTTP_404_NOT_FOUND
+  
+  return jsonify(get_job_details(job)), HTTP_200_OK
+ 
+@files.post('/upload-and-analyze')
+@jwt_required()
+def upload_and_analyze():
+  """
+  Handles the uploaded file and its analysis in a single request using the custom weights of the user.
+  The image is predicted straight from the spooled upload, then the original and the result are uploaded concurrently.
+  
+  Body:
+    `Multipart-Form/Form-Data`: The multipart-form/form-data as a file with the key 'file' and the `weight_id`, and
+    optionally the `format`, `quality`, and `compress_level` of the result.
+    The file is spooled to the disk past `UPLOAD_SPOOL_MAX_MEMORY` and streamed to the bucket.
+    
+  Returns:
+    `JSON Response (201)`: The response from the server with the file details: `id`, `name`, `dimensions`, `size`, `url`, 
+    `original_url`, `annotated_url`, `classification`, `accuracy`, `error_rate`, and `encoding`.
+    
+    `JSON Response (400)`: If no file is uploaded, or if the `quality` or the `compress_level` is not an integer.
+    
+    `JSON Response (404)`: If the weights is not found.
+    
+    `JSON Response (413)`: If the request is larger than `UPLOAD_MAX_BYTES`.
+    
+    `JSON Response (415)`: If the file is not an image.
+    
+    `JSON Response (500)`: If there is an SQLAlchemy error.
+    
+    `JSON Roboflow Response`: If there is an error while performing inference in Roboflow.
+    
+    `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
+  """
+  if 'file' not in request.files:
+    return jsonify({'error': 'No file found.'}), HTTP_400_BAD_REQUEST
+  try:
+    encoder_options = get_encoder_options(request.form)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
   
   current_user = get_jwt_identity()
-  uploaded_file_name = get_file_base_name(uploaded_file_url)
-  existing_file = Files.query.filter_by(name=uploaded_file_name, user_id=current_user).first()
-  if existing_file:
-    return jsonify({'error': 'File already exists.', 'url': existing_file.url}), HTTP_409_CONFLICT
-  
-  project_name = request.json['project_name']
-  api_key = request.json['api_key']
-  version = request.json['version']
-  weight_id = request.json['weight_id']
-  result = perform_inference(image_url=uploaded_file_url, project_name=project_name, api_key=api_key, version_number=version)
+  weight = Weights.query.filter_by(user_id=current_user, id=str(request.form.get('weight_id'))).first()
+  if not weight:
+    return jsonify({'message': 'No weights found.'}), HTTP_404_NOT_FOUND
+  
+  file = get_file_stream(request.files['file'])
+  file_name : str = file['name']
+  file_meta = ImageMeta.from_stream(file['stream'], file['size'])
+  if file_meta.format is None:
+    return jsonify({'error': 'File is not an image.'}), HTTP_415_UNSUPPORTED_MEDIA_TYPE
+  
+  result = perform_inference_on_image(file_meta, weight.api_key, weight.project_name, weight.version)
   if type(result) is not dict:
     return result
   
-  result_data = convert_image_to_bytes(result['image'])
-  new_file_name = generate_hex() + uploaded_file_name
-  supabase_response = upload_file_to_bucket("FILES", f"main/{current_user}/{new_file_name}",result_data)
-  if type(supabase_response) is str:
-    try:
-      file = Files(
-          id=uuid4(),
-          name=new_file_name, 
-          user_id=current_user, 
-          classification=result['classification'], 
-          accuracy=result['accuracy'],  
-          error_rate=result['error_rate'], 
-          dimensions=get_image_dimensions(result_data), 
-          size=get_image_size(result_data),
-          url=supabase_response,
-          weight_id=weight_id
-        )
+  encoded_result = encode_image(result['image'], **encoder_options)
+  result_meta = ImageMeta.from_image(result['image'], encoded_result.data, encoded_result.format)
+  result_data = encoded_result.data
+  original_file_name = generate_hex() + file_name
+  new_file_name = replace_extension(original_file_name, encoded_result.extension)
+  original_response, supabase_response = map_concurrently(lambda upload: upload_file_to_bucket("FILES", *upload), [
+    (f"uploads/users/{original_file_name}", file['stream'], file_meta.content_type),
+    (f"main/{current_user}/{new_file_name}", result_data, encoded_result.content_type)
+  ])
+  if type(original_response) is not str:
+    return original_response
+  if type(supabase_response) is not str:
+    return supabase_response
+  
+  try:
+    file = Files(
+        id=uuid4(),
+        name=new_file_name, 
+        user_id=current_user, 
+        classification=result['classification'], 
+        confidence=result['confidence'],
+        width=result_meta.width,
+        height=result_meta.height,
+        byte_size=result_meta.byte_size,
+        url=supabase_response,
+        source_url=original_response,
+        predictions=pack_predictions(result['predictions']),
+        weight_id=weight.id
+      )
+    with span('db_commit'):
       db.session.add(file)
+      add_file_stats([file])
       db.session.commit()
-      return jsonify({
-        'id': file.id,
-        'name': file.name,
-        'dimensions': file.dimensions,
-        'size': file.size,
-        'url': file.url,
-        'classification': file.classification,
-        'accuracy': file.accuracy,
-        'error_rate': file.error_rate
-        }), HTTP_201_CREATED
-    except SQLAlchemyError as e:
-      db.session.rollback()
-      return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
-  else: return supabase_response
+    return jsonify({
+      **FILE_SCHEMA.dump(file, FILE_DETAILS),
+      'original_url': get_file_url("FILES", file.source_url),
+      'annotated_url': get_annotated_url(file.id),
+      'encoding': encoded_result.get_details()
+      }), HTTP_201_CREATED
+  except SQLAlchemyError as e:
+    db.session.rollback()
+    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+
+@files.post('/analyze/batch')
+@jwt_required()
+def analyze_batch():
+  """
+  Handles the analysis of several uploaded files at once using the custom weights of the user.
+  The images are downloaded, predicted in micro-batches, and uploaded concurrently, then saved in a single transaction.
+  
+  Body:
+    `JSON Body`: The JSON body that contains the `items` as a list of objects with the `url` and `weight_id`, and
+    optionally the `format`, `quality`, and `compress_level` of the results.
+    
+  Returns:
+    `JSON Response (201)`: The response from the server with the `data` of each item: `index`, `url`, `status`, and either
+    the file details like `/analyze` or the `error`.
+    
+    `JSON Response (207)`: If some of the items failed.
+    
+    `JSON Response (400)`: If no items are given, or if the `quality` or the `compress_level` is not an integer.
+    
+    `JSON Response (413)`: If there are more items than `ANALYZE_BATCH_MAX_ITEMS`.
+    
+    `JSON Response (500)`: If there is an SQLAlchemy error.
+  """
+  items = request.json.get('items')
+  if not items or type(items) is not list:
+    return jsonify({'error': 'No uploaded files found.'}), HTTP_400_BAD_REQUEST
+  
+  max_items = int(current_app.config.get('ANALYZE_BATCH_MAX_ITEMS') or 50)
+  if len(items) > max_items:
+    return jsonify({'error': f'A batch can only contain up to {max_items} files.'}), HTTP_413_REQUEST_ENTITY_TOO_LARGE
+  
+  try:
+    encoder_options = get_encoder_options(request.json)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  
+  current_user = get_jwt_identity()
+  responses = [{'index': index, 'url': item.get('url')} for index, item in enumerate(items)]
+  weight_ids = {str(item.get('weight_id')) for item in items}
+  weights = {weight.id: weight for weight in Weights.query.filter(Weights.user_id == current_user, Weights.id.in_(weight_ids))}
+  names = {get_file_base_name(item['url']) for item in items if item.get('url')}
+  existing_files = dict(
+    Files.query.with_entities(Files.name, Files.url).filter(Files.user_id == current_user, Files.name.in_(names))
+  )
+  
+  pending = []
+  for response, item in zip(responses, items):
+    weight = weights.get(str(item.get('weight_id')))
+    if not item.get('url'):
+      response.update({'status': HTTP_400_BAD_REQUEST, 'error': 'No uploaded file found.'})
+    elif not weight:
+      response.update({'status': HTTP_404_NOT_FOUND, 'error': 'No weights found.'})
+    elif get_file_base_name(item['url']) in existing_files:
+      response.update({
+        'status': HTTP_409_CONFLICT, 'error': 'File already exists.',
+        'url': get_file_url("FILES", existing_files[get_file_base_name(item['url'])])
+      })
+    else:
+      pending.append((response, weight))
+  
+  results = perform_batch_inference([
+    {'url': response['url'], 'api_key': weight.api_key, 'project_name': weight.project_name, 'version': weight.version}
+    for response, weight in pending
+  ])
+  
+  analyzed = []
+  for (response, weight), result in zip(pending, results):
+    if type(result) is not dict:
+      error, status = result
+      response.update({'status': status, **error.get_json()})
+      continue
+    encoded_result = encode_image(result['image'], **encoder_options)
+    new_file_name = generate_hex() + replace_extension(get_file_base_name(response['url']), encoded_result.extension)
+    analyzed.append((response, weight, result, new_file_name, encoded_result))
+  
+  supabase_responses = map_concurrently(
+    lambda entry: upload_file_to_bucket("FILES", f"main/{current_user}/{entry[3]}", entry[4].data, entry[4].content_type),
+    analyzed
+  )
+  
+  new_files = []
+  for (response, weight, result, new_file_name, encoded_result), supabase_response in zip(analyzed, supabase_responses):
+    result_meta = ImageMeta.from_image(result['image'], encoded_result.data, encoded_result.format)
+    if type(supabase_response) is not str:
+      error, status = supabase_response
+      response.update({'status': status, **error.get_json()})
+      continue
+    file = Files(
+        id=uuid4(),
+        name=new_file_name, 
+        user_id=current_user, 
+        classification=result['classification'], 
+        confidence=result['confidence'],
+        width=result_meta.width,
+        height=result_meta.height,
+        byte_size=result_meta.byte_size,
+        url=supabase_response,
+        source_url=get_file_path("FILES", response['url']),
+        predictions=pack_predictions(result['predictions']),
+        weight_id=weight.id
+      )
+    response['encoding'] = encoded_result.get_details()
+    new_files.append((response, file))
+  
+  try:
+    with span('db_commit'):
+      db.session.add_all([file for _, file in new_files])
+      add_file_stats([file for _, file in new_files])
+      db.session.commit()
+  except SQLAlchemyError as e:
+    db.session.rollback()
+    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  
+  for response, file in new_files:
+    response.update({
+      'status': HTTP_201_CREATED,
+      **FILE_SCHEMA.dump(file, FILE_DETAILS),
+      'annotated_url': get_annotated_url(file.id)
+      })
+  
+  status = HTTP_201_CREATED if len(new_files) == len(items) else HTTP_207_MULTI_STATUS
+  return jsonify({'data': responses}), status
  
 @files.post('/demo')
 def demo():
@@ -122,12 +487,12 @@ def demo():
   Handles the analysis of the uploaded file using the pre-defined weights of the application.
   
   Body:
-    `JSON Body`: The JSON body that contains the `url` attribute only.
+    `JSON Body`: The JSON body that contains the `url`, and optionally the `format`, `quality`, and `compress_level` of the result.
     
   Returns:
-    `JSON Response (201)`: The response from the server with the file details: `url`, `classification`, `accuracy`, and `error_rate`.
+    `JSON Response (201)`: The response from the server with the file details: `url`, `classification`, `accuracy`, `error_rate`, and `encoding`.
     
-    `JSON Response (400)`: If no file is uploaded.
+    `JSON Response (400)`: If no file is uploaded, or if the `quality` or the `compress_level` is not an integer.
     
     `JSON Roboflow Response`: If there is an error while performing inference in Roboflow.
     
@@ -136,20 +501,27 @@ def demo():
   uploaded_file_url = request.json['url']
   if uploaded_file_url is None:
     return jsonify({'error': 'No uploaded file found.'}), HTTP_400_BAD_REQUEST
+  try:
+    encoder_options = get_encoder_options(request.json)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
   
   result = perform_inference(uploaded_file_url)
   if type(result) is not dict:
     return result
   
-  supabase_response = upload_file_to_bucket(
-      "FILES", f"demos/{generate_hex()}{get_file_base_name(uploaded_file_url)}", convert_image_to_bytes(result['image'])
+  encoded_result = encode_image(result['image'], **encoder_options)
+  supabase_response = store_file(
+      "FILES", f"demos/{generate_hex()}{replace_extension(get_file_base_name(uploaded_file_url), encoded_result.extension)}",
+      encoded_result.data, encoded_result.content_type
     )
   if type(supabase_response) is str:
     return jsonify({
-      'url': supabase_response,
+      'url': get_file_url_by_name("FILES", supabase_response),
       'classification': result['classification'],
       'accuracy': result['accuracy'],
       'error_rate': result['error_rate'],
+      'encoding': encoded_result.get_details()
       }), HTTP_201_CREATED
   else: return supabase_response
     
@@ -157,34 +529,82 @@ def demo():
 @jwt_required()
 def get_all():
   """
-  Retrieves files of the current user.
+  Retrieves files of the current user, from the newest, one page at a time.
   
+  Query Parameters:
+    `limit`: The size of the page, up to `PAGE_SIZE_MAX`. Defaults to `PAGE_SIZE_DEFAULT`.
+    
+    `cursor`: The `next_cursor` of the previous page.
+    
+    `classification`, `weight_id`: Only the files with this classification or weights.
+    
+    `created_after`, `created_before`: Only the files created in this range, as ISO 8601 dates.
+    
+    `fields`: The comma-separated fields to be returned. Only their columns are selected.
+    
   Returns: 
     `JSON Response (200)`: The response from the server with the list of file and its 
-    details: `id`, `name`, `dimensions`, `size`, `url`, `classification`, `accuracy`, `error_rate`, `created_at`, and `updated_at`.
+    details: `id`, `name`, `dimensions`, `size`, `url`, `classification`, `accuracy`, `error_rate`, `weight_id`, `created_at`,
+    and `updated_at`, and the `next_cursor`, which is none on the last page.
     
     `JSON Response (204)`: If there are no files found.
+    
+    `JSON Response (400)`: If a query parameter is invalid.
   """
-  files = Files.query.filter_by(user_id=get_jwt_identity())
-  if not files:
+  query = Files.query.filter(Files.user_id == get_jwt_identity())
+  try:
+    if request.args.get('classification'):
+      query = query.filter(Files.classification == request.args['classification'])
+    if request.args.get('weight_id'):
+      query = query.filter(Files.weight_id == request.args['weight_id'])
+    created_after = parse_date(request.args.get('created_after'))
+    if created_after:
+      query = query.filter(Files.created_at >= created_after)
+    created_before = parse_date(request.args.get('created_before'))
+    if created_before:
+      query = query.filter(Files.created_at < created_before)
+    names = FILE_SCHEMA.parse_fields(request.args.get('fields'))
+    data, next_cursor = paginate(
+      query, FILE_SCHEMA, names, Files.created_at, Files.id, request.args.get('cursor'), get_page_size(request.args.get('limit'))
+    )
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  
+  if not data and not request.args.get('cursor'):
     return jsonify({'message': 'No files found'}), HTTP_204_NO_CONTENT
+  return jsonify({'data': data, 'next_cursor': next_cursor}), HTTP_200_OK
+
+@files.get('/stats')
+@jwt_required()
+def get_stats():
+  """
+  Retrieves the statistics of the files of the current user from the `file_stats` summary table, which the analysis and
+  delete endpoints update in the transactions that save and delete the files.
   
-  data=[]
-  for file in files:
-    data.append({
-      'id': file.id,
-      'name': file.name,
-      'dimensions': file.dimensions,
-      'size': file.size,
-      'url': file.url,
-      'classification': file.classification,
-      'accuracy': file.accuracy,
-      'error_rate': file.error_rate,
-      'created_at': file.created_at,
-      'updated_at': file.updated_at
-      })
+  Query Parameters:
+    `weight_id`: Only the files analyzed with these weights.
+    
+    `created_after`, `created_before`: Only the files created in this range of days, as ISO 8601 dates.
+    
+  Returns:
+    `JSON Response (200)`: The response from the server with the statistics: the `total` number of files, the count of
+    each of their `classifications`, the `count`, `mean_confidence`, and `p50`, `p90`, and `p99` confidence of each of their
+    `weights`, and their daily `volumes`.
+    
+    `JSON Response (400)`: If a query parameter is invalid.
+  """
+  try:
+    created_after = parse_date(request.args.get('created_after'))
+    created_before = parse_date(request.args.get('created_before'))
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
   
-  return jsonify({'data': data}), HTTP_200_OK
+  return jsonify(get_file_stats(
+    get_jwt_identity(),
+    weight_id=request.args.get('weight_id'),
+    start_day=created_after.date() if created_after else None,
+    end_day=created_before.date() if created_before else None
+    )), HTTP_200_OK
 
 @files.get('/<uuid(strict=False):id>')
 @jwt_required()
@@ -197,26 +617,66 @@ def get_by_id(id):
     
   Returns:
     `JSON Response (200)`: The response from the server with the file details: `id`, `name`, `dimensions`, 
-    `size`, `url`, `classification`, `accuracy`, `error_rate`, `created_at`, and `updated_at`.
+    `size`, `url`, `classification`, `accuracy`, `error_rate`, `weight_id`, `created_at`, and `updated_at`,
+    or only the comma-separated `fields` of the query.
+    
+    `JSON Response (400)`: If a requested field is unknown.
     
     `JSON Response (404)`: If the file is not found.
   """
+  try:
+    names = FILE_SCHEMA.parse_fields(request.args.get('fields'))
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  
+  file = FILE_SCHEMA.select(Files.query.filter_by(user_id=get_jwt_identity(), id=str(id)), names).first()
+  if not file:
+    return jsonify({'message': 'File not found'}), HTTP_404_NOT_FOUND
+  
+  return jsonify(FILE_SCHEMA.dump(file, names)), HTTP_200_OK
+
+@files.get('/<uuid(strict=False):id>/annotated')
+@jwt_required()
+def get_annotated(id):
+  """
+  Renders the stored predictions of a file on its original image. The renderings are cached per file and encoder options,
+  up to `ANNOTATED_CACHE_SIZE` for `ANNOTATED_CACHE_TTL` seconds, so re-rendering in another style doesn't re-run the model.
+  
+  Parameters:
+    `id`: The unique identifier of the file that the user wants to render.
+    
+    `Query Parameters`: Optionally the `format`, `quality`, and `compress_level` of the rendering.
+    
+  Returns:
+    `Image Response (200)`: The annotated image. A request whose `If-None-Match` matches gets `304` instead.
+    
+    `JSON Response (400)`: If the `quality` or the `compress_level` is not an integer.
+    
+    `JSON Response (404)`: If the file is not found or was analyzed before its predictions were saved.
+    
+    `JSON Response (422)`: If the original image can't be decoded.
+    
+    `JSON Response`: If the original image can't be retrieved.
+  """
   file = Files.query.filter_by(user_id=get_jwt_identity(), id=str(id)).first()
   if not file:
     return jsonify({'message': 'File not found'}), HTTP_404_NOT_FOUND
+  if not file.predictions or not file.source_url:
+    return jsonify({'message': 'No predictions were saved for this file.'}), HTTP_404_NOT_FOUND
   
-  return jsonify({
-    'id': file.id,
-    'name': file.name,
-    'dimensions': file.dimensions,
-    'size': file.size,
-    'url': file.url,
-    'classification': file.classification,
-    'accuracy': file.accuracy,
-    'error_rate': file.error_rate,
-    'created_at': file.created_at,
-    'updated_at': file.updated_at
-    }), HTTP_200_OK
+  try:
+    encoder_options = get_encoder_options(request.args)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  encoded_result = render_annotated_file(file, encoder_options)
+  if type(encoded_result) is tuple:
+    return encoded_result
+  
+  response = Response(encoded_result.data, mimetype=encoded_result.content_type)
+  response.set_etag(f"{file.id}-{encoder_options['format']}-{encoder_options['quality']}-{encoder_options['compress_level']}")
+  response.cache_control.private = True
+  response.cache_control.max_age = int(current_app.config.get('ANNOTATED_CACHE_TTL') or 600)
+  return response.make_conditional(request)
 
 @files.delete('/<uuid(strict=False):id>/delete')
 @jwt_required()
@@ -230,6 +690,9 @@ def delete_by_id(id):
   Returns:
     `JSON Response (200)`: The response from the server with the successful `message`.
     
+    `JSON Response (207)`: If the file was deleted but its stored file failed to be removed, with the `failed` file and
+    its `error`. The stored file is removed by a later deletion.
+    
     `JSON Response (404)`: If the file is not found.
     
     `JSON Response (500)`: If there is an SQLAlchemy error.
@@ -239,47 +702,48 @@ def delete_by_id(id):
   if not file:
     return jsonify({'message': 'File not found'}), HTTP_404_NOT_FOUND
   
-  supabase_response = delete_file_by_name("FILES", f"main/{current_user}/{file.name}")
-  if supabase_response != HTTP_200_OK:
-    return supabase_response
   try:
-    db.session.delete(file)
+    _, released = delete_files(db.session.query(Files).filter(Files.id == file.id))
     db.session.commit()
-    return jsonify({'message': 'File successfully deleted'}), HTTP_200_OK
   except SQLAlchemyError as e:
     db.session.rollback()
     return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  
+  failed = collect_garbage("FILES", released)
+  if failed:
+    return jsonify({'message': 'File deleted, but its stored file failed to be removed', 'failed': failed}), HTTP_207_MULTI_STATUS
+  return jsonify({'message': 'File successfully deleted'}), HTTP_200_OK
 
 @files.delete('/clear')
 @jwt_required()
 def delete_all():
   """
-  Deletes all the files of current user's identity.
-
-  Parameters:
-    `id`: The unique identifier of the file that the user wants to delete.
+  Deletes all the files of current user's identity. The rows of the files are deleted in a single statement, then
+  the stored files that no other file references are removed in concurrent batches.
 
   Returns:
-    `JSON Response (200)`: The response from the server with the successful `message`.
+    `JSON Response (200)`: The response from the server with the successful `message` and the `deleted` count.
+    
+    `JSON Response (207)`: If some stored files failed to be removed, with the `failed` files and their `error`.
+    They are removed by a later deletion.
     
     `JSON Response (404)`: If the file is not found.
     
     `JSON Response (500)`: If there is an SQLAlchemy error.
   """
   current_user = get_jwt_identity()
-  files = Files.query.filter_by(user_id=current_user)
-  if not files:
+  query = db.session.query(Files).filter(Files.user_id == current_user)
+  if not query.first():
     return jsonify({'message': 'File not found'}), HTTP_404_NOT_FOUND
   
-  for file in files:
-    supabase_response = delete_file_by_name("FILES", f"main/{current_user}/{file.name}")
-    if supabase_response != HTTP_200_OK:
-      return supabase_response
-  
   try:
-    db.session.query(Files).filter_by(user_id=current_user).delete()
+    deleted, released = delete_files(query)
     db.session.commit()
-    return jsonify({'message': 'File successfully deleted'}), HTTP_200_OK
   except SQLAlchemyError as e:
     db.session.rollback()
-    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
\ No newline at end of file
+    return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  
+  failed = collect_garbage("FILES", released)
+  if failed:
+    return jsonify({'message': 'Some files failed to be deleted', 'deleted': deleted, 'failed': failed}), HTTP_207_MULTI_STATUS
+  return jsonify({'message': 'File successfully deleted', 'deleted': deleted}), HTTP_200_OK
@@ -0,0 +1,27 @@
+from src.constants.status_codes import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
+from flask import Blueprint, jsonify
+from src.helpers.warmup_utils import get_warm_up_state, is_ready
+
+health = Blueprint("health", __name__, url_prefix="/api/v1/health")
+
+@health.get('/live')
+def live():
+    """
+    Checks if the worker process is alive.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the `status`.
+    """
+    return jsonify({'status': 'alive'}), HTTP_200_OK
+
+@health.get('/ready')
+def ready():
+    """
+    Checks if the worker process has finished its warm-up and can serve requests without latency spikes.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the warm-up details: `state`, `started_at`, `finished_at`, and `steps`.
+
+        `JSON Response (503)`: If the warm-up hasn't finished yet.
+    """
+    return jsonify(get_warm_up_state()), HTTP_200_OK if is_ready() else HTTP_503_SERVICE_UNAVAILABLE
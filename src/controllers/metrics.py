@@ -0,0 +1,83 @@
+from src.constants.status_codes import HTTP_200_OK
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+from src.helpers.analysis_utils import get_annotated_cache
+from src.helpers.batch_utils import get_micro_batcher
+from src.helpers.result_cache_utils import get_result_cache
+from src.helpers.roboflow_utils import get_model_cache
+from src.helpers.storage_utils import get_storage_client
+from src.helpers.timing_utils import stage_histograms
+
+metrics = Blueprint("metrics", __name__, url_prefix="/api/v1/metrics")
+
+@metrics.get('/models')
+@jwt_required()
+def get_model_cache_stats():
+    """
+    Retrieves the counters of the process-wide model handle registry.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the registry details: `size`, `max_size`, `ttl`,
+        `hits`, `misses`, `evictions`, and `hit_rate`.
+    """
+    return jsonify(get_model_cache().stats()), HTTP_200_OK
+
+@metrics.get('/batches')
+@jwt_required()
+def get_micro_batcher_stats():
+    """
+    Retrieves the counters of the inference micro-batcher.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the batcher details: `batches`, `items`,
+        `average_batch_size`, `queued`, `max_batch_size`, and `max_wait`.
+    """
+    return jsonify(get_micro_batcher().stats()), HTTP_200_OK
+
+@metrics.get('/results')
+@jwt_required()
+def get_result_cache_stats():
+    """
+    Retrieves the counters of the inference result cache.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the cache details: `backend`, `size`, `max_size`, `ttl`,
+        `hits`, `misses`, and `hit_rate`.
+    """
+    return jsonify(get_result_cache().stats()), HTTP_200_OK
+
+@metrics.get('/annotations')
+@jwt_required()
+def get_annotated_cache_stats():
+    """
+    Retrieves the counters of the cache of the files rendered by `/api/v1/files/<id>/annotated`.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the cache details: `size`, `max_size`, `ttl`,
+        `hits`, `misses`, `evictions`, and `hit_rate`.
+    """
+    return jsonify(get_annotated_cache().stats()), HTTP_200_OK
+
+@metrics.get('/storage')
+@jwt_required()
+def get_storage_client_stats():
+    """
+    Retrieves the counters of the pooled storage client of the process.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the client details: `requests`, `errors`, `average_ms`,
+        `connections`, `idle_connections`, `max_connections`, and `max_keepalive_connections`.
+    """
+    return jsonify(get_storage_client().stats()), HTTP_200_OK
+
+@metrics.get('/timings')
+@jwt_required()
+def get_stage_timings():
+    """
+    Retrieves the latency histograms of the pipeline stages recorded while `SERVER_TIMING_ENABLED` is on.
+
+    Returns:
+        `JSON Response (200)`: The response from the server with the details of each stage: `count`, `mean_ms`, `max_ms`,
+        `p50_ms`, `p95_ms`, `p99_ms`, and `buckets`.
+    """
+    return jsonify(stage_histograms.stats()), HTTP_200_OK
@@ -0,0 +1,50 @@
+from src.constants.status_codes import HTTP_404_NOT_FOUND
+from flask import Blueprint, current_app, jsonify, send_file
+from werkzeug.exceptions import NotFound
+from src.helpers.storage_utils import LocalBackend, get_bucket_type, get_storage_backend
+
+storage = Blueprint("storage", __name__, url_prefix="/api/v1/storage")
+
+# The weights of the users are private, so only the images are served without authentication.
+PUBLIC_BUCKETS = ("FILES", "PROFILE_IMAGES")
+
+def get_local_bucket(bucket_name : str):
+    """
+    Gets the bucket of a bucket name if it is one of the `PUBLIC_BUCKETS` and it is stored on the local disk.
+
+    Parameters:
+        `bucket_name`: The name of the bucket, e.g. the value of `SUPABASE_BUCKET_FILES`.
+
+    Returns:
+        `str`: The bucket, e.g. `FILES`, or none if it isn't public or stored on the local disk.
+    """
+    for bucket in PUBLIC_BUCKETS:
+        if get_bucket_type(bucket) == bucket_name and isinstance(get_storage_backend(bucket), LocalBackend):
+            return bucket
+    return None
+
+@storage.get('/<bucket_name>/<path:path>')
+def get_stored_file(bucket_name : str, path : str):
+    """
+    Serves a file of a bucket stored on the local disk. The file is sent by the server without being read into memory
+    (`sendfile` when the server supports it), and `Range`, `If-None-Match`, and `If-Modified-Since` are honored.
+
+    Parameters:
+        `bucket_name`: The name of the bucket.
+
+        `path`: The path of the file in the bucket.
+
+    Returns:
+        `File Response (200)`: The file, or the part of it (206) that was requested.
+
+        `JSON Response (404)`: If the bucket isn't public or stored on the local disk, or the file doesn't exist.
+    """
+    bucket = get_local_bucket(bucket_name)
+    if bucket is None:
+        return jsonify({'error': 'Bucket not found.'}), HTTP_404_NOT_FOUND
+    try:
+        file_path = get_storage_backend(bucket).get_file_path(bucket_name, path)
+        response = send_file(file_path, conditional=True, max_age=int(current_app.config.get('STORAGE_LOCAL_MAX_AGE') or 0))
+    except (ValueError, NotFound, FileNotFoundError):
+        return jsonify({'error': 'File not found.'}), HTTP_404_NOT_FOUND
+    return response
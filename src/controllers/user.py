@@ -1,10 +1,13 @@
-from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
+from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND, HTTP_404_NOT_FOUND, HTTP_415_UNSUPPORTED_MEDIA_TYPE, HTTP_500_INTERNAL_SERVER_ERROR
 from flask import Blueprint, request, jsonify
-from src.helpers.file_utils import get_file, generate_hex
+from src.helpers.file_utils import ImageMeta, generate_hex
 from src.helpers.supabase_utils import upload_file_to_bucket
+from src.helpers.upload_utils import get_file_stream
 from src.helpers.user_utils import check_hash, get_hash, validate_user_details   
 from src.models.users import Users
 from src.models.weights import Weights
+from src.serializers.users import LOGIN_USER_FIELDS, USER_DETAILS, USER_SCHEMA
+from src.serializers.weights import LOGIN_WEIGHT_FIELDS, WEIGHT_SCHEMA
 from extensions import db
 from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt_identity
 from uuid import uuid4
@@ -60,30 +63,16 @@ def login():
     """
     email = request.json['email']
     password = request.json['password']
-    user = Users.query.filter_by(email=email).first()
-    if user:
-        user_weights = Weights.query.filter_by(user_id=user.id).all()
-        weights = []
-        for weight in user_weights:
-            weights.append({
-                'id': weight.id,
-                'user_id':user.id, 
-                'project_name': weight.project_name,
-                'api_key': weight.api_key,
-                'version': weight.version,
-                'model_type': weight.model_type,
-            })
-        if check_hash(user.password, password):
-            return jsonify({
-                'user': {
-                    'id': user.id,
-                    'refresh_token': create_refresh_token(identity=user.id),
-                    'access_token': create_access_token(identity=user.id),
-                    'username': user.username,
-                    'email': user.email,
-                    'profile_image': user.profile_image,
-                },'weights': weights
-            }), HTTP_200_OK
+    user = USER_SCHEMA.select(Users.query.filter_by(email=email), LOGIN_USER_FIELDS, Users.password).first()
+    if user and check_hash(user.password, password):
+        weights = WEIGHT_SCHEMA.select(Weights.query.filter_by(user_id=user.id), LOGIN_WEIGHT_FIELDS)
+        return jsonify({
+            'user': {
+                **USER_SCHEMA.dump(user, LOGIN_USER_FIELDS),
+                'refresh_token': create_refresh_token(identity=user.id),
+                'access_token': create_access_token(identity=user.id)
+            },'weights': WEIGHT_SCHEMA.dump_all(weights, LOGIN_WEIGHT_FIELDS)
+        }), HTTP_200_OK
     return jsonify({'error': 'Wrong credentials'}), HTTP_401_UNAUTHORIZED
 
 @users.get('/token/refresh')
@@ -109,7 +98,7 @@ def edit(id : uuid4):
         `JSON Body`: The JSON body that contains the user attributes: `username`, `email`, and `password`.
         
     Returns:
-        `JSON Response (200)`: The response from the server with the user details: `id`, `username`, `password`, `email`, `created_at`, and `updated_at`.
+        `JSON Response (200)`: The response from the server with the user details: `id`, `username`, `email`, `created_at`, and `updated_at`.
         
         `JSON Response (401)`: If the user is not authorized.
         
@@ -132,14 +121,7 @@ def edit(id : uuid4):
         user.username = username
         user.email = email
         db.session.commit()
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'password': user.password,
-            'email': user.email,
-            'created_at': user.created_at,
-            'updated_at': user.updated_at
-        }), HTTP_200_OK
+        return jsonify(USER_SCHEMA.dump(user, USER_DETAILS)), HTTP_200_OK
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
@@ -154,14 +136,21 @@ def edit_profile_image(id : uuid4):
         `id`: The id of the user that you want to edit.
         
         `Multipart-Form/Form-Data`: The multipart-form/form-data as a file with the key 'profile_image'.
+        The file is spooled to the disk past `UPLOAD_SPOOL_MAX_MEMORY` and streamed to the bucket.
         
     Returns:
         `JSON Response (200)`: The response from the server with the user details: `id`, `username`, `profile_image`, `created_at`, and `updated_at`.
         
+        `JSON Response (400)`: If no file is uploaded.
+        
         `JSON Response (401)`: If the user is not authorized.
         
         `JSON Response (404)`: If the user is not found.
         
+        `JSON Response (413)`: If the request is larger than `UPLOAD_MAX_BYTES`.
+        
+        `JSON Response (415)`: If the file is not an image.
+        
         `JSON Response (500)`: If there is an SQLAlchemy error.
         
         `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
@@ -174,19 +163,22 @@ def edit_profile_image(id : uuid4):
     if not user:
         return jsonify({'message': 'User is not found'}), HTTP_404_NOT_FOUND
 
-    image = get_file(request.files['profile_image'])
-    supabase_response = upload_file_to_bucket("PROFILE_IMAGES", f"users/{str_id}/{generate_hex()}{image['name']}", image['data'])
+    if 'profile_image' not in request.files:
+        return jsonify({'error': 'No file found.'}), HTTP_400_BAD_REQUEST
+    
+    image = get_file_stream(request.files['profile_image'])
+    image_meta = ImageMeta.from_stream(image['stream'], image['size'])
+    if image_meta.format is None:
+        return jsonify({'error': 'File is not an image.'}), HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    
+    supabase_response = upload_file_to_bucket(
+        "PROFILE_IMAGES", f"users/{str_id}/{generate_hex()}{image['name']}", image['stream'], image_meta.content_type
+    )
     if type(supabase_response) is str:
         try:
             user.profile_image = supabase_response
             db.session.commit()
-            return jsonify({
-                'id': user.id,
-                'username': user.username,
-                'profile_image': user.profile_image,
-                'created_at': user.created_at,
-                'updated_at': user.updated_at
-            }), HTTP_200_OK
+            return jsonify(USER_SCHEMA.dump(user, ['id', 'username', 'profile_image', 'created_at', 'updated_at'])), HTTP_200_OK
         except SQLAlchemyError as e:
             db.session.rollback()
             return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
@@ -204,7 +196,7 @@ def edit_password(id):
         `JSON Body`: The JSON body that contains the user attributes: `username`, `email`, and `password`.
         
     Returns:
-        `JSON Response (200)`: The response from the server with the user details: `id`, `username`, `password`, `email`, `created_at`, and `updated_at`.
+        `JSON Response (200)`: The response from the server with the user details: `id`, `username`, `email`, `created_at`, and `updated_at`.
         
         `JSON Response (400)`: If the old password doesn't match.
         
@@ -229,14 +221,7 @@ def edit_password(id):
             user.password = get_hash(new_password)
             user.updated_at = datetime.now()
             db.session.commit()
-            return jsonify({
-                'id': user.id,
-                'username': user.username,
-                'password': user.password,
-                'email': user.email,
-                'created_at': user.created_at,
-                'updated_at': user.updated_at
-            }), HTTP_200_OK
+            return jsonify(USER_SCHEMA.dump(user, USER_DETAILS)), HTTP_200_OK
         except SQLAlchemyError as e:
             db.session.rollback()
             return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
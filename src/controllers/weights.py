@@ -1,9 +1,11 @@
-from src.helpers.supabase_utils import delete_file_by_name
+from src.helpers.object_utils import collect_garbage, delete_files
 from src.models.files import Files
-from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_409_CONFLICT, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
+from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_207_MULTI_STATUS, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
 from flask import Blueprint, request, jsonify
-from src.helpers.roboflow_utils import deploy_model
+from src.helpers.pagination_utils import get_page_size, paginate, parse_date
+from src.helpers.roboflow_utils import deploy_model, invalidate_model
 from src.models.weights import Weights
+from src.serializers.weights import WEIGHT_SCHEMA
 from extensions import db
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from uuid import uuid4
@@ -44,6 +46,7 @@ def deploy():
         api_key=api_key, 
         version=request.json['version'], 
         model_type=request.json['model_type'], 
+        model_path=model_path,
         type=type
     )
     if type == 'custom':
@@ -52,17 +55,7 @@ def deploy():
     try:
         db.session.add(weight)
         db.session.commit()
-        return jsonify({
-            'id': weight.id,
-            'user_id':current_user, 
-            'project_name': weight.project_name,
-            'api_key': weight.api_key,
-            'version': weight.version,
-            'model_type': weight.model_type,
-            'type': weight.type,
-            'created_at': weight.created_at,
-            'udpated_at': weight.updated_at
-        }), HTTP_201_CREATED
+        return jsonify(WEIGHT_SCHEMA.dump(weight)), HTTP_201_CREATED
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
@@ -71,31 +64,49 @@ def deploy():
 @jwt_required()
 def get_all():
     """
-    Retrieves the list of weights of the current user.
+    Retrieves the list of weights of the current user, from the newest, one page at a time.
+
+    Query Parameters:
+        `limit`: The size of the page, up to `PAGE_SIZE_MAX`. Defaults to `PAGE_SIZE_DEFAULT`.
+
+        `cursor`: The `next_cursor` of the previous page.
+
+        `project_name`, `type`: Only the weights of this project or type.
+
+        `created_after`, `created_before`: Only the weights created in this range, as ISO 8601 dates.
+
+        `fields`: The comma-separated fields to be returned. Only their columns are selected.
 
     Returns:
-        `JSON Response (201)`: The response from the server with the list of user's `weights` and user details: 
-        `id`, `refresh_token`, `access_token`, `username`, `email`, and `profile_image`.
+        `JSON Response (200)`: The response from the server with the list of user's `weights`: `id`, `user_id`, `project_name`,
+        `api_key`, `version`, `model_type`, `type`, `created_at`, and `udpated_at`, and the `next_cursor`, which is none on the last page.
+        
+        `JSON Response (400)`: If a query parameter is invalid.
         
         `JSON Response (404)`: If the weights is not found.
     """    
-    current_user = get_jwt_identity()
-    weights = Weights.query.filter_by(user_id=current_user).all()
-    if not weights:
-        return jsonify({'message': 'Weights not found.'}), HTTP_404_NOT_FOUND
+    query = Weights.query.filter(Weights.user_id == get_jwt_identity())
+    try:
+        if request.args.get('project_name'):
+            query = query.filter(Weights.project_name == request.args['project_name'])
+        if request.args.get('type'):
+            query = query.filter(Weights.type == request.args['type'])
+        created_after = parse_date(request.args.get('created_after'))
+        if created_after:
+            query = query.filter(Weights.created_at >= created_after)
+        created_before = parse_date(request.args.get('created_before'))
+        if created_before:
+            query = query.filter(Weights.created_at < created_before)
+        names = WEIGHT_SCHEMA.parse_fields(request.args.get('fields'))
+        data, next_cursor = paginate(
+            query, WEIGHT_SCHEMA, names, Weights.created_at, Weights.id, request.args.get('cursor'), get_page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
     
-    data = []
-    for weight in weights:
-        data.append({
-           'id': weight.id,
-            'user_id':current_user, 
-            'project_name': weight.project_name,
-            'api_key': weight.api_key,
-            'version': weight.version,
-            'created_at': weight.created_at,
-            'udpated_at': weight.updated_at
-        })
-    return jsonify({'data': data}), HTTP_200_OK
+    if not data and not request.args.get('cursor'):
+        return jsonify({'message': 'Weights not found.'}), HTTP_404_NOT_FOUND
+    return jsonify({'data': data, 'next_cursor': next_cursor}), HTTP_200_OK
 
 @weights.get('/<uuid(strict=False):id>')
 @jwt_required()
@@ -108,29 +119,28 @@ def get_by_id(id):
 
     Returns:
         `JSON Response (200)`: The response from the server with the weights details: `id`, `user_id`, `project_name`,
+        `api_key`, `version`, `model_type`, `type`, `created_at`, and `udpated_at`, or only the comma-separated `fields` of the query.
+        
+        `JSON Response (400)`: If a requested field is unknown.
         
         `JSON Response (404)`: If the weights is not found.
     """    
-    current_user = get_jwt_identity()
-    weight = Weights.query.filter_by(user_id=current_user, id=str(id)).first()
-    if not weights:
+    try:
+        names = WEIGHT_SCHEMA.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+    
+    weight = WEIGHT_SCHEMA.select(Weights.query.filter_by(user_id=get_jwt_identity(), id=str(id)), names).first()
+    if not weight:
         return jsonify({'message': 'No weights found.'}), HTTP_404_NOT_FOUND
-
-    return jsonify({
-            'id': weight.id,
-            'user_id':current_user, 
-            'project_name': weight.project_name,
-            'api_key': weight.api_key,
-            'version': weight.version,
-            'created_at': weight.created_at,
-            'udpated_at': weight.updated_at
-        }), HTTP_200_OK
+    return jsonify(WEIGHT_SCHEMA.dump(weight, names)), HTTP_200_OK
 
 @weights.delete('/<uuid(strict=False):id>/delete')
 @jwt_required()
 def delete_by_id(id):
     """
-    Deletes the weights by its id of the current user.
+    Deletes the weights by its id of the current user, along with its files.
+    The rows are deleted in a single statement, then the stored files that no other file references are removed in concurrent batches.
 
     Parameters:
         `id`: The unique identifier of the weights that the user wants to delete.
@@ -138,6 +148,9 @@ def delete_by_id(id):
     Returns:
         `JSON Response (200)`: The response from the server with the successful `message`.
         
+        `JSON Response (207)`: If the weights were deleted but some of its stored files failed to be removed, with the
+        `failed` files and their `error`. They are removed by a later deletion.
+        
         `JSON Response (404)`: If the weights is not found.
         
         `JSON Response (500)`: If there is an SQLAlchemy error.
@@ -148,19 +161,18 @@ def delete_by_id(id):
     if not weight:
         return jsonify({'message': 'No weights found.'}), HTTP_404_NOT_FOUND
     
-    files = Files.query.filter_by(user_id=current_user, weight_id=weight_id)
-    for file in files:
-        supabase_response = delete_file_by_name("FILES", f"main/{current_user}/{file.name}")
-        if supabase_response != HTTP_200_OK:
-            return supabase_response
-    
+    # The attributes of the weights expire once their deletion is committed, so the model is read before.
+    model = (weight.api_key, weight.project_name, weight.version, weight.model_path)
     try:
-        if files:
-            db.session.query(Files).filter_by(user_id=current_user, weight_id=weight_id).delete()
-            
+        _, released = delete_files(db.session.query(Files).filter(Files.user_id == current_user, Files.weight_id == weight_id))
         db.session.delete(weight)
         db.session.commit()
-        return jsonify({'message': 'Weights successfully deleted'}), HTTP_200_OK
+        invalidate_model(*model)
     except SQLAlchemyError as e:
         db.session.rollback()
-        return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
\ No newline at end of file
+        return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+    
+    failed = collect_garbage("FILES", released)
+    if failed:
+        return jsonify({'message': 'Weights deleted, but some of its stored files failed to be removed', 'failed': failed}), HTTP_207_MULTI_STATUS
+    return jsonify({'message': 'Weights successfully deleted'}), HTTP_200_OK
\ No newline at end of file
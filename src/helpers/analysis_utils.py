@@ -0,0 +1,184 @@
+from threading import Lock
+from flask import current_app, jsonify
+from uuid import uuid4
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from src.constants.status_codes import HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT, HTTP_422_UNPROCESSABLE_ENTITY, HTTP_500_INTERNAL_SERVER_ERROR
+from src.helpers.annotation_utils import get_annotation_renderer
+from src.helpers.cache_utils import TTLCache
+from src.helpers.encoder_utils import encode_image, get_encoder_options, replace_extension
+from src.helpers.file_utils import ImageMeta, draw_boxes_on_image, generate_hex, get_file_base_name
+from src.helpers.object_utils import store_file
+from src.helpers.supabase_utils import get_file_path, get_file_url
+from src.helpers.prediction_utils import pack_predictions, unpack_predictions
+from src.helpers.roboflow_utils import download_image, perform_inference
+from src.helpers.stats_utils import add_file_stats
+from src.helpers.timing_utils import span
+from src.models.files import Files
+from src.models.uploads import Uploads
+from src.serializers.files import FILE_DETAILS, FILE_SCHEMA
+
+_annotated_cache = None
+_annotated_cache_lock = Lock()
+
+def analyze_file(current_user : str, data : dict):
+  """
+  Analyzes an uploaded file using the custom weights of the user, then uploads the result and saves its details.
+  This is the pipeline of `/api/v1/files/analyze`, shared by its synchronous and asynchronous modes.
+  The predictions are saved with the file. With `ANNOTATION_LAZY`, the result isn't rendered nor uploaded, and the file
+  points at the original image until its overlay is requested from `/api/v1/files/<id>/annotated`.
+  
+  Parameters:
+    `current_user`: The id of the user that analyzes the file.
+    
+    `data`: The JSON body that contains: `url`, `api_key`, `project_name`, `version`, and `weight_id`, and optionally
+    the `format`, `quality`, and `compress_level` of the result.
+    
+  Returns:
+    `JSON Response (201)`: The response from the server with the file details: `id`, `name`, `dimensions`, `size`, `url`, `annotated_url`, `classification`, `accuracy`, `error_rate`, and `encoding`.
+    
+    `JSON Response (400)`: If no file is uploaded, or if the `quality` or the `compress_level` is not an integer.
+    
+    `JSON Response (409)`: If the file already exists in the database.
+    
+    `JSON Response (500)`: If there is an SQLAlchemy error.
+    
+    `JSON Roboflow Response`: If there is an error while performing inference in Roboflow.
+    
+    `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
+  """
+  uploaded_file_url = data.get('url')
+  if uploaded_file_url is None:
+    return jsonify({'error': 'No uploaded file found.'}), HTTP_400_BAD_REQUEST
+  try:
+    encoder_options = get_encoder_options(data)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+  
+  uploaded_file_name = get_file_base_name(uploaded_file_url)
+  existing_file = Files.query.with_entities(Files.url).filter_by(user_id=current_user, name=uploaded_file_name).first()
+  if existing_file:
+    return jsonify({'error': 'File already exists.', 'url': get_file_url("FILES", existing_file.url)}), HTTP_409_CONFLICT
+  
+  project_name = data['project_name']
+  api_key = data['api_key']
+  version = data['version']
+  weight_id = data['weight_id']
+  lazy = bool(current_app.config.get('ANNOTATION_LAZY'))
+  result = perform_inference(
+    image_url=uploaded_file_url, project_name=project_name, api_key=api_key, version_number=version, render=not lazy
+  )
+  if type(result) is not dict:
+    return result
+  
+  if lazy:
+    # The overlay is rendered on demand by `/api/v1/files/<id>/annotated`, so the file points at the original image.
+    encoded_result = None
+    result_meta = result['image_meta']
+    new_file_name = generate_hex() + uploaded_file_name
+    supabase_response = get_file_path("FILES", uploaded_file_url)
+  else:
+    encoded_result = encode_image(result['image'], **encoder_options)
+    result_meta = ImageMeta.from_image(result['image'], encoded_result.data, encoded_result.format)
+    new_file_name = generate_hex() + replace_extension(uploaded_file_name, encoded_result.extension)
+    supabase_response = store_file(
+      "FILES", f"main/{current_user}/{new_file_name}", encoded_result.data, encoded_result.content_type
+    )
+  if type(supabase_response) is str:
+    try:
+      file = Files(
+          id=uuid4(),
+          name=new_file_name, 
+          user_id=current_user, 
+          classification=result['classification'], 
+          confidence=result['confidence'],
+          width=result_meta.width,
+          height=result_meta.height,
+          byte_size=result_meta.byte_size,
+          url=supabase_response,
+          source_url=get_file_path("FILES", uploaded_file_url),
+          predictions=pack_predictions(result['predictions']),
+          weight_id=weight_id
+        )
+      with span('db_commit'):
+        db.session.add(file)
+        add_file_stats([file])
+        # The hash given when a signed upload was completed is replaced by the hash of the content that was analyzed.
+        db.session.execute(
+          update(Uploads)
+          .where(Uploads.user_id == current_user, Uploads.path == file.source_url)
+          .values(content_hash=result['image_meta'].content_hash)
+        )
+        db.session.commit()
+      return jsonify({
+        **FILE_SCHEMA.dump(file, FILE_DETAILS),
+        'annotated_url': get_annotated_url(file.id),
+        'encoding': encoded_result.get_details() if encoded_result else None
+        }), HTTP_201_CREATED
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      return jsonify({'error': str(e.orig)}), HTTP_500_INTERNAL_SERVER_ERROR
+  else: return supabase_response
+
+def get_annotated_url(file_id : str):
+  """
+  Gets the path of the endpoint that renders a file on demand. It is built by hand, since a job has no request to build it from.
+  
+  Parameters:
+    `file_id`: The unique identifier of the file.
+    
+  Returns:
+    `str`: The path of `/api/v1/files/<id>/annotated`.
+  """
+  return f"/api/v1/files/{file_id}/annotated"
+
+def get_annotated_cache():
+  """
+  Gets the process-wide cache of the rendered files, bounded by `ANNOTATED_CACHE_SIZE` and `ANNOTATED_CACHE_TTL`.
+  
+  Returns:
+    `TTLCache`: The cache of the `EncodedImage` of each file and encoder options.
+  """
+  global _annotated_cache
+  if _annotated_cache is None:
+    with _annotated_cache_lock:
+      if _annotated_cache is None:
+        _annotated_cache = TTLCache(
+          max_size=int(current_app.config.get('ANNOTATED_CACHE_SIZE') or 64),
+          ttl=float(current_app.config.get('ANNOTATED_CACHE_TTL') or 600)
+        )
+  return _annotated_cache
+
+def render_annotated_file(file : Files, encoder_options : dict):
+  """
+  Renders the stored predictions of a file on its original image, reusing the cached rendering if there is one.
+  
+  Parameters:
+    `file`: The file whose `source_url` and `predictions` were saved by the analysis.
+    
+    `encoder_options`: The `format`, `quality`, and `compress_level` from `get_encoder_options`.
+    
+  Returns:
+    `EncodedImage`: The annotated image.
+    
+    `JSON Response`: If the original image can't be retrieved or decoded.
+  """
+  cache = get_annotated_cache()
+  key = (file.id, tuple(sorted(encoder_options.items())))
+  encoded_result = cache.get(key)
+  if encoded_result is not None:
+    return encoded_result
+  
+  image_data = download_image(get_file_url("FILES", file.source_url))
+  if type(image_data) is tuple:
+    return image_data
+  image_meta = ImageMeta.from_bytes(image_data)
+  if image_meta.image is None:
+    return jsonify({'message': 'The original image of the file can\'t be decoded.'}), HTTP_422_UNPROCESSABLE_ENTITY
+  
+  renderer = get_annotation_renderer()
+  image = draw_boxes_on_image(renderer.get_canvas(image_meta), unpack_predictions(file.predictions))
+  encoded_result = encode_image(image, **encoder_options)
+  cache.set(key, encoded_result)
+  return encoded_result
@@ -0,0 +1,269 @@
+from functools import lru_cache
+from threading import Lock
+import cv2
+from flask import current_app, has_app_context
+from numpy import array, float32, hstack, int32, ndarray, rint, where
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+DEFAULT_PALETTE = {
+    'Good': 'green'
+}
+
+_renderer = None
+_renderer_lock = Lock()
+
+@lru_cache(maxsize=32)
+def get_font(size : int):
+    """
+    Gets a font by its size, loading it from the disk only once per size.
+
+    Parameters:
+        `size`: The size of the font in pixels.
+
+    Returns:
+        `FreeTypeFont`: Arial if it is installed, otherwise the default font of Pillow.
+    """
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        # Use default font if arial.ttf is not found in Mac/Linux/Windows.
+        return ImageFont.load_default()
+
+def parse_palette(palette : str):
+    """
+    Parses a palette from the `ANNOTATION_PALETTE` format.
+
+    Parameters:
+        `palette`: The comma-separated `class:color` pairs, e.g. `Good:green,Bad:#ff0000`.
+
+    Returns:
+        `dict[str, str]`: The color of each class.
+    """
+    if not palette:
+        return dict(DEFAULT_PALETTE)
+    pairs = (pair.split(':', 1) for pair in palette.split(',') if ':' in pair)
+    return {name.strip(): color.strip() for name, color in pairs}
+
+class AnnotationRenderer:
+    """
+    Draws the bounding boxes, class labels, and confidence scores of the predictions on an image.
+
+    Parameters:
+        `palette`: The color of each class.
+
+        `default_color`: The color of the classes missing from the palette.
+
+        `box_width`: The width of the outline of the boxes in pixels.
+
+        `font_scale`: The size of the labels relative to the height of the image.
+
+        `label_background`: The fill color behind the labels.
+    """
+    def __init__(self, palette : dict[str, str] = None, default_color : str = 'red', box_width : int = 2,
+                 font_scale : float = 0.05, label_background : str = 'black'):
+        self.palette = DEFAULT_PALETTE if palette is None else palette
+        self.default_color = default_color
+        self.box_width = box_width
+        self.font_scale = font_scale
+        self.label_background = label_background
+
+    def get_canvas(self, image_meta):
+        """
+        Gets the image of an `ImageMeta` that this renderer draws on.
+
+        Parameters:
+            `image_meta`: The metadata of the image that was predicted.
+
+        Returns:
+            `Image`: The decoded image.
+        """
+        return image_meta.image
+
+    def to_canvas(self, image : Image.Image | ndarray):
+        """
+        Converts an image to the type that this renderer draws on.
+
+        Parameters:
+            `image`: PIL.Image object or ndarray.
+
+        Returns:
+            `Image`: The PIL.Image of the image.
+        """
+        return Image.fromarray(image) if isinstance(image, ndarray) else image
+
+    def get_color(self, class_name : str):
+        """
+        Gets the color of a class.
+
+        Parameters:
+            `class_name`: The class of the prediction.
+
+        Returns:
+            `str`: The color from the palette, otherwise the `default_color`.
+        """
+        return self.palette.get(class_name, self.default_color)
+
+    def render(self, image : Image, predictions : list[dict]):
+        """
+        Draws the predictions on the image in place. The font is loaded once per image and every label is measured once.
+
+        Parameters:
+            `image`: PIL.Image object to be drawn on.
+
+            `predictions`: List of predictions with `x`, `y`, `width`, `height`, `confidence`, and `class`.
+
+        Returns:
+            `image`: The PIL.Image that was updated with the bounding boxes and class labels.
+        """
+        draw = ImageDraw.Draw(image)
+        font = get_font(max(int(self.font_scale * image.size[1]), 1))
+        label_sizes = {}
+        for bounding_box in predictions:
+            x0 = bounding_box['x'] - bounding_box['width'] / 2
+            x1 = bounding_box['x'] + bounding_box['width'] / 2
+            y0 = bounding_box['y'] - bounding_box['height'] / 2
+            y1 = bounding_box['y'] + bounding_box['height'] / 2
+            color = self.get_color(bounding_box['class'])
+            draw.rectangle([x0, y0, x1, y1], outline=color, width=self.box_width)
+
+            text = f"{bounding_box['class']}: {bounding_box['confidence']:.2f}"
+            label_size = label_sizes.get(text)
+            if label_size is None:
+                _, _, text_width, text_height = font.getbbox(text)
+                label_size = label_sizes[text] = (text_width, text_height)
+            text_width, text_height = label_size
+            text_position = (x1, y0) if text_width > bounding_box['width'] else (x0, y0)
+
+            draw.rectangle(
+                [text_position[0], text_position[1], text_position[0] + text_width, text_position[1] + text_height],
+                fill=self.label_background
+            )
+            draw.text(text_position, text, fill=color, font=font)
+        return image
+
+class ArrayAnnotationRenderer(AnnotationRenderer):
+    """
+    Draws the predictions with OpenCV directly on the RGB ndarray that was sent to the model, so the image is never
+    converted back to PIL. The corners of every box are computed at once, the boxes of a color are drawn in a single call,
+    and every label is measured once.
+
+    Parameters:
+        The same as `AnnotationRenderer`.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._colors = {}
+
+    def get_canvas(self, image_meta):
+        """
+        Gets the image of an `ImageMeta` that this renderer draws on.
+
+        Parameters:
+            `image_meta`: The metadata of the image that was predicted.
+
+        Returns:
+            `ndarray`: The RGB ndarray of the image, which is also the input of the model when it isn't letterboxed.
+        """
+        return image_meta.array
+
+    def to_canvas(self, image : Image.Image | ndarray):
+        """
+        Converts an image to the type that this renderer draws on.
+
+        Parameters:
+            `image`: PIL.Image object or ndarray.
+
+        Returns:
+            `ndarray`: A writable RGB ndarray, which is the image itself if it already is one.
+        """
+        if isinstance(image, ndarray):
+            if image.ndim == 3 and image.shape[2] == 3 and image.flags.writeable:
+                return image
+            image = Image.fromarray(image)
+        return array(image if image.mode == 'RGB' else image.convert('RGB'))
+
+    def get_rgb(self, color : str):
+        """
+        Gets the RGB value of a color, parsing it once.
+
+        Parameters:
+            `color`: The name or hex code of the color.
+
+        Returns:
+            `tuple[int, int, int]`: The RGB value of the color.
+        """
+        rgb = self._colors.get(color)
+        if rgb is None:
+            rgb = self._colors[color] = ImageColor.getrgb(color)[:3]
+        return rgb
+
+    def render(self, image : ndarray, predictions : list[dict]):
+        """
+        Draws the predictions on the image in place.
+
+        Parameters:
+            `image`: The writable RGB ndarray to be drawn on.
+
+            `predictions`: List of predictions with `x`, `y`, `width`, `height`, `confidence`, and `class`.
+
+        Returns:
+            `ndarray`: The image that was updated with the bounding boxes and class labels.
+        """
+        if not predictions:
+            return image
+        height, width = image.shape[:2]
+        boxes = array([(box['x'], box['y'], box['width'], box['height']) for box in predictions], dtype=float32)
+        half_sizes = boxes[:, 2:] / 2
+        corners = rint(hstack((boxes[:, :2] - half_sizes, boxes[:, :2] + half_sizes))).astype(int32)
+        corners.clip(0, [width - 1, height - 1, width - 1, height - 1], out=corners)
+
+        colors = [self.get_color(box['class']) for box in predictions]
+        outlines = corners[:, [[0, 1], [2, 1], [2, 3], [0, 3]]]
+        for color in set(colors):
+            cv2.polylines(image, [outlines[i] for i, c in enumerate(colors) if c == color], True, self.get_rgb(color), self.box_width)
+
+        font_height = max(int(self.font_scale * height), 1)
+        font_scale = cv2.getFontScaleFromHeight(cv2.FONT_HERSHEY_SIMPLEX, font_height, 1)
+        texts = [f"{box['class']}: {box['confidence']:.2f}" for box in predictions]
+        label_sizes = {}
+        for text in texts:
+            if text not in label_sizes:
+                (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+                label_sizes[text] = (text_width, text_height + baseline, baseline)
+        text_sizes = array([label_sizes[text][:2] for text in texts], dtype=int32)
+        text_x = where(text_sizes[:, 0] > boxes[:, 2], corners[:, 2], corners[:, 0])
+        text_y = corners[:, 1]
+
+        background = self.get_rgb(self.label_background)
+        for x, y, (text_width, text_height), text, color in zip(text_x.tolist(), text_y.tolist(), text_sizes.tolist(), texts, colors):
+            image[y:y + text_height, x:x + text_width] = background
+            cv2.putText(
+                image, text, (x, y + text_height - label_sizes[text][2]), cv2.FONT_HERSHEY_SIMPLEX, font_scale, self.get_rgb(color), 1
+            )
+        return image
+
+ANNOTATION_RENDERERS = {
+    'pil': AnnotationRenderer,
+    'opencv': ArrayAnnotationRenderer
+}
+
+def get_annotation_renderer():
+    """
+    Gets the renderer of the process selected by `ANNOTATION_RENDERER` (`opencv` or `pil`), configured by
+    `ANNOTATION_PALETTE` and `ANNOTATION_DEFAULT_COLOR`. Outside of an application context, the default palette is used.
+
+    Returns:
+        `AnnotationRenderer`: The renderer of the process.
+    """
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                if not has_app_context():
+                    return ArrayAnnotationRenderer()
+                renderer = ANNOTATION_RENDERERS.get(current_app.config.get('ANNOTATION_RENDERER') or 'opencv', ArrayAnnotationRenderer)
+                _renderer = renderer(
+                    palette=parse_palette(current_app.config.get('ANNOTATION_PALETTE')),
+                    default_color=current_app.config.get('ANNOTATION_DEFAULT_COLOR') or 'red'
+                )
+    return _renderer
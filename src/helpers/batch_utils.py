@@ -0,0 +1,164 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import getpid
+from threading import Condition, Lock, Thread
+from time import monotonic
+from flask import current_app
+
+_micro_batcher = None
+_micro_batcher_lock = Lock()
+
+class MicroBatcher:
+    """
+    Collects the images submitted by concurrent requests and predicts them in batches.
+    A batch is sent once `max_batch_size` images for the same model are queued or the oldest of them waited `max_wait` seconds.
+    The batches are predicted by a pool of `max_concurrency` threads, one batch per model at a time, so a slow model
+    doesn't hold the batches of the other models back, and its next batch fills up while it predicts.
+
+    Parameters:
+        `max_batch_size`: The maximum number of images sent to the model at once.
+
+        `max_wait`: The maximum number of seconds an image waits for its batch to fill up.
+
+        `max_concurrency`: The maximum number of batches predicted at the same time.
+    """
+    def __init__(self, max_batch_size : int = 8, max_wait : float = 0.02, max_concurrency : int = 4):
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait), 0)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.batches = 0
+        self.items = 0
+        self._queues = {}
+        self._predicting = set()
+        self._condition = Condition()
+        self._executor = None
+        self._pid = None
+
+    def submit(self, backend, image, confidence : int = 20, overlap : int = 30):
+        """
+        Queues an image for the next batch of its model.
+
+        Parameters:
+            `backend`: The `InferenceBackend` that predicts the image.
+
+            `image`: The RGB image as ndarray.
+
+            `confidence`: The minimum confidence of a prediction in percent.
+
+            `overlap`: The maximum overlap between predictions of the same class in percent.
+
+        Returns:
+            `Future`: The future that resolves to the `predictions` of the image.
+        """
+        future = Future()
+        key = (backend.name, id(backend.model), confidence, overlap)
+        with self._condition:
+            self._ensure_worker()
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = {'backend': backend, 'items': [], 'since': monotonic()}
+            queue['items'].append((image, future))
+            self._condition.notify()
+        return future
+
+    def stats(self):
+        """
+        Gets the counters of the batcher.
+
+        Returns:
+            `dict`: The `batches`, `items`, `average_batch_size`, `queued`, `predicting`, `max_batch_size`, `max_wait`,
+            and `max_concurrency`.
+        """
+        with self._condition:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'average_batch_size': round(self.items / self.batches, 2) if self.batches else None,
+                'queued': sum(len(queue['items']) for queue in self._queues.values()),
+                'predicting': len(self._predicting),
+                'max_batch_size': self.max_batch_size,
+                'max_wait': self.max_wait,
+                'max_concurrency': self.max_concurrency
+            }
+
+    def _ensure_worker(self):
+        # Threads don't survive a fork, so every worker process starts its own dispatcher and pool.
+        if self._pid != getpid():
+            self._pid = getpid()
+            self._predicting.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='inference-batch')
+            Thread(target=self._run, name='inference-micro-batcher', daemon=True).start()
+
+    def _take_ready_batch(self):
+        now = monotonic()
+        next_due = None
+        for key, queue in self._queues.items():
+            if key in self._predicting:
+                continue
+            due = queue['since'] + self.max_wait
+            if len(queue['items']) >= self.max_batch_size or due <= now:
+                items = queue['items'][:self.max_batch_size]
+                del queue['items'][:self.max_batch_size]
+                if queue['items']:
+                    queue['since'] = now
+                else:
+                    del self._queues[key]
+                self.batches += 1
+                self.items += len(items)
+                self._predicting.add(key)
+                return (key, queue['backend'], items), None
+            next_due = due if next_due is None else min(next_due, due)
+        return None, (None if next_due is None else next_due - now)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch, timeout = self._take_ready_batch()
+                while batch is None:
+                    self._condition.wait(timeout)
+                    batch, timeout = self._take_ready_batch()
+            self._executor.submit(self._dispatch, *batch)
+
+    def _dispatch(self, key, backend, items):
+        try:
+            self._predict(key, backend, items)
+        finally:
+            with self._condition:
+                self._predicting.discard(key)
+                self._condition.notify()
+
+    def _predict(self, key, backend, items):
+        _, _, confidence, overlap = key
+        try:
+            results = backend.predict_batch([image for image, _ in items], confidence, overlap)
+        except Exception as e:
+            if len(items) == 1:
+                items[0][1].set_exception(e)
+                return
+            # Retry the images one by one so a single bad image doesn't fail the whole batch.
+            for image, future in items:
+                try:
+                    future.set_result(backend.predict(image, confidence, overlap))
+                except Exception as item_error:
+                    future.set_exception(item_error)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+def get_micro_batcher():
+    """
+    Gets the process-wide micro-batcher, creating it from `INFERENCE_BATCH_SIZE`, `INFERENCE_BATCH_WINDOW_MS`, and
+    `INFERENCE_BATCH_CONCURRENCY` on first use.
+
+    Returns:
+        `MicroBatcher`: The micro-batcher of the process.
+    """
+    global _micro_batcher
+    if _micro_batcher is None:
+        with _micro_batcher_lock:
+            if _micro_batcher is None:
+                _micro_batcher = MicroBatcher(
+                    max_batch_size=int(current_app.config.get('INFERENCE_BATCH_SIZE') or 8),
+                    max_wait=float(current_app.config.get('INFERENCE_BATCH_WINDOW_MS') or 20) / 1000,
+                    max_concurrency=int(current_app.config.get('INFERENCE_BATCH_CONCURRENCY') or 4)
+                )
+    return _micro_batcher
@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire after a time-to-live.
+
+    Parameters:
+        `max_size`: The maximum number of entries kept before the least recently used one is evicted.
+
+        `ttl`: The number of seconds an entry stays valid. `None` or `0` disables the expiry.
+    """
+    def __init__(self, max_size : int = 128, ttl : float = None):
+        self.max_size = max(int(max_size), 1)
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _is_expired(self, stored_at : float):
+        return self.ttl is not None and stored_at is not None and monotonic() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        """
+        Gets an entry and marks it as the most recently used.
+
+        Parameters:
+            `key`: The key of the entry.
+
+            `default`: The value returned if the entry is missing or expired.
+
+        Returns:
+            `Any`: The cached value, otherwise the `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry[1]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires : bool = True):
+        """
+        Stores an entry, evicting the least recently used ones if the cache is full.
+
+        Parameters:
+            `key`: The key of the entry.
+
+            `value`: The value to be cached.
+
+            `expires`: Whether the entry expires after the `ttl`. Otherwise it is only evicted when the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (value, monotonic() if expires else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory, expires : bool = True):
+        """
+        Gets an entry or builds it with the `factory` on a miss.
+        The `factory` is called outside of the lock so a slow build doesn't block other keys.
+
+        Parameters:
+            `key`: The key of the entry.
+
+            `factory`: A callable without arguments that builds the value.
+
+            `expires`: Whether the built entry expires after the `ttl`.
+
+        Returns:
+            `Any`: The cached or newly built value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, expires)
+        return value
+
+    def invalidate(self, key):
+        """
+        Removes an entry.
+
+        Parameters:
+            `key`: The key of the entry.
+
+        Returns:
+            `bool`: True if the entry was cached, otherwise False.
+        """
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def invalidate_where(self, predicate):
+        """
+        Removes every entry whose key matches the `predicate`.
+
+        Parameters:
+            `predicate`: A callable that takes a key and returns a `bool`.
+
+        Returns:
+            `int`: The number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Gets the counters of the cache.
+
+        Returns:
+            `dict`: The `size`, `max_size`, `ttl`, `hits`, `misses`, `evictions`, and `hit_rate`.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
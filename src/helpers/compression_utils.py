@@ -0,0 +1,76 @@
+from gzip import compress as gzip_compress
+from flask import request
+from src.helpers.timing_utils import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+
+def get_encoding():
+    """
+    Gets the encoding of the response that the client accepts, preferring Brotli if it is installed.
+
+    Returns:
+        `str`: `br`, `gzip`, or none if the client accepts neither.
+    """
+    if brotli is not None and request.accept_encodings.quality('br') > 0:
+        return 'br'
+    if request.accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+def compress_response(response, min_size : int, level : int):
+    """
+    Compresses the body of a response if it is large enough to be worth it.
+    Files, streams, partial and empty responses, and images, which are already compressed, are left as they are.
+
+    Parameters:
+        `response`: The response of the request.
+
+        `min_size`: The minimum size of the body in bytes.
+
+        `level`: The gzip level from 1 to 9. Brotli uses the quality of the same speed, from 1 to 9.
+
+    Returns:
+        `Response`: The response, compressed if the client accepts it.
+    """
+    if (
+        response.direct_passthrough or response.is_streamed or response.status_code not in (200, 201, 207)
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = get_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < min_size:
+        return response
+
+    with span('compress'):
+        if encoding == 'br':
+            data = brotli.compress(data, quality=level)
+        else:
+            data = gzip_compress(data, compresslevel=level)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """
+    Registers the hook that compresses the responses larger than `COMPRESSION_MIN_SIZE` with `COMPRESSION_LEVEL`,
+    if `COMPRESSION_ENABLED` is on.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    @app.after_request
+    def compress(response):
+        if not app.config.get('COMPRESSION_ENABLED'):
+            return response
+        return compress_response(
+            response,
+            int(app.config.get('COMPRESSION_MIN_SIZE') or 1024),
+            min(max(int(app.config.get('COMPRESSION_LEVEL') or 6), 1), 9)
+        )
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+def map_concurrently(function, items : list, max_workers : int = None):
+    """
+    Calls a function on every item using a bounded pool of threads that share the current application context.
+
+    Parameters:
+        `function`: The function that takes a single item. It is expected to handle its own errors.
+
+        `items`: The items to be processed.
+
+        `max_workers`: The maximum number of threads. Defaults to `IO_CONCURRENCY`.
+
+    Returns:
+        `list`: The results of the function, in the same order as the items.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [function(item) for item in items]
+
+    app = current_app._get_current_object()
+    def call(item):
+        with app.app_context():
+            return function(item)
+
+    max_workers = min(len(items), max_workers or int(app.config.get('IO_CONCURRENCY') or 8))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, items))
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from io import BytesIO
+from os import path
+from time import perf_counter
+import cv2
+from flask import current_app, has_app_context
+from numpy import ndarray
+from PIL import Image
+from src.helpers.timing_utils import span
+
+IMAGE_FORMATS = {
+    'PNG': {'content_type': 'image/png', 'extension': 'png'},
+    'JPEG': {'content_type': 'image/jpeg', 'extension': 'jpg'},
+    'WEBP': {'content_type': 'image/webp', 'extension': 'webp'}
+}
+
+@dataclass
+class EncodedImage:
+    """
+    An encoded image with the details needed to store and serve it.
+    """
+    data : bytes
+    format : str
+    content_type : str
+    extension : str
+    encode_ms : float
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def get_details(self):
+        """
+        Gets the details of the encoding.
+
+        Returns:
+            `dict`: The `format`, `content_type`, `size` in bytes, and `encode_ms`.
+        """
+        return {'format': self.format, 'content_type': self.content_type, 'size': self.size, 'encode_ms': self.encode_ms}
+
+def get_encoder_option(values : dict, name : str, default, minimum : int, maximum : int):
+    """
+    Gets a numeric encoder option of a request, clamped to its range.
+
+    Parameters:
+        `values`: The values of the request.
+
+        `name`: The name of the option, e.g. `quality`.
+
+        `default`: The value of the deployment, used if the request doesn't give one.
+
+        `minimum`: The lowest value of the option.
+
+        `maximum`: The highest value of the option.
+
+    Returns:
+        `int`: The value of the option between `minimum` and `maximum`.
+
+    Raises:
+        `ValueError`: If the value of the request is not an integer.
+    """
+    value = values.get(name)
+    if value in (None, ''):
+        value = default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"The {name} must be an integer from {minimum} to {maximum}.") from None
+    return min(max(value, minimum), maximum)
+
+def get_encoder_options(values : dict = None):
+    """
+    Gets the encoder options of the deployment, i.e. `ANNOTATED_IMAGE_FORMAT`, `ANNOTATED_IMAGE_QUALITY`, and
+    `ANNOTATED_IMAGE_COMPRESS_LEVEL`, overridden by the `format`, `quality`, and `compress_level` of a request.
+
+    Parameters:
+        `values`: The values of the request, e.g. its JSON body or form.
+
+    Returns:
+        `dict`: The `format`, `quality`, and `compress_level` to be given to `encode_image`.
+
+    Raises:
+        `ValueError`: If the `quality` or the `compress_level` of the request is not an integer.
+    """
+    config = current_app.config if has_app_context() else {}
+    values = values or {}
+    image_format = str(values.get('format') or config.get('ANNOTATED_IMAGE_FORMAT') or 'JPEG').upper()
+    if image_format == 'JPG':
+        image_format = 'JPEG'
+    if image_format not in IMAGE_FORMATS:
+        image_format = 'JPEG'
+    return {
+        'format': image_format,
+        'quality': get_encoder_option(values, 'quality', config.get('ANNOTATED_IMAGE_QUALITY') or 85, 1, 100),
+        'compress_level': get_encoder_option(values, 'compress_level', config.get('ANNOTATED_IMAGE_COMPRESS_LEVEL') or 6, 0, 9)
+    }
+
+def encode_array(image : ndarray, format : str = 'JPEG', quality : int = 85, compress_level : int = 6):
+    """
+    Encodes an RGB ndarray with OpenCV, without converting it to a PIL image.
+
+    Parameters:
+        `image`: The RGB, RGBA, or grayscale ndarray of the image.
+
+        `format`: One of the `IMAGE_FORMATS`.
+
+        `quality`: The quality of JPEG and WebP, from 1 to 100.
+
+        `compress_level`: The zlib compression level of PNG, from 0 (fastest) to 9 (smallest).
+
+    Returns:
+        `bytes`: The encoded image.
+    """
+    if image.ndim == 3 and image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR if format == 'JPEG' else cv2.COLOR_RGBA2BGRA)
+    elif image.ndim == 3 and image.shape[2] == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if format == 'PNG':
+        options = [cv2.IMWRITE_PNG_COMPRESSION, compress_level]
+    elif format == 'WEBP':
+        options = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        options = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    ok, data = cv2.imencode(f".{IMAGE_FORMATS[format]['extension']}", image, options)
+    if not ok:
+        raise ValueError(f"The image could not be encoded as {format}.")
+    return data.tobytes()
+
+def encode_image(image : Image, format : str = 'JPEG', quality : int = 85, compress_level : int = 6):
+    """
+    Encodes an image.
+
+    Parameters:
+        `image`: The image that the user want to encode.
+
+        `format`: One of the `IMAGE_FORMATS`.
+
+        `quality`: The quality of JPEG and WebP, from 1 to 100.
+
+        `compress_level`: The zlib compression level of PNG, from 0 (fastest) to 9 (smallest).
+
+    Returns:
+        `EncodedImage`: The encoded image with its content type, extension, and encode time.
+    """
+    started_at = perf_counter()
+    if isinstance(image, ndarray):
+        with span('encode'):
+            data = encode_array(image, format, quality, compress_level)
+    else:
+        if format == 'PNG':
+            options = {'compress_level': compress_level}
+        else:
+            options = {'quality': quality}
+            if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+        with span('encode'), BytesIO() as buf:
+            image.save(buf, format=format, **options)
+            data = buf.getvalue()
+    return EncodedImage(
+        data=data,
+        format=format,
+        content_type=IMAGE_FORMATS[format]['content_type'],
+        extension=IMAGE_FORMATS[format]['extension'],
+        encode_ms=round((perf_counter() - started_at) * 1000, 2)
+    )
+
+def replace_extension(file_name : str, extension : str):
+    """
+    Replaces the extension of a file name.
+
+    Parameters:
+        `file_name`: The file name.
+
+        `extension`: The new extension without the dot.
+
+    Returns:
+        `str`: The file name with the new extension.
+    """
+    return f"{path.splitext(file_name)[0]}.{extension}"
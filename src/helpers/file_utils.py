@@ -1,9 +1,14 @@
+from hashlib import sha256
 from os import path, urandom
 from io import BytesIO
-from numpy import asarray
-from werkzeug.utils import secure_filename
-from werkzeug.datastructures import FileStorage
-from PIL import Image, ImageDraw, ImageFont
+from numpy import array, asarray, ndarray
+from PIL import Image
+from src.helpers.annotation_utils import get_annotation_renderer
+from src.helpers.format_utils import format_dimensions, format_size
+from src.helpers.timing_utils import span
+
+# The dimensions of an image are in its header, which fits in the first bytes even after large EXIF metadata.
+IMAGE_HEADER_BYTES = 256 * 1024
 
 def generate_hex():
     """
@@ -26,87 +31,229 @@ def get_file_base_name(file_name : str):
     """
     return path.basename(file_name)
 
-def get_file(file_storage : FileStorage):
+class ImageMeta:
     """
-    Get the file from the request.
+    The metadata of an image blob, computed once and shared across the request pipeline.
+    Only the header is parsed up front; the pixels are decoded lazily the first time `image` is accessed.
     
     Parameters:
-        `file_storage`: The file storage that the user want to get.
+        `data`: The image as bytes, or none if it is only available as a `stream`.
         
-    Returns:
-        `dict`: The file name and data.
+        `format`: The format of the image, e.g. `PNG` or `JPEG`.
+        
+        `width`: The width of the image in pixels.
+        
+        `height`: The height of the image in pixels.
+        
+        `image`: The opened image, if it is already known.
+        
+        `stream`: The seekable binary file of the image, e.g. a spooled upload, read in chunks instead of at once.
+        
+        `byte_size`: The size of the `stream` in bytes.
     """
-    return {
-        'name': secure_filename(file_storage.filename),
-        'data': file_storage.read()
-    }
+    def __init__(self, data : bytes, format : str = None, width : int = None, height : int = None, image : Image = None,
+                 stream = None, byte_size : int = None):
+        self.data = data
+        self.format = format
+        self.width = width
+        self.height = height
+        self.stream = stream
+        self._byte_size = byte_size
+        self._image = image
+        self._array = None
+        self._content_hash = None
+        
+    @classmethod
+    def from_bytes(cls, data : bytes):
+        """
+        Parses the header of an image.
+        
+        Parameters:
+            `data`: The image as bytes.
+            
+        Returns:
+            `ImageMeta`: The metadata of the image. The `format`, `width`, and `height` are none if it is not an image.
+        """
+        image = convert_bytes_to_image(data)
+        if image is None:
+            return cls(data)
+        return cls(data, image.format, image.width, image.height, image)
     
-def get_image_dimensions(file_data : bytes):
-    """
-    Get the dimensions of an image.
-
-    Parameters:
-        `file_data`: The file data as bytes that the user want to get the dimensions.
-         
-    Returns:
+    @classmethod
+    def from_stream(cls, stream, byte_size : int):
+        """
+        Parses the header of an image without reading the rest of the stream.
+        
+        Parameters:
+            `stream`: The seekable binary file of the image.
+            
+            `byte_size`: The size of the stream in bytes.
+            
+        Returns:
+            `ImageMeta`: The metadata of the image. The `format`, `width`, and `height` are none if it is not an image.
+        """
+        try:
+            image = Image.open(stream)
+        except Exception:
+            image = None
+        stream.seek(0)
+        if image is None:
+            return cls(None, stream=stream, byte_size=byte_size)
+        return cls(None, image.format, image.width, image.height, image, stream=stream, byte_size=byte_size)
+    
+    @classmethod
+    def from_image(cls, image : Image.Image | ndarray, data : bytes, format : str):
+        """
+        Describes an image that was just encoded, without parsing it again.
+        
+        Parameters:
+            `image`: The image that was encoded, as PIL.Image or ndarray.
+            
+            `data`: The encoded image as bytes.
+            
+            `format`: The format the image was encoded to.
+            
+        Returns:
+            `ImageMeta`: The metadata of the encoded image.
+        """
+        if isinstance(image, ndarray):
+            return cls(data, format, image.shape[1], image.shape[0])
+        return cls(data, format, image.width, image.height)
+    
+    @property
+    def byte_size(self):
+        if self.data is None:
+            return self._byte_size
+        return len(self.data)
+    
+    @property
+    def content_hash(self):
+        """
+        `str`: The SHA-256 hex digest of the bytes, computed once. A stream is hashed in chunks.
+        """
+        if self._content_hash is None:
+            if self.data is not None:
+                self._content_hash = sha256(self.data).hexdigest()
+            else:
+                self._content_hash = get_stream_hash(self.stream)
+        return self._content_hash
+    
+    @property
+    def image(self):
+        """
+        `Image`: The fully decoded image, decoded once.
+        """
+        if self._image is None and self.data is not None:
+            self._image = convert_bytes_to_image(self.data)
+        if self._image is not None and getattr(self._image, 'im', None) is None:
+            with span('decode'):
+                self._image.load()
+        return self._image
+    
+    @property
+    def array(self):
+        """
+        `ndarray`: The writable RGB pixels of the image, copied from the decoded image once.
+        It is the input of the model unless the image is letterboxed, and the annotations are drawn on it in place.
+        """
+        if self._array is None and self.image is not None:
+            with span('decode'):
+                self._array = array(self._image if self._image.mode == 'RGB' else self._image.convert('RGB'))
+        return self._array
+    
+    @property
+    def content_type(self):
+        """
+        `str`: The MIME type of the format of the image, e.g. `image/png`.
+        """
+        return Image.MIME.get(self.format) if self.format else None
+    
+    @property
+    def dimensions(self):
+        """
         `str`: The dimensions of the image that concatenates the `width` and `height`.
-    """
-    try:
-        image = convert_bytes_to_image(file_data)
-        width, height = image.size
-        return f"{width}x{height}"
-    except Exception:
-        return None
+        """
+        return format_dimensions(self.width, self.height)
+    
+    @property
+    def size(self):
+        """
+        `str`: The size of the image in kilobytes.
+        """
+        return format_size(self.byte_size)
 
-def get_image_size(file_data : bytes):
+def get_stream_hash(stream, chunk_size : int = 64 * 1024):
     """
-    Get the size of an image.
+    Hashes a stream in chunks, so it is never read into memory at once.
     
     Parameters:
-       `file_data`: The file data as bytes that the user want to get the size.
-       
+        `stream`: The seekable binary file that the user want to hash.
+        
+        `chunk_size`: The number of bytes read at a time.
+        
     Returns:
-        `str`: The size of the image in kilobytes.
+        `str`: The SHA-256 hex digest of the stream, which is rewound to its start.
     """
-    try:
-        file_size = len(file_data)
-        size_in_kb = file_size / 1024
-        return f"{size_in_kb:.2f} kB"
-    except Exception:
-        return None
+    digest = sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
 
-def convert_image_to_ndarray(image : Image):
+def letterbox_image(image : Image, size : int):
     """
-    Convert an image to ndarray.
+    Resizes an image to fit in a square of the input size of the model while keeping its aspect ratio, then pads it.
+    Images that already fit are only converted, since the model doesn't need to shrink them.
     
     Parameters:
-        `image`: The image that the user want to convert.
+        `image`: The image that the user want to resize.
+        
+        `size`: The width and height of the input of the model.
         
     Returns:
-        `ndarray`: The image as ndarray.
+        `tuple`: The image as ndarray, the `scale` applied to it, and the `pad_x` and `pad_y` added to its left and top.
     """
-    try:
-        return asarray(image)
-    except Exception:
-        return None
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    width, height = image.size
+    scale = min(size / width, size / height)
+    if scale >= 1:
+        return asarray(image), 1, 0, 0
+    
+    resized_width, resized_height = max(round(width * scale), 1), max(round(height * scale), 1)
+    pad_x, pad_y = (size - resized_width) // 2, (size - resized_height) // 2
+    canvas = Image.new('RGB', (size, size), (114, 114, 114))
+    canvas.paste(image.resize((resized_width, resized_height), Image.BILINEAR), (pad_x, pad_y))
+    return asarray(canvas), scale, pad_x, pad_y
 
-def convert_image_to_bytes(image : Image):
+def rescale_predictions(results : dict[str, list], scale : float, pad_x : int, pad_y : int):
     """
-    Convert an image to bytes.
+    Maps the predictions of a letterboxed image back to the coordinates of the original image.
     
     Parameters:
-        `image`: The image that the user want to convert.
+        `results`: The predictions of the letterboxed image.
+        
+        `scale`: The scale returned by `letterbox_image`.
+        
+        `pad_x`: The left padding returned by `letterbox_image`.
+        
+        `pad_y`: The top padding returned by `letterbox_image`.
         
     Returns:
-        `bytes`: The image as bytes.
+        `dict[str, list]`: A copy of the results with the `x`, `y`, `width`, and `height` of the original image.
     """
-    try:
-        with BytesIO() as buf:
-            image.save(buf, format='PNG')
-            image_bytes = buf.getvalue()
-            return image_bytes
-    except Exception:
-        return None
+    if scale == 1 and pad_x == 0 and pad_y == 0:
+        return results
+    
+    predictions = [{
+        **prediction,
+        'x': (prediction['x'] - pad_x) / scale,
+        'y': (prediction['y'] - pad_y) / scale,
+        'width': prediction['width'] / scale,
+        'height': prediction['height'] / scale
+    } for prediction in results['predictions']]
+    return {**results, 'predictions': predictions}
 
 def convert_bytes_to_image(bytes : bytes):
     """
@@ -123,13 +270,14 @@ def convert_bytes_to_image(bytes : bytes):
     except Exception:
         return None
     
-def draw_boxes_on_image(image : Image, predictions : dict[str, list]):
+def draw_boxes_on_image(image : Image.Image | ndarray, predictions : dict[str, list]):
   """
   Takes an image and its list of predictions that uses x, y, width, and height to draw the bounding boxes 
-  then adds the class labels and confidence scores.
+  then adds the class labels and confidence scores, colored by the `ANNOTATION_PALETTE`.
+  The image is first converted to the type drawn on by the `ANNOTATION_RENDERER`, which an RGB ndarray already is for `opencv`.
   
   Parameters:
-    `image`: PIL.Image object to be drawn on.
+    `image`: PIL.Image object or RGB ndarray to be drawn on.
     
     `predictions`: List of predictions.
     
@@ -149,32 +297,8 @@ def draw_boxes_on_image(image : Image, predictions : dict[str, list]):
     >>> }
     
   Returns:
-    `image`: The PIL.Image that was updated with the bounding boxes and class labels.
+    `image`: The PIL.Image or ndarray that was updated with the bounding boxes and class labels.
   """
-  draw = ImageDraw.Draw(image)
-  for bounding_box in predictions:
-    x0 = bounding_box['x'] - bounding_box['width'] / 2
-    x1 = bounding_box['x'] + bounding_box['width'] / 2
-    y0 = bounding_box['y'] - bounding_box['height'] / 2
-    y1 = bounding_box['y'] + bounding_box['height'] / 2
-    
-    draw.rectangle([x0, y0, x1, y1], outline="green" if bounding_box['class'] == "Good" else "red", width=2)
-    text = f"{bounding_box['class']}: {bounding_box['confidence']:.2f}"
-    
-    fontsize = int(0.05 * image.size[1])
-    try:
-        font = ImageFont.truetype("arial.ttf", fontsize)
-    except OSError:
-        # Use default font if arial.ttf is not found in Mac/Linux/Windows.
-        font = ImageFont.load_default()
-    text_width, _ = draw.textsize(text, font=font)
-    if text_width > bounding_box['width']:
-        text_position = (x1, y0)
-    else:
-        text_position = (x0, y0)
-    
-    text_width, text_height = draw.textsize(text, font=font)
-    draw.rectangle([text_position[0], text_position[1], text_position[0] + text_width, text_position[1] + text_height], fill="black")
-    draw.text(text_position, text, fill="green" if bounding_box['class'] == "Good" else "red", font=font)
-    
-  return image
+  with span('draw'):
+    renderer = get_annotation_renderer()
+    return renderer.render(renderer.to_canvas(image), predictions)
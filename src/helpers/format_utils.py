@@ -0,0 +1,103 @@
+def format_dimensions(width : int, height : int):
+    """
+    Formats the dimensions of an image.
+
+    Parameters:
+        `width`: The width of the image in pixels.
+
+        `height`: The height of the image in pixels.
+
+    Returns:
+        `str`: The `width` and `height` concatenated, e.g. `640x480`, or none if either is unknown.
+    """
+    if width is None or height is None:
+        return None
+    return f"{width}x{height}"
+
+def format_size(byte_size : int):
+    """
+    Formats the size of a file.
+
+    Parameters:
+        `byte_size`: The size of the file in bytes.
+
+    Returns:
+        `str`: The size of the file in kilobytes, e.g. `123.45 kB`, or none if it is unknown.
+    """
+    if byte_size is None:
+        return None
+    return f"{byte_size / 1024:.2f} kB"
+
+def format_accuracy(confidence : float):
+    """
+    Formats the confidence of a prediction as the accuracy of a file.
+
+    Parameters:
+        `confidence`: The confidence of the prediction, from 0 to 1.
+
+    Returns:
+        `str`: The confidence rounded to a percent, e.g. `85%`, or none if it is unknown.
+    """
+    if confidence is None:
+        return None
+    return f"{round(confidence, 2) * 100:.0f}%"
+
+def format_error_rate(confidence : float):
+    """
+    Formats the confidence of a prediction as the error rate of a file.
+
+    Parameters:
+        `confidence`: The confidence of the prediction, from 0 to 1.
+
+    Returns:
+        `str`: The complement of the accuracy, e.g. `15%`, or none if it is unknown.
+    """
+    if confidence is None:
+        return None
+    return f"{100 - round(confidence, 2) * 100:.0f}%"
+
+def parse_dimensions(dimensions : str):
+    """
+    Parses the dimensions formatted by `format_dimensions`.
+
+    Parameters:
+        `dimensions`: The formatted dimensions, e.g. `640x480`.
+
+    Returns:
+        `tuple[int, int]`: The `width` and `height`, or none for both if they can't be parsed.
+    """
+    try:
+        width, height = dimensions.lower().split('x')
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        return None, None
+
+def parse_size(size : str):
+    """
+    Parses the size formatted by `format_size`.
+
+    Parameters:
+        `size`: The formatted size, e.g. `123.45 kB`.
+
+    Returns:
+        `int`: The size in bytes, approximated from its two decimals, or none if it can't be parsed.
+    """
+    try:
+        return round(float(size.lower().replace('kb', '').strip()) * 1024)
+    except (AttributeError, ValueError):
+        return None
+
+def parse_accuracy(accuracy : str):
+    """
+    Parses the accuracy formatted by `format_accuracy`.
+
+    Parameters:
+        `accuracy`: The formatted accuracy, e.g. `85%`.
+
+    Returns:
+        `float`: The confidence from 0 to 1, or none if it can't be parsed.
+    """
+    try:
+        return float(accuracy.replace('%', '').strip()) / 100
+    except (AttributeError, ValueError):
+        return None
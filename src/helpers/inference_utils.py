@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from threading import Lock
+from numpy import ascontiguousarray, ndarray, stack
+
+_local_predict_lock = Lock()
+
+class UnsupportedModelError(Exception):
+    """
+    Raised if the selected inference backend can't predict with the requested model, e.g. the weights of a user
+    with the `local` backend, if they were deployed without a `model_path`.
+    """
+
+class InferenceBackend(ABC):
+    """
+    The interface of an inference backend used by `perform_inference`.
+    Every backend returns the predictions in the Roboflow shape consumed by `get_result_details` and `draw_boxes_on_image`.
+
+    Example:
+        >>> {
+        >>>   "predictions": [
+        >>>     {"x": 172, "y": 113.5, "width": 72, "height": 87, "confidence": 0.697, "class": "Good", "class_id": 0}
+        >>>   ]
+        >>> }
+    """
+    name = None
+
+    @abstractmethod
+    def predict(self, image : ndarray, confidence : int = 20, overlap : int = 30):
+        """
+        Predicts the objects of an image.
+
+        Parameters:
+            `image`: The RGB image as ndarray.
+
+            `confidence`: The minimum confidence of a prediction in percent.
+
+            `overlap`: The maximum overlap between predictions of the same class in percent.
+
+        Returns:
+            `dict[str, list]`: The `predictions` of the image.
+        """
+
+    def predict_batch(self, images : list[ndarray], confidence : int = 20, overlap : int = 30):
+        """
+        Predicts the objects of several images. Backends that can run a whole batch at once override this.
+
+        Parameters:
+            `images`: The RGB images as ndarrays.
+
+            `confidence`: The minimum confidence of a prediction in percent.
+
+            `overlap`: The maximum overlap between predictions of the same class in percent.
+
+        Returns:
+            `list[dict[str, list]]`: The `predictions` of each image, in the same order.
+        """
+        return [self.predict(image, confidence, overlap) for image in images]
+
+class RoboflowBackend(InferenceBackend):
+    """
+    Sends the images to a model hosted by Roboflow.
+
+    Parameters:
+        `model`: The Roboflow model handle.
+    """
+    name = 'roboflow'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, image : ndarray, confidence : int = 20, overlap : int = 30):
+        return self.model.predict(image, confidence=confidence, overlap=overlap).json()
+
+    def predict_batch(self, images : list[ndarray], confidence : int = 20, overlap : int = 30):
+        # The hosted API takes a single image per request, so a batch is sent as concurrent requests.
+        if len(images) <= 1:
+            return super().predict_batch(images, confidence, overlap)
+        with ThreadPoolExecutor(max_workers=len(images)) as executor:
+            return list(executor.map(lambda image: self.predict(image, confidence, overlap), images))
+
+class LocalYoloBackend(InferenceBackend):
+    """
+    Runs a YOLO model in-process with `ultralytics`.
+
+    Parameters:
+        `model`: The loaded `ultralytics.YOLO` model.
+
+        `device`: The device that runs the predictions, e.g. `cpu` or `cuda:0`.
+    """
+    name = 'local'
+
+    def __init__(self, model, device : str = 'cpu'):
+        self.model = model
+        self.device = device
+
+    def predict(self, image : ndarray, confidence : int = 20, overlap : int = 30):
+        return self.predict_batch([image], confidence, overlap)[0]
+
+    def predict_batch(self, images : list[ndarray], confidence : int = 20, overlap : int = 30):
+        sources = [to_bgr(image) for image in images]
+        # The predictor of an `ultralytics` model keeps per-call state, so the shared model runs one batch at a time.
+        with _local_predict_lock:
+            results = self.model.predict(sources, conf=confidence / 100, iou=overlap / 100, device=self.device, verbose=False)
+        return [{'predictions': get_yolo_predictions(result)} for result in results]
+
+def to_bgr(image : ndarray):
+    """
+    Converts a grayscale, RGB, or RGBA ndarray to the BGR channel order expected by `ultralytics`.
+
+    Parameters:
+        `image`: The image as ndarray.
+
+    Returns:
+        `ndarray`: The contiguous BGR image.
+    """
+    if image.ndim == 2:
+        image = stack((image,) * 3, axis=-1)
+    return ascontiguousarray(image[..., 2::-1])
+
+def get_yolo_predictions(result):
+    """
+    Converts an `ultralytics` result into the Roboflow predictions shape.
+
+    Parameters:
+        `result`: The `ultralytics.engine.results.Results` of an image.
+
+    Returns:
+        `list[dict]`: The predictions with `x`, `y`, `width`, `height`, `confidence`, `class`, and `class_id`.
+    """
+    boxes = result.boxes
+    predictions = []
+    for (x, y, width, height), confidence, class_id in zip(boxes.xywh.tolist(), boxes.conf.tolist(), boxes.cls.tolist()):
+        predictions.append({
+            'x': x,
+            'y': y,
+            'width': width,
+            'height': height,
+            'confidence': confidence,
+            'class': result.names[int(class_id)],
+            'class_id': int(class_id)
+        })
+    return sorted(predictions, key=lambda prediction: prediction['confidence'], reverse=True)
+
+def get_local_weights_path(model_path : str):
+    """
+    Gets the path of the weights file from the path used by `/api/v1/weights/deploy`.
+
+    Parameters:
+        `model_path`: The path of the parent folder of the model or the path of the `.pt` file itself.
+
+    Example:
+        >>> "path/to/parent/folder/"
+        >>> # this folder must contain the following files:
+        >>> "weights/best.pt"
+
+    Returns:
+        `str`: The path of the `.pt` file.
+    """
+    if model_path.endswith('.pt'):
+        return model_path
+    return path.join(model_path, 'weights', 'best.pt')
+
+def load_local_model(model_path : str):
+    """
+    Loads the YOLO weights from the disk. `ultralytics` is imported lazily so that it is only required by the local backend.
+
+    Parameters:
+        `model_path`: The path of the parent folder of the model or the path of the `.pt` file itself.
+
+    Returns:
+        `YOLO`: The loaded model.
+    """
+    from ultralytics import YOLO
+    return YOLO(get_local_weights_path(model_path))
@@ -0,0 +1,242 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from json import dumps, loads
+from os import getpid
+from threading import Event, Lock, Thread
+from uuid import uuid4
+from flask import current_app
+from sqlalchemy import select, update
+from extensions import db
+from src.constants.status_codes import HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
+from src.helpers.analysis_utils import analyze_file
+from src.models.jobs import Jobs
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+JOB_HANDLERS = {
+    'analyze': analyze_file
+}
+
+_executor = None
+_executor_pid = None
+_pending_jobs = 0
+_lock = Lock()
+
+def get_job_executor():
+    """
+    Gets the pool of `ANALYSIS_WORKERS` threads that runs the jobs of the process.
+    Threads don't survive a fork, so a forked worker process creates its own pool.
+
+    Returns:
+        `ThreadPoolExecutor`: The pool of the process.
+    """
+    global _executor, _executor_pid, _pending_jobs
+    with _lock:
+        if _executor is None or _executor_pid != getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=int(current_app.config.get('ANALYSIS_WORKERS') or 2), thread_name_prefix='analysis-job'
+            )
+            _executor_pid = getpid()
+            _pending_jobs = 0
+        return _executor
+
+def reserve_job_slot():
+    """
+    Reserves one of the `ANALYSIS_QUEUE_SIZE` slots of the pool of the process. The check and the increment are done
+    under the lock, so concurrent requests can't overfill the queue.
+
+    Returns:
+        `bool`: Whether a slot was reserved, otherwise false if the queue is full.
+    """
+    global _pending_jobs
+    get_job_executor()
+    with _lock:
+        if _pending_jobs >= int(current_app.config.get('ANALYSIS_QUEUE_SIZE') or 100):
+            return False
+        _pending_jobs += 1
+        return True
+
+def release_job_slot():
+    """
+    Releases a slot reserved by `reserve_job_slot`.
+    """
+    global _pending_jobs
+    with _lock:
+        _pending_jobs -= 1
+
+def schedule_job(job_id : str):
+    """
+    Schedules a persisted job on the pool of the process. The slot of the job must be reserved first, and it is
+    released once the job is done.
+
+    Parameters:
+        `job_id`: The id of the queued job.
+    """
+    get_job_executor().submit(run_job, current_app._get_current_object(), job_id)
+
+def submit_job(type : str, user_id : str, payload : dict):
+    """
+    Persists a job then schedules it, unless `ANALYSIS_QUEUE_SIZE` jobs are already pending in this process.
+
+    Parameters:
+        `type`: The type of the job that is one of the `JOB_HANDLERS`.
+
+        `user_id`: The id of the user that submitted the job.
+
+        `payload`: The JSON body given to the handler of the job.
+
+    Returns:
+        `Jobs`: The queued job, otherwise none if the queue is full.
+    """
+    if not reserve_job_slot():
+        return None
+
+    try:
+        job = Jobs(id=str(uuid4()), user_id=user_id, type=type, state=JOB_QUEUED, payload=dumps(payload))
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        release_job_slot()
+        raise
+    schedule_job(job.id)
+    return job
+
+def get_job_timeout(app):
+    """
+    Gets the lease of a running job, i.e. `ANALYSIS_JOB_TIMEOUT` seconds without a heartbeat.
+
+    Parameters:
+        `app`: The Flask application.
+
+    Returns:
+        `float`: The lease in seconds.
+    """
+    return float(app.config.get('ANALYSIS_JOB_TIMEOUT') or 300)
+
+def keep_job_alive(app, job_id : str, stopped : Event):
+    """
+    Touches the `updated_at` of a running job a few times per lease until it is stopped, so that a job running longer
+    than `ANALYSIS_JOB_TIMEOUT` isn't taken for the job of a dead worker.
+
+    Parameters:
+        `app`: The Flask application.
+
+        `job_id`: The id of the running job.
+
+        `stopped`: The event set once the job is done.
+    """
+    with app.app_context():
+        while not stopped.wait(get_job_timeout(app) / 3):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(Jobs).where(Jobs.id == job_id, Jobs.state == JOB_RUNNING).values(updated_at=datetime.now())
+                    )
+            except Exception as e:
+                app.logger.warning(f"The heartbeat of the job {job_id} failed: {e}")
+
+def run_job(app, job_id : str):
+    """
+    Claims a queued job, runs its handler, and saves its result.
+    The claim is a conditional update so a job is only ever run by one worker, and a heartbeat keeps the claim alive
+    while the handler runs.
+
+    Parameters:
+        `app`: The Flask application whose context the job runs in.
+
+        `job_id`: The id of the queued job.
+    """
+    try:
+        with app.app_context():
+            claimed = db.session.query(Jobs).filter_by(id=job_id, state=JOB_QUEUED).update(
+                {'state': JOB_RUNNING, 'updated_at': datetime.now()}, synchronize_session=False
+            )
+            db.session.commit()
+            if not claimed:
+                return
+
+            stopped = Event()
+            Thread(target=keep_job_alive, args=(app, job_id, stopped), name='analysis-job-heartbeat', daemon=True).start()
+            job = db.session.get(Jobs, job_id)
+            try:
+                response, status = JOB_HANDLERS[job.type](job.user_id, loads(job.payload))
+                result = response.get_json()
+            except Exception as e:
+                db.session.rollback()
+                response, status, result = None, HTTP_500_INTERNAL_SERVER_ERROR, {'error': str(e)}
+            finally:
+                stopped.set()
+
+            job = db.session.get(Jobs, job_id)
+            job.state = JOB_SUCCEEDED if status < HTTP_400_BAD_REQUEST else JOB_FAILED
+            job.status = status
+            job.result = dumps(result, default=str)
+            db.session.commit()
+            db.session.remove()
+    finally:
+        release_job_slot()
+
+def resume_pending_jobs(app):
+    """
+    Schedules the jobs that were queued before a restart. Running jobs keep a heartbeat, so only those whose lease of
+    `ANALYSIS_JOB_TIMEOUT` seconds expired belonged to a worker that died. Each of them is queued again with a
+    conditional update on the `updated_at` that was read, so a job whose heartbeat came in meanwhile is left to its
+    worker, and a job reclaimed by a sibling worker is only counted once.
+    At most `ANALYSIS_QUEUE_SIZE` jobs are scheduled by each worker, the oldest first, and the claim of `run_job`
+    makes sure a job scheduled by several workers only runs once.
+
+    Parameters:
+        `app`: The Flask application.
+
+    Returns:
+        `int`: The number of scheduled jobs.
+    """
+    with app.app_context():
+        stale = datetime.now() - timedelta(seconds=get_job_timeout(app))
+        expired = db.session.execute(
+            select(Jobs.id, Jobs.updated_at).where(Jobs.state == JOB_RUNNING, Jobs.updated_at < stale)
+        ).all()
+        for job_id, updated_at in expired:
+            reclaimed = db.session.execute(
+                update(Jobs)
+                .where(Jobs.id == job_id, Jobs.state == JOB_RUNNING, Jobs.updated_at == updated_at)
+                .values(state=JOB_QUEUED, updated_at=datetime.now())
+            )
+            if reclaimed.rowcount:
+                app.logger.warning(f"The job {job_id} lost its worker and was queued again.")
+        db.session.commit()
+        queue_size = int(app.config.get('ANALYSIS_QUEUE_SIZE') or 100)
+        job_ids = db.session.execute(
+            select(Jobs.id).where(Jobs.state == JOB_QUEUED).order_by(Jobs.created_at).limit(queue_size)
+        ).scalars().all()
+        db.session.remove()
+        scheduled = 0
+        for job_id in job_ids:
+            if not reserve_job_slot():
+                break
+            schedule_job(job_id)
+            scheduled += 1
+        return scheduled
+
+def get_job_details(job : Jobs):
+    """
+    Gets the details of a job.
+
+    Parameters:
+        `job`: The job.
+
+    Returns:
+        `dict`: The `id`, `type`, `state`, `status`, `result`, `created_at`, and `updated_at` of the job.
+    """
+    return {
+        'id': job.id,
+        'type': job.type,
+        'state': job.state,
+        'status': job.status,
+        'result': loads(job.result) if job.result else None,
+        'created_at': job.created_at,
+        'updated_at': job.updated_at
+    }
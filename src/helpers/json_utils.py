@@ -0,0 +1,55 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Encodes the JSON of the application with orjson, which writes bytes from native code instead of building a string
+    in Python. The dates are still formatted as HTTP dates and the keys are sorted, so the responses keep their format.
+    Any call with the options of the `json` module falls back to it.
+    """
+    def get_options(self, indent : bool = False):
+        """
+        Gets the orjson options matching the settings of the provider.
+
+        Parameters:
+            `indent`: Whether to indent the output for readability.
+
+        Returns:
+            `int`: The orjson options.
+        """
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.get_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        data = orjson.dumps(obj, default=self.default, option=self.get_options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+def init_json(app):
+    """
+    Makes the application encode its JSON with orjson if it is installed, otherwise with the `json` module.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,198 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from src.helpers.format_utils import parse_accuracy, parse_dimensions, parse_size
+from src.helpers.stats_utils import get_stats_columns
+from src.models.file_stats import FileStats
+from src.models.files import Files
+from src.models.schema_migrations import SchemaMigrations
+from src.models.users import Users
+
+def add_missing_columns():
+    """
+    Adds the columns of the models that are missing from their existing tables, since `db.create_all` only creates
+    the missing tables. The columns are added as nullable, so the existing rows keep working until they are backfilled.
+
+    Returns:
+        `list[str]`: The added columns as `table.column`.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def add_missing_indexes():
+    """
+    Creates the indexes of the models that are missing from their existing tables, since `db.create_all` only creates
+    the indexes of the tables it creates. Each index is created in its own statement outside of a transaction, and
+    `CONCURRENTLY` on PostgreSQL, so the writes to the table aren't blocked while it is built. MySQL builds them in place.
+
+    Returns:
+        `list[str]`: The names of the created indexes.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    concurrently = db.engine.dialect.name == 'postgresql'
+    created = []
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if concurrently:
+                    index.dialect_options['postgresql']['concurrently'] = True
+                try:
+                    index.create(connection)
+                finally:
+                    if concurrently:
+                        index.dialect_options['postgresql']['concurrently'] = False
+                created.append(index.name)
+    return created
+
+def store_object_paths(connection):
+    """
+    Replaces the public URLs of the files and profile images stored by Supabase with their paths in the bucket.
+    The URLs of images hosted elsewhere are kept as they are. Without `SUPABASE_URL`, e.g. with the local backend,
+    no file was stored by Supabase, so there is nothing to replace.
+
+    Parameters:
+        `connection`: The connection of the transaction of the migration.
+    """
+    config = current_app.config
+    if not config.get('SUPABASE_URL'):
+        return
+    storage_url = f"{config['SUPABASE_URL']}/storage/v1/object/public"
+    for model, column, bucket in (
+        (Files, Files.url, 'FILES'),
+        (Files, Files.source_url, 'FILES'),
+        (Users, Users.profile_image, 'PROFILE_IMAGES')
+    ):
+        prefix = f"{storage_url}/{config.get(f'SUPABASE_BUCKET_{bucket}')}/"
+        connection.execute(
+            update(model)
+            .where(column.startswith(prefix, autoescape=True))
+            .values({column.name: func.substr(column, len(prefix) + 1)})
+        )
+
+def store_file_metrics(connection, batch_size : int = 1000):
+    """
+    Backfills the `width`, `height`, `byte_size`, and `confidence` of the files from their formatted `dimensions`, `size`,
+    and `accuracy`. The files are read in batches by their id, so the table is never loaded at once, and each batch is
+    committed, so the locks are held for a batch only. A migration that was interrupted resumes with the files that
+    are still missing their metrics.
+
+    Parameters:
+        `connection`: The connection of the migration, outside of a transaction block, see `BATCHED_MIGRATIONS`.
+
+        `batch_size`: The number of files read and updated at a time.
+    """
+    files = Files.__table__
+    backfill = (
+        update(files)
+        .where(files.c.id == bindparam('file_id'))
+        .values(
+            width=bindparam('new_width'), height=bindparam('new_height'),
+            byte_size=bindparam('new_byte_size'), confidence=bindparam('new_confidence')
+        )
+    )
+    last_id = ''
+    while True:
+        rows = connection.execute(
+            select(files.c.id, files.c.dimensions, files.c.size, files.c.accuracy)
+            .where(files.c.id > last_id, files.c.width.is_(None), files.c.byte_size.is_(None), files.c.confidence.is_(None))
+            .order_by(files.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            width, height = parse_dimensions(row.dimensions)
+            values.append({
+                'file_id': row.id,
+                'new_width': width,
+                'new_height': height,
+                'new_byte_size': parse_size(row.size),
+                'new_confidence': parse_accuracy(row.accuracy)
+            })
+        connection.execute(backfill, values)
+        connection.commit()
+        last_id = rows[-1].id
+
+def store_file_stats(connection):
+    """
+    Counts the existing files in the `file_stats` summary table, grouped by the database.
+
+    Parameters:
+        `connection`: The connection of the transaction of the migration.
+    """
+    columns = get_stats_columns()
+    connection.execute(delete(FileStats))
+    connection.execute(
+        insert(FileStats).from_select(
+            ['user_id', 'weight_id', 'classification', 'day', 'confidence_bucket', 'file_count', 'confidence_sum'],
+            select(*columns, func.count(), func.coalesce(func.sum(Files.confidence), 0))
+            .where(Files.user_id.is_not(None), Files.created_at.is_not(None))
+            .group_by(*columns)
+        )
+    )
+
+DATA_MIGRATIONS = {
+    '0001_store_object_paths': store_object_paths,
+    '0002_store_file_metrics': store_file_metrics,
+    '0003_store_file_stats': store_file_stats
+}
+
+# The migrations that commit their own batches, so they are given a connection without a transaction block.
+BATCHED_MIGRATIONS = {'0002_store_file_metrics'}
+
+def run_data_migrations():
+    """
+    Runs the `DATA_MIGRATIONS` that were not applied yet, in order, each in its own transaction with its version
+    recorded in the `schema_migrations` table. A migration that fails is rolled back, logged, and retried on the next
+    start, while the next ones still run.
+    The `BATCHED_MIGRATIONS` commit their batches instead, and their version is recorded once every batch is done.
+
+    Returns:
+        `list[str]`: The versions that were applied.
+    """
+    with db.engine.connect() as connection:
+        applied_versions = set(connection.execute(select(SchemaMigrations.version)).scalars())
+    applied = []
+    for version, migration in DATA_MIGRATIONS.items():
+        if version in applied_versions:
+            continue
+        try:
+            if version in BATCHED_MIGRATIONS:
+                with db.engine.connect() as connection:
+                    migration(connection)
+                    connection.execute(insert(SchemaMigrations).values(version=version, applied_at=datetime.now()))
+                    connection.commit()
+            else:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(SchemaMigrations).values(version=version, applied_at=datetime.now()))
+                    migration(connection)
+        except IntegrityError:
+            # Another worker applied it at the same time.
+            continue
+        except Exception:
+            current_app.logger.exception(f"The data migration {version} failed.")
+            continue
+        applied.append(version)
+    return applied
@@ -0,0 +1,221 @@
+from collections import Counter
+from hashlib import sha256
+from os import path as os_path
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from extensions import db
+from src.helpers.file_utils import get_stream_hash
+from src.helpers.stats_utils import remove_file_stats
+from src.helpers.supabase_utils import delete_files_by_name, upload_file_to_bucket
+from src.models.files import Files
+from src.models.stored_objects import StoredObjects
+
+# Only the annotated results belong to the rows of the files. The uploads are kept, like before they were content-addressed.
+OWNED_PREFIXES = ('main/',)
+
+def is_content_addressed():
+    """
+    Checks if the files are stored under the hash of their content, i.e. if `STORAGE_CONTENT_ADDRESSED` is on.
+
+    Returns:
+        `bool`: True if identical files are stored once, otherwise False.
+    """
+    return bool(current_app.config.get('STORAGE_CONTENT_ADDRESSED'))
+
+def get_content_path(path : str, content_hash : str):
+    """
+    Gets the content-addressed path of a file, shared by every file with the same content under the same root folder.
+
+    Parameters:
+        `path`: The path that the file would have otherwise, e.g. `main/<user>/<hex><name>.jpg`.
+
+        `content_hash`: The SHA-256 hex digest of the file.
+
+    Example:
+        >>> get_content_path("main/user/1a2b3c4dimage.jpg", "ab12...")
+        >>> "main/objects/ab/ab12....jpg"
+
+    Returns:
+        `str`: The path of the file under the `objects` folder of its root folder.
+    """
+    root = path.split('/', 1)[0]
+    extension = os_path.splitext(path)[1].lower()
+    return f"{root}/objects/{content_hash[:2]}/{content_hash}{extension}"
+
+def store_file(bucket : str, path : str, data, content_type : str = None):
+    """
+    Uploads a file to a specified bucket. With `STORAGE_CONTENT_ADDRESSED`, the file is stored under the hash of its content
+    and its reference count is incremented, so a file that is already stored isn't transferred again.
+
+    Parameters:
+        `bucket`: The bucket name that the user want to upload the file.
+
+        `path`: The path of the file if it isn't content-addressed.
+
+        `data`: The data of the file as bytes, or a spooled upload.
+
+        `content_type`: The content type of the data.
+
+    Returns:
+        `str`: The path of the file in the bucket.
+
+        `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
+    """
+    if not is_content_addressed():
+        return upload_file_to_bucket(bucket, path, data, content_type)
+
+    content_hash = sha256(data).hexdigest() if isinstance(data, bytes) else get_stream_hash(data)
+    path = get_content_path(path, content_hash)
+    if add_reference(bucket, path):
+        return path
+
+    # Another request may store the same content at the same time, so the upload overwrites instead of failing.
+    supabase_response = upload_file_to_bucket(bucket, path, data, content_type, upsert=True)
+    if type(supabase_response) is not str:
+        return supabase_response
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(StoredObjects).values(bucket=bucket, path=path, ref_count=1))
+    except IntegrityError:
+        add_reference(bucket, path, uploaded=True)
+    return path
+
+def add_reference(bucket : str, path : str, uploaded : bool = False):
+    """
+    Increments the reference count of a stored file.
+
+    Parameters:
+        `bucket`: The bucket name of the file.
+
+        `path`: The content-addressed path of the file.
+
+        `uploaded`: Whether the file was just uploaded, so a file that `collect_garbage` marked as missing is counted too.
+
+    Returns:
+        `bool`: True if the file is stored, otherwise False.
+    """
+    statement = update(StoredObjects).where(StoredObjects.bucket == bucket, StoredObjects.path == path)
+    if uploaded:
+        statement = statement.values(ref_count=StoredObjects.ref_count + 1, missing=False)
+    else:
+        statement = statement.where(StoredObjects.missing.is_not(True)).values(ref_count=StoredObjects.ref_count + 1)
+    with db.engine.begin() as connection:
+        result = connection.execute(statement)
+    return result.rowcount > 0
+
+def release_references(bucket : str, paths : list[str]):
+    """
+    Decrements the reference counts of stored files in the session, once the rows that referenced them were deleted.
+    The counts are locked until the session is committed, so a concurrent `add_reference` waits for them.
+    A file that nothing references anymore keeps its row with a count of zero until `collect_garbage` removes it,
+    including an untracked file, unless another file still references it. The caller commits the session.
+
+    Parameters:
+        `bucket`: The bucket name of the files.
+
+        `paths`: The path of each released reference, repeated if several rows referenced the same file.
+
+    Returns:
+        `list[str]`: The paths of the files that nothing references anymore.
+    """
+    references = Counter(paths)
+    ref_counts = dict(db.session.execute(
+        select(StoredObjects.path, StoredObjects.ref_count)
+        .where(StoredObjects.bucket == bucket, StoredObjects.path.in_(references))
+        .order_by(StoredObjects.path)
+        .with_for_update()
+    ).all())
+
+    paths_by_count = {}
+    for path, count in references.items():
+        if path in ref_counts:
+            paths_by_count.setdefault(count, []).append(path)
+    for count, counted_paths in paths_by_count.items():
+        db.session.execute(
+            update(StoredObjects)
+            .where(StoredObjects.bucket == bucket, StoredObjects.path.in_(counted_paths))
+            .values(ref_count=StoredObjects.ref_count - count)
+        )
+
+    untracked = [path for path in references if path not in ref_counts]
+    if untracked:
+        referenced = set(db.session.execute(select(Files.url).where(Files.url.in_(untracked))).scalars())
+        untracked = [path for path in untracked if path not in referenced]
+        if untracked:
+            db.session.execute(insert(StoredObjects), [{'bucket': bucket, 'path': path, 'ref_count': 0} for path in untracked])
+    return [path for path, count in ref_counts.items() if count <= references[path]] + untracked
+
+def collect_garbage(bucket : str, paths : list[str] = ()):
+    """
+    Removes the stored files that nothing references anymore, along with up to `STORAGE_DELETE_CHUNK_SIZE` other ones
+    that failed to be removed before. The files are removed in one call to `delete_files_by_name`, which sends its
+    chunks concurrently, and no row is locked meanwhile. Their rows are then deleted only if their count is still zero.
+    A file that `add_reference` counted again while it was removed keeps its row, marked as missing, so the next
+    `store_file` of the same content uploads it again. A file that fails to be removed keeps its row to be retried.
+
+    Parameters:
+        `bucket`: The bucket name of the files.
+
+        `paths`: The paths returned by `release_references`, once its session was committed.
+
+    Returns:
+        `list[dict]`: The `name` and `error` of each file that failed to be removed.
+    """
+    chunk_size = int(current_app.config.get('STORAGE_DELETE_CHUNK_SIZE') or 100)
+    paths = set(paths)
+    try:
+        with db.engine.connect() as connection:
+            garbage = connection.execute(
+                select(StoredObjects.path)
+                .where(StoredObjects.bucket == bucket, StoredObjects.ref_count <= 0, StoredObjects.path.in_(paths))
+            ).scalars().all()
+            leftovers = connection.execute(
+                select(StoredObjects.path)
+                .where(StoredObjects.bucket == bucket, StoredObjects.ref_count <= 0, StoredObjects.path.notin_(paths))
+                .order_by(StoredObjects.path)
+                .limit(chunk_size)
+            ).scalars().all()
+    except SQLAlchemyError as e:
+        return [{'name': path, 'error': str(e)} for path in paths]
+
+    candidates = sorted(set(garbage).union(leftovers))
+    if not candidates:
+        return []
+    failed = delete_files_by_name(bucket, candidates)
+    failed_paths = {failure['name'] for failure in failed}
+    removed = [path for path in candidates if path not in failed_paths]
+    if not removed:
+        return failed
+    try:
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                delete(StoredObjects)
+                .where(StoredObjects.bucket == bucket, StoredObjects.path.in_(removed), StoredObjects.ref_count <= 0)
+            )
+            if result.rowcount < len(removed):
+                connection.execute(
+                    update(StoredObjects)
+                    .where(StoredObjects.bucket == bucket, StoredObjects.path.in_(removed))
+                    .values(missing=True)
+                )
+    except SQLAlchemyError as e:
+        failed.extend({'name': path, 'error': str(e)} for path in removed)
+    return failed
+
+def delete_files(query):
+    """
+    Deletes the rows of a query of files and releases their stored files, in the session. The rows are uncounted from
+    the `file_stats` summary table. The caller commits the session, then removes the released files with `collect_garbage`,
+    so a row is never left referencing a removed file.
+
+    Parameters:
+        `query`: The query of the `Files` to be deleted.
+
+    Returns:
+        `tuple`: The number of `deleted` rows, and the paths of the `released` files that nothing references anymore.
+    """
+    paths = [url for url, in query.with_entities(Files.url) if url and url.startswith(OWNED_PREFIXES)]
+    remove_file_stats(query)
+    deleted = query.delete(synchronize_session=False)
+    return deleted, release_references("FILES", paths)
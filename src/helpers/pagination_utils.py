@@ -0,0 +1,110 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from json import dumps, loads
+from flask import current_app
+from sqlalchemy import and_, or_
+
+def get_page_size(value):
+    """
+    Gets the size of a page, capped by `PAGE_SIZE_MAX`.
+
+    Parameters:
+        `value`: The `limit` of the request, if any.
+
+    Returns:
+        `int`: The requested size between 1 and `PAGE_SIZE_MAX`, otherwise `PAGE_SIZE_DEFAULT`.
+
+    Raises:
+        `ValueError`: If the value is not a number.
+    """
+    max_size = int(current_app.config.get('PAGE_SIZE_MAX') or 200)
+    if value in (None, ''):
+        return min(int(current_app.config.get('PAGE_SIZE_DEFAULT') or 50), max_size)
+    return min(max(int(value), 1), max_size)
+
+def encode_cursor(created_at : datetime, id : str):
+    """
+    Encodes the position of the last row of a page.
+
+    Parameters:
+        `created_at`: The creation date of the row.
+
+        `id`: The unique identifier of the row, which orders the rows created at the same time.
+
+    Returns:
+        `str`: The opaque cursor of the next page.
+    """
+    return urlsafe_b64encode(dumps([created_at.isoformat() if created_at else None, id]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor : str):
+    """
+    Decodes a cursor from `encode_cursor`.
+
+    Parameters:
+        `cursor`: The cursor of the request.
+
+    Returns:
+        `tuple[datetime, str]`: The creation date and the unique identifier of the last row of the previous page.
+
+    Raises:
+        `ValueError`: If the cursor is malformed.
+    """
+    try:
+        created_at, id = loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(created_at) if created_at else None), str(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor.') from e
+
+def parse_date(value : str):
+    """
+    Parses a bound of a date range.
+
+    Parameters:
+        `value`: The ISO 8601 date or date and time of the request, if any.
+
+    Returns:
+        `datetime`: The parsed date, or none if there is no value.
+
+    Raises:
+        `ValueError`: If the value is not an ISO 8601 date.
+    """
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def paginate(query, schema, names : list[str], created_at, id, cursor : str = None, limit : int = 50):
+    """
+    Gets a page of a query ordered from the newest row, by keyset on (`created_at`, `id`), so a page is read through
+    an index wherever it is in the list. Only the columns of the requested fields are selected.
+
+    Parameters:
+        `query`: The filtered query of the rows.
+
+        `schema`: The `Schema` of the rows.
+
+        `names`: The fields to be returned.
+
+        `created_at`: The creation date column.
+
+        `id`: The unique identifier column.
+
+        `cursor`: The cursor of the previous page, if any.
+
+        `limit`: The size of the page.
+
+    Returns:
+        `tuple`: The serialized rows of the page, and the cursor of the next page, or none if it is the last page.
+
+    Raises:
+        `ValueError`: If the cursor is malformed.
+    """
+    query = schema.select(query, names, created_at, id)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(created_at < cursor_created_at, and_(created_at == cursor_created_at, id < cursor_id)))
+    rows = query.order_by(created_at.desc(), id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], created_at.key), getattr(rows[-1], id.key))
+    return schema.dump_all(rows, names), next_cursor
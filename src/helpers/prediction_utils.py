@@ -0,0 +1,57 @@
+from json import dumps, loads
+
+def pack_predictions(predictions : list[dict]):
+    """
+    Serializes predictions compactly, so they can be stored with the file and rendered later.
+    The class names are stored once and every prediction becomes a row of rounded numbers.
+
+    Parameters:
+        `predictions`: List of predictions with `x`, `y`, `width`, `height`, `confidence`, `class`, and `class_id`.
+
+    Example:
+        >>> pack_predictions([{"x": 172, "y": 113.5, "width": 72, "height": 87, "confidence": 0.697, "class": "Good", "class_id": 0}])
+        >>> '{"c":["Good"],"p":[[172,113.5,72,87,0.697,0,0]]}'
+
+    Returns:
+        `str`: The JSON of the `c`lasses and the `p`redictions as `[x, y, width, height, confidence, class index, class_id]`.
+    """
+    classes = []
+    indexes = {}
+    rows = []
+    for prediction in predictions:
+        index = indexes.get(prediction['class'])
+        if index is None:
+            index = indexes[prediction['class']] = len(classes)
+            classes.append(prediction['class'])
+        rows.append([
+            round(prediction['x'], 1),
+            round(prediction['y'], 1),
+            round(prediction['width'], 1),
+            round(prediction['height'], 1),
+            round(prediction['confidence'], 4),
+            index,
+            prediction.get('class_id')
+        ])
+    return dumps({'c': classes, 'p': rows}, separators=(',', ':'))
+
+def unpack_predictions(packed : str):
+    """
+    Deserializes the predictions of `pack_predictions`.
+
+    Parameters:
+        `packed`: The JSON returned by `pack_predictions`.
+
+    Returns:
+        `list[dict]`: The predictions with `x`, `y`, `width`, `height`, `confidence`, `class`, and `class_id`.
+    """
+    values = loads(packed)
+    classes = values['c']
+    return [{
+        'x': x,
+        'y': y,
+        'width': width,
+        'height': height,
+        'confidence': confidence,
+        'class': classes[index],
+        'class_id': class_id
+    } for x, y, width, height, confidence, index, class_id in values['p']]
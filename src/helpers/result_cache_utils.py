@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+from hashlib import sha256
+from json import dumps, loads
+from threading import Lock
+from time import monotonic
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from extensions import db
+from src.helpers.cache_utils import TTLCache
+from src.models.inference_results import InferenceResults
+
+_result_cache = None
+_result_cache_lock = Lock()
+
+def get_model_cache_prefix(model_key : tuple):
+    """
+    Gets the prefix shared by the keys of every inference result of a model, so they can be invalidated together.
+
+    Parameters:
+        `model_key`: The identity of the model, e.g. (`api_key`, `project_name`, `version_number`).
+
+    Returns:
+        `str`: The first 32 hex digits of the SHA-256 of the model.
+    """
+    return sha256(repr(model_key).encode()).hexdigest()[:32]
+
+def get_inference_cache_key(content_hash : str, model_key : tuple, confidence : int, overlap : int):
+    """
+    Gets the key of an inference result from the content of the image and the parameters of the prediction.
+    The same image re-uploaded under another name therefore shares its key.
+
+    Parameters:
+        `content_hash`: The SHA-256 hex digest of the image bytes, i.e. `ImageMeta.content_hash`.
+
+        `model_key`: The identity of the model, e.g. (`api_key`, `project_name`, `version_number`).
+
+        `confidence`: The minimum confidence of a prediction in percent.
+
+        `overlap`: The maximum overlap between predictions of the same class in percent.
+
+    Returns:
+        `str`: The `get_model_cache_prefix` of the model followed by the first 32 hex digits of the SHA-256 of the image
+        and the parameters.
+    """
+    digest = sha256(repr((content_hash, model_key, confidence, overlap)).encode()).hexdigest()[:32]
+    return f"{get_model_cache_prefix(model_key)}{digest}"
+
+class ResultCache:
+    """
+    The interface of an inference result cache. The default implementation caches nothing.
+    """
+    name = 'none'
+
+    def get(self, key : str):
+        """
+        Gets the cached predictions of a key.
+
+        Parameters:
+            `key`: The key from `get_inference_cache_key`.
+
+        Returns:
+            `dict[str, list]`: The cached predictions, otherwise none.
+        """
+        return None
+
+    def set(self, key : str, results : dict[str, list]):
+        """
+        Caches the predictions of a key.
+
+        Parameters:
+            `key`: The key from `get_inference_cache_key`.
+
+            `results`: The predictions returned by the inference backend.
+        """
+        pass
+
+    def invalidate_model(self, model_key : tuple):
+        """
+        Removes the cached predictions of a model, e.g. once it was deployed again.
+
+        Parameters:
+            `model_key`: The identity of the model given to `get_inference_cache_key`.
+
+        Returns:
+            `int`: The number of removed predictions.
+        """
+        return 0
+
+    def stats(self):
+        """
+        Gets the counters of the cache.
+
+        Returns:
+            `dict`: The details of the cache.
+        """
+        return {'backend': self.name}
+
+class MemoryResultCache(ResultCache):
+    """
+    Caches the predictions in the memory of the worker process.
+
+    Parameters:
+        `max_size`: The maximum number of cached predictions.
+
+        `ttl`: The number of seconds the predictions stay valid.
+    """
+    name = 'memory'
+
+    def __init__(self, max_size : int, ttl : float):
+        self.cache = TTLCache(max_size, ttl)
+
+    def get(self, key : str):
+        return self.cache.get(key)
+
+    def set(self, key : str, results : dict[str, list]):
+        self.cache.set(key, results)
+
+    def invalidate_model(self, model_key : tuple):
+        prefix = get_model_cache_prefix(model_key)
+        return self.cache.invalidate_where(lambda key: key.startswith(prefix))
+
+    def stats(self):
+        return {'backend': self.name, **self.cache.stats()}
+
+class SQLResultCache(ResultCache):
+    """
+    Caches the predictions in the `inference_results` table so they are shared by every worker.
+    The cache is best-effort: a failed read is a miss and a failed write is skipped, so it never fails an inference.
+    The expired and oldest rows past `max_size` are evicted at most every `evict_interval` seconds per worker.
+
+    Parameters:
+        `max_size`: The maximum number of cached predictions.
+
+        `ttl`: The number of seconds the predictions stay valid.
+    """
+    name = 'sql'
+    evict_interval = 60
+
+    def __init__(self, max_size : int, ttl : float):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._evicted_at = None
+        self._lock = Lock()
+
+    def _count(self, hit : bool):
+        with self._lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+
+    def _fail(self, action : str, error : SQLAlchemyError):
+        with self._lock:
+            self.errors += 1
+        current_app.logger.warning('Failed to %s the inference result cache: %s', action, error)
+
+    def _is_expired(self, created_at : datetime):
+        return self.ttl is not None and created_at < datetime.now() - timedelta(seconds=self.ttl)
+
+    def get(self, key : str):
+        # A dedicated connection keeps the cache out of the transaction of the request.
+        try:
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    select(InferenceResults.predictions, InferenceResults.created_at).where(InferenceResults.key == key)
+                ).first()
+        except SQLAlchemyError as e:
+            self._fail('read', e)
+            row = None
+        if row is None or self._is_expired(row.created_at):
+            self._count(False)
+            return None
+        self._count(True)
+        return loads(row.predictions)
+
+    def set(self, key : str, results : dict[str, list]):
+        values = {'key': key, 'predictions': dumps(results, separators=(',', ':')), 'created_at': datetime.now()}
+        try:
+            with db.engine.begin() as connection:
+                self._upsert(connection, values)
+        except SQLAlchemyError as e:
+            self._fail('write', e)
+            return
+        if self._is_eviction_due():
+            try:
+                with db.engine.begin() as connection:
+                    self._evict(connection)
+            except SQLAlchemyError as e:
+                self._fail('evict', e)
+
+    def invalidate_model(self, model_key : tuple):
+        try:
+            with db.engine.begin() as connection:
+                result = connection.execute(
+                    delete(InferenceResults).where(InferenceResults.key.startswith(get_model_cache_prefix(model_key)))
+                )
+        except SQLAlchemyError as e:
+            self._fail('invalidate', e)
+            return 0
+        return result.rowcount
+
+    def _upsert(self, connection, values : dict):
+        # Concurrent workers may cache the same key, so the row is inserted or overwritten in a single statement.
+        dialect = connection.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(InferenceResults).values(values)
+            connection.execute(statement.on_duplicate_key_update(
+                predictions=statement.inserted['predictions'], created_at=statement.inserted['created_at']
+            ))
+        elif dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(InferenceResults).values(values)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'predictions': statement.excluded['predictions'], 'created_at': statement.excluded['created_at']}
+            ))
+        else:
+            result = connection.execute(
+                update(InferenceResults).where(InferenceResults.key == values['key'])
+                .values(predictions=values['predictions'], created_at=values['created_at'])
+            )
+            if result.rowcount == 0:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(InferenceResults).values(values))
+                except IntegrityError:
+                    pass
+
+    def _is_eviction_due(self):
+        with self._lock:
+            now = monotonic()
+            if self._evicted_at is not None and now - self._evicted_at < self.evict_interval:
+                return False
+            self._evicted_at = now
+            return True
+
+    def _evict(self, connection):
+        if self.ttl is not None:
+            connection.execute(
+                delete(InferenceResults).where(InferenceResults.created_at < datetime.now() - timedelta(seconds=self.ttl))
+            )
+        overflow = connection.execute(select(func.count()).select_from(InferenceResults)).scalar() - self.max_size
+        if overflow > 0:
+            oldest = connection.execute(
+                select(InferenceResults.key).order_by(InferenceResults.created_at).limit(overflow)
+            ).scalars().all()
+            connection.execute(delete(InferenceResults).where(InferenceResults.key.in_(oldest)))
+
+    def stats(self):
+        try:
+            with db.engine.connect() as connection:
+                size = connection.execute(select(func.count()).select_from(InferenceResults)).scalar()
+        except SQLAlchemyError as e:
+            self._fail('count', e)
+            size = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.name,
+                'size': size,
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+RESULT_CACHES = {cache.name: cache for cache in (ResultCache, MemoryResultCache, SQLResultCache)}
+
+def get_result_cache():
+    """
+    Gets the process-wide inference result cache selected by `INFERENCE_CACHE_BACKEND` (`memory`, `sql`, or `none`),
+    bounded by `INFERENCE_CACHE_SIZE` and `INFERENCE_CACHE_TTL`.
+
+    Returns:
+        `ResultCache`: The inference result cache of the process.
+    """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                cache = RESULT_CACHES[current_app.config.get('INFERENCE_CACHE_BACKEND') or 'memory']
+                _result_cache = cache() if cache is ResultCache else cache(
+                    max_size=int(current_app.config.get('INFERENCE_CACHE_SIZE') or 1024),
+                    ttl=float(current_app.config.get('INFERENCE_CACHE_TTL') or 86400)
+                )
+    return _result_cache
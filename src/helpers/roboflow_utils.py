@@ -1,13 +1,353 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
 from roboflow import Roboflow
-from requests import HTTPError, get as getRequest
+from requests import HTTPError, RequestException, Timeout, get as getRequest
 from flask import current_app, jsonify
-from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
-from src.helpers.file_utils import convert_bytes_to_image, convert_image_to_ndarray, draw_boxes_on_image
+from sqlalchemy import select
+from extensions import db
+from src.constants.status_codes import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_501_NOT_IMPLEMENTED, HTTP_502_BAD_GATEWAY, HTTP_504_GATEWAY_TIMEOUT
+from src.helpers.batch_utils import get_micro_batcher
+from src.helpers.cache_utils import TTLCache
+from src.helpers.concurrency_utils import map_concurrently
+from src.helpers.annotation_utils import get_annotation_renderer
+from src.helpers.file_utils import ImageMeta, draw_boxes_on_image, letterbox_image, rescale_predictions
+from src.helpers.format_utils import format_accuracy, format_error_rate
+from src.helpers.inference_utils import LocalYoloBackend, RoboflowBackend, UnsupportedModelError, load_local_model
+from src.helpers.result_cache_utils import get_inference_cache_key, get_result_cache
+from src.helpers.supabase_utils import get_storage_error, read_file_by_url
+from src.helpers.timing_utils import span
+from src.models.weights import Weights
 
-def perform_inference(image_url : str, api_key=None, project_name=None, version_number=None):
+_model_cache = None
+_model_cache_lock = Lock()
+
+def get_model_cache():
+  """
+  Gets the process-wide registry of model handles, creating it on first use.
+  The registry is bounded by `MODEL_CACHE_SIZE` and its Roboflow handles expire after `MODEL_CACHE_TTL` seconds.
+  The local YOLO models don't expire, so they are only loaded again once they are evicted or invalidated.
+  
+  Returns:
+    `TTLCache`: The model handles keyed by `get_model_key`.
+  """
+  global _model_cache
+  if _model_cache is None:
+    with _model_cache_lock:
+      if _model_cache is None:
+        _model_cache = TTLCache(
+          max_size=int(current_app.config.get('MODEL_CACHE_SIZE') or 8),
+          ttl=float(current_app.config.get('MODEL_CACHE_TTL') or 3600)
+        )
+  return _model_cache
+
+def load_model(api_key : str, project_name : str, version_number : int):
+  """
+  Resolves the workspace, project, and version of a Roboflow model without caching.
+  
+  Parameters:
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the dataset that the model was trained from.
+    
+  Returns:
+    `Model`: The Roboflow model handle that can predict images.
+  """
+  with span('model_setup'):
+    rf = Roboflow(api_key)
+    project = rf.workspace().project(project_name)
+    return project.version(version_number).model
+
+def get_model_key(api_key=None, project_name=None, version_number=None):
+  """
+  Gets the key of a model in the registry for the backend selected by `INFERENCE_BACKEND`.
+  The `local` backend serves the weights whose `model_path` was deployed for the project and version with the same
+  API key, and the weights of `LOCAL_MODEL_PATH` for the default model, i.e. the first version of `ROBOFLOW_PROJECT`.
+  
+  Parameters:
+    `api_key`: The API key of the user. Defaults to `ROBOFLOW_PRIVATE_API_KEY`.
+    
+    `project_name`: The name of the project where the custom model is located. Defaults to `ROBOFLOW_PROJECT`.
+    
+    `version_number`: The version number of the dataset that the model was trained from. Defaults to 1.
+    
+  Returns:
+    `tuple`: (`api_key`, `project_name`, `version_number`) for Roboflow, otherwise (`local`, `model_path`, 0).
+    
+  Raises:
+    `UnsupportedModelError`: If the `local` backend is selected and no weights were deployed for the requested model.
+  """
+  project_name = project_name or current_app.config['ROBOFLOW_PROJECT']
+  version_number = int(version_number or 1)
+  if current_app.config.get('INFERENCE_BACKEND') == LocalYoloBackend.name:
+    model_path = get_deployed_model_path(api_key, project_name, version_number) if api_key else None
+    if model_path is None and (project_name, version_number) == (current_app.config['ROBOFLOW_PROJECT'], 1):
+      model_path = current_app.config['LOCAL_MODEL_PATH']
+    if model_path is None:
+      raise UnsupportedModelError(f"No local weights were deployed for the model {project_name}/{version_number}.")
+    return (LocalYoloBackend.name, model_path, 0)
+  return (api_key or current_app.config['ROBOFLOW_PRIVATE_API_KEY'], project_name, version_number)
+
+def get_deployed_model_path(api_key : str, project_name : str, version_number : int):
+  """
+  Gets the `model_path` of the latest weights deployed for a model.
+  
+  Parameters:
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the dataset that the model was trained from.
+    
+  Returns:
+    `str`: The path of the parent folder of the model or of its `.pt` file, otherwise none.
+  """
+  return db.session.execute(
+    select(Weights.model_path)
+    .where(
+      Weights.api_key == api_key, Weights.project_name == project_name, Weights.version == version_number,
+      Weights.model_path.is_not(None)
+    )
+    .order_by(Weights.created_at.desc())
+    .limit(1)
+  ).scalar()
+
+def get_model(api_key=None, project_name=None, version_number=None):
+  """
+  Gets a Roboflow model handle from the registry, only resolving it through Roboflow on a miss.
+  
+  Parameters:
+    `api_key`: The API key of the user. Defaults to `ROBOFLOW_PRIVATE_API_KEY`.
+    
+    `project_name`: The name of the project where the custom model is located. Defaults to `ROBOFLOW_PROJECT`.
+    
+    `version_number`: The version number of the dataset that the model was trained from. Defaults to 1.
+    
+  Returns:
+    `Model`: The Roboflow model handle that can predict images.
+  """
+  key = (
+    api_key or current_app.config['ROBOFLOW_PRIVATE_API_KEY'],
+    project_name or current_app.config['ROBOFLOW_PROJECT'],
+    int(version_number or 1)
+  )
+  return get_model_cache().get_or_set(key, lambda: load_model(*key))
+
+def get_inference_backend(api_key=None, project_name=None, version_number=None):
   """
-  Takes an image URL, performs object detection using a custom
-  model from Roboflow, and returns the image with bounding boxes and class labels drawn on it.
+  Gets the inference backend selected by `INFERENCE_BACKEND`.
+  
+  The `roboflow` backend (default) sends the images to the hosted model of the project, while the `local` backend
+  loads the deployed YOLO weights once per worker and predicts in-process on `LOCAL_INFERENCE_DEVICE`.
+  
+  Parameters:
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the dataset that the model was trained from.
+    
+  Returns:
+    `InferenceBackend`: The backend that predicts the images.
+    
+  Raises:
+    `UnsupportedModelError`: If the `local` backend is selected and no weights were deployed for the requested model.
+  """
+  key = get_model_key(api_key, project_name, version_number)
+  if key[0] == LocalYoloBackend.name:
+    def load():
+      with span('model_setup'):
+        return load_local_model(key[1])
+    model = get_model_cache().get_or_set(key, load, expires=False)
+    return LocalYoloBackend(model, current_app.config.get('LOCAL_INFERENCE_DEVICE') or 'cpu')
+  return RoboflowBackend(get_model(*key))
+
+def invalidate_model(api_key : str, project_name : str, version_number=None, model_path : str = None):
+  """
+  Removes a model handle from the registry so the next inference resolves it again.
+  
+  Parameters:
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the model. If none, every version of the project is removed.
+    
+    `model_path`: The path of the deployed weights, whose local YOLO model is removed too.
+    
+  Returns:
+    `int`: The number of removed model handles.
+  """
+  removed = 0
+  if model_path:
+    removed += int(get_model_cache().invalidate((LocalYoloBackend.name, model_path, 0)))
+  if version_number is not None:
+    return removed + int(get_model_cache().invalidate((api_key, project_name, int(version_number))))
+  return removed + get_model_cache().invalidate_where(lambda key: key[:2] == (api_key, project_name))
+
+def invalidate_results(api_key : str, project_name : str, version_number : int, model_path : str = None):
+  """
+  Removes the cached predictions of a model from the inference result cache, so a redeployed model doesn't serve the
+  predictions of its previous weights.
+  
+  Parameters:
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the model.
+    
+    `model_path`: The path of the deployed weights, whose local predictions are removed too.
+    
+  Returns:
+    `int`: The number of removed predictions.
+  """
+  cache = get_result_cache()
+  removed = cache.invalidate_model((api_key, project_name, int(version_number)))
+  if model_path:
+    removed += cache.invalidate_model((LocalYoloBackend.name, model_path, 0))
+  return removed
+
+def download_image(image_url : str):
+  """
+  Downloads an image through its public URL. A file of a local bucket is read from the disk instead.
+  
+  Parameters:
+    `image_url`: The URL of the image.
+    
+  Returns:
+    `bytes`: The downloaded image as bytes.
+    
+    `JSON Response`: If the image can't be retrieved.
+  """
+  with span('download'):
+    try:
+      image_data = read_file_by_url("FILES", image_url)
+    except (OSError, ValueError) as e:
+      message, status = get_storage_error(e)
+      return jsonify({'message': f"Failed to read the image from the storage: {message}"}), status
+    if image_data is not None:
+      return image_data
+    try:
+      image_response = getRequest(image_url, timeout=float(current_app.config.get('IMAGE_DOWNLOAD_TIMEOUT') or 20))
+    except Timeout:
+      return jsonify({'message': 'Timed out while retrieving the image through its public URL.'}), HTTP_504_GATEWAY_TIMEOUT
+    except RequestException as e:
+      return jsonify({'message': f"Failed to retrieve the image through its public URL: {e}"}), HTTP_502_BAD_GATEWAY
+  if image_response.status_code != HTTP_200_OK:
+    return jsonify({'message': 'Failed to retrieve the image through its public URL.'}), image_response.status_code
+  return image_response.content
+
+def get_prediction_error(error : Exception):
+  """
+  Converts an error raised by an inference backend into a JSON response.
+  
+  Parameters:
+    `error`: The error raised while predicting.
+    
+  Returns:
+    `JSON Roboflow Response`: If the hosted model rejected the request.
+    
+    `JSON Response (501)`: If the inference backend can't predict with the requested model.
+    
+    `JSON Response (500)`: For any other error.
+  """
+  if isinstance(error, UnsupportedModelError):
+    return jsonify({'error': str(error)}), HTTP_501_NOT_IMPLEMENTED
+  if isinstance(error, HTTPError):
+    return jsonify({
+      'error': f"Client Error: {error.response.reason}", 
+      'message': 'Model may still be undergoing deployment. Try again later.'
+      }), error.response.status_code
+  return jsonify({'error': str(error)}), HTTP_500_INTERNAL_SERVER_ERROR
+
+def get_model_input(image_meta : ImageMeta):
+  """
+  Letterboxes an image to `MODEL_INPUT_SIZE` so that large captures aren't sent to the model at full resolution.
+  Setting `MODEL_INPUT_SIZE` to 0 sends the images as they are. An image that already fits is sent as `ImageMeta.array`,
+  the same buffer that the annotations are drawn on.
+  
+  Parameters:
+    `image_meta`: The metadata of the image.
+    
+  Returns:
+    `tuple`: The image as ndarray, the `scale` applied to it, and the `pad_x` and `pad_y` added to its left and top.
+  """
+  size = int(current_app.config.get('MODEL_INPUT_SIZE', 640) or 0)
+  if not size or ((image_meta.width or 0) <= size and (image_meta.height or 0) <= size):
+    return image_meta.array, 1, 0, 0
+  return letterbox_image(image_meta.image, size)
+
+def predict_image(image_meta : ImageMeta, api_key=None, project_name=None, version_number=None, confidence=20, overlap=30):
+  """
+  Predicts an image, returning the cached predictions if the same image was already predicted with the same model and parameters.
+  
+  Parameters:
+    `image_meta`: The metadata of the image, whose `content_hash` is used as the key of the inference result cache.
+    
+    `api_key`: The API key of the user.
+    
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the dataset that the model was trained from.
+    
+    `confidence`: The minimum confidence of a prediction in percent.
+    
+    `overlap`: The maximum overlap between predictions of the same class in percent.
+    
+  Returns:
+    `dict[str, list]`: The `predictions` of the image.
+  """
+  cache = get_result_cache()
+  key = get_inference_cache_key(image_meta.content_hash, get_model_key(api_key, project_name, version_number), confidence, overlap)
+  results = cache.get(key)
+  if results is None:
+    backend = get_inference_backend(api_key, project_name, version_number)
+    with span('preprocess'):
+      model_input, scale, pad_x, pad_y = get_model_input(image_meta)
+    with span('predict'):
+      results = backend.predict(model_input, confidence=confidence, overlap=overlap)
+    results = rescale_predictions(results, scale, pad_x, pad_y)
+    cache.set(key, results)
+  return results
+
+def get_inference_result(image_meta : ImageMeta, results : dict[str, list], render : bool = True):
+  """
+  Draws the predictions on the image and summarizes them.
+  
+  Parameters:
+    `image_meta`: The metadata of the image that was predicted, whose canvas of the `ANNOTATION_RENDERER` is drawn on.
+    
+    `results`: The predictions of the image.
+    
+    `render`: Whether to draw the predictions. Otherwise the `image` is none and can be rendered later from the `predictions`.
+    
+  Returns:
+    `dict[str, Any]`: Dictionary that contains: `image`, `image_meta`, `predictions`, `classification`, `confidence`, `accuracy`, and `error_rate`.
+    
+    `JSON Response (400)`: If the model failed to predict the image. Caused by incorrect image and/or image size.
+  """
+  result_details = get_result_details(results)
+  if result_details == HTTP_400_BAD_REQUEST:
+    return jsonify(
+      {'message': 'Model may have failed to predict this file. Try another or use smaller file.'}
+      ), HTTP_400_BAD_REQUEST
+  
+  return {
+    'image': draw_boxes_on_image(get_annotation_renderer().get_canvas(image_meta), results["predictions"]) if render else None,
+    'image_meta': image_meta,
+    'predictions': results["predictions"],
+    'classification': result_details['classification'],
+    'confidence': result_details['confidence'],
+    'accuracy': result_details['accuracy'],
+    'error_rate': result_details['error_rate']
+  }
+
+def perform_inference(image_url : str, api_key=None, project_name=None, version_number=None, render=True):
+  """
+  Takes an image URL, performs object detection using a custom model from the configured
+  inference backend, and returns the image with bounding boxes and class labels drawn on it.
   
   Parameters:
     `image_url`: The URL of the image you want to perform inference on.
@@ -18,44 +358,105 @@ def perform_inference(image_url : str, api_key=None, project_name=None, version_
     
     `version_number`: The version number of the dataset that the model was trained from.
     
+    `render`: Whether to draw the predictions on the image.
+    
   Returns:
-    `dict[str, Any]`: Dictionary that contains: `image`, `classification`, `accuracy`, and `error_rate`.
+    `dict[str, Any]`: Dictionary that contains: `image`, `image_meta`, `predictions`, `classification`, `confidence`, `accuracy`, and `error_rate`.
     
     `JSON Response (400)`: If the model failed to predict the image. Caused by incorrect image and/or image size.
     
-    `JSON Roboflow Response (500)`: If there is an error while performing inference in Roboflow.
+    `JSON Roboflow Response (500)`: If there is an error while performing inference in Roboflow or in the local backend.
   """
-  rf = Roboflow(api_key or current_app.config['ROBOFLOW_PRIVATE_API_KEY'])
-  project = rf.workspace().project(project_name or  current_app.config['ROBOFLOW_PROJECT'])
-  custom_model = project.version(version_number or 1).model
+  image_data = download_image(image_url)
+  if type(image_data) is tuple:
+    return image_data
+  
+  return perform_inference_on_image(ImageMeta.from_bytes(image_data), api_key, project_name, version_number, render)
 
-  image_response = getRequest(image_url)
-  if image_response.status_code == HTTP_200_OK:
-    retrieved_image = convert_bytes_to_image(image_response.content)
-    try:
-      results = custom_model.predict(convert_image_to_ndarray(retrieved_image), confidence=20, overlap=30).json()
-    except HTTPError as he:
-      return jsonify({
-        'error': f"Client Error: {he.response.reason}", 
-        'message': 'Model may still be undergoing deployment. Try again later.'
-        }), he.response.status_code
-    except Exception as e:
-      return jsonify({'error': str(e)}), HTTP_500_INTERNAL_SERVER_ERROR
+def perform_inference_on_image(image_meta : ImageMeta, api_key=None, project_name=None, version_number=None, render=True):
+  """
+  Takes an image that is already in memory, performs object detection using a custom model from the configured
+  inference backend, and returns the image with bounding boxes and class labels drawn on it.
+  
+  Parameters:
+    `image_meta`: The metadata of the image, which is only decoded if it is not in the inference result cache.
     
-    result_details = get_result_details(results)
-    if result_details == HTTP_400_BAD_REQUEST:
-      return jsonify(
-        {'message': 'Model may have failed to predict this file. Try another or use smaller file.'}
-        ), HTTP_400_BAD_REQUEST
+    `api_key`: The API key of the user.
     
-    return {
-      'image': draw_boxes_on_image(retrieved_image, results["predictions"]),
-      'classification': result_details['classification'],
-      'accuracy': result_details['accuracy'],
-      'error_rate': result_details['error_rate']
-    }
-  else:
-    return jsonify({'message': 'Failed to retrieve the image through its public URL.'}), image_response.status_code
+    `project_name`: The name of the project where the custom model is located.
+    
+    `version_number`: The version number of the dataset that the model was trained from.
+    
+    `render`: Whether to draw the predictions on the image.
+    
+  Returns:
+    `dict[str, Any]`: Dictionary that contains: `image`, `image_meta`, `predictions`, `classification`, `confidence`, `accuracy`, and `error_rate`.
+    
+    `JSON Response (400)`: If the model failed to predict the image. Caused by incorrect image and/or image size.
+    
+    `JSON Roboflow Response (500)`: If there is an error while performing inference in Roboflow or in the local backend.
+  """
+  try:
+    results = predict_image(image_meta, api_key, project_name, version_number)
+  except Exception as e:
+    return get_prediction_error(e)
+  
+  return get_inference_result(image_meta, results, render)
+
+def perform_batch_inference(items : list[dict]):
+  """
+  Performs inference on several images at once. The images are downloaded concurrently, then the ones missing from the
+  inference result cache are queued in the micro-batcher so that images of the same model are predicted together,
+  even across concurrent requests.
+  
+  Parameters:
+    `items`: The images to be predicted, each with the `url` and optionally the `api_key`, `project_name`, and `version`.
+    
+  Returns:
+    `list`: The result of each item in the same order, either as a `dict` like `perform_inference` or as a `JSON Response`.
+  """
+  downloads = map_concurrently(download_image, [item['url'] for item in items])
+  
+  cache = get_result_cache()
+  batcher = get_micro_batcher()
+  pending = []
+  for item, image_data in zip(items, downloads):
+    if type(image_data) is tuple:
+      pending.append(image_data)
+      continue
+    image_meta = ImageMeta.from_bytes(image_data)
+    try:
+      model_key = get_model_key(item.get('api_key'), item.get('project_name'), item.get('version'))
+      key = get_inference_cache_key(image_meta.content_hash, model_key, 20, 30)
+      results = cache.get(key)
+      if results is not None:
+        pending.append((image_meta, key, results))
+        continue
+      backend = get_inference_backend(item.get('api_key'), item.get('project_name'), item.get('version'))
+      model_input, *letterbox = get_model_input(image_meta)
+      pending.append((image_meta, key, (batcher.submit(backend, model_input, confidence=20, overlap=30), letterbox)))
+    except Exception as e:
+      pending.append(get_prediction_error(e))
+  
+  results = []
+  for entry in pending:
+    if len(entry) == 2:
+      results.append(entry)
+      continue
+    image_meta, key, predictions = entry
+    try:
+      if type(predictions) is tuple:
+        future, letterbox = predictions
+        with span('predict'):
+          predictions = future.result(timeout=float(current_app.config.get('INFERENCE_TIMEOUT') or 120))
+        predictions = rescale_predictions(predictions, *letterbox)
+        cache.set(key, predictions)
+      results.append(get_inference_result(image_meta, predictions))
+    except FutureTimeoutError:
+      results.append((jsonify({'message': 'Timed out while waiting for the model to predict the image.'}), HTTP_504_GATEWAY_TIMEOUT))
+    except Exception as e:
+      results.append(get_prediction_error(e))
+  return results
   
 def deploy_model(api_key : str, workspace_name : str, project_name : str, dataset_version : int, model_type : str, model_path : str):
   """
@@ -88,6 +489,8 @@ def deploy_model(api_key : str, workspace_name : str, project_name : str, datase
       dataset = project.version(dataset_version)
       
       project.version(dataset.version).deploy(model_type=model_type, model_path=model_path)
+      invalidate_model(api_key, project_name, dataset_version, model_path)
+      invalidate_results(api_key, project_name, dataset_version, model_path)
       return HTTP_201_CREATED
   except Exception as e:
       return jsonify({'error': str(e)}), HTTP_500_INTERNAL_SERVER_ERROR
@@ -100,17 +503,17 @@ def get_result_details(results : dict[str, list]):
     `results`: List of predictions.
     
   Returns:
-    `dict`: A dictionary containing the `classification`, `confidence`, and `error rate`.
+    `dict`: A dictionary containing the `classification`, its `confidence` from 0 to 1, and the formatted `accuracy` and `error rate`.
     
     `400`: If the model has returned an empty predictions. Caused by incorrect image and/or image size.
   """
   try:
-    accuracy = round([prediction['confidence'] for prediction in results['predictions']][0], 2) * 100
-    error_rate = 100 - accuracy
+    confidence = [prediction['confidence'] for prediction in results['predictions']][0]
     return {
       'classification': [prediction['class'] for prediction in results['predictions']][0],
-      'accuracy': f"{accuracy:.0f}%",
-      'error_rate': f"{error_rate:.0f}%"
+      'confidence': confidence,
+      'accuracy': format_accuracy(confidence),
+      'error_rate': format_error_rate(confidence)
     }
   except Exception:
     return HTTP_400_BAD_REQUEST
\ No newline at end of file
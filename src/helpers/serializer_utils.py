@@ -0,0 +1,111 @@
+class Field:
+    """
+    A field of a resource, declared by the columns it reads and how it is serialized from them.
+
+    Parameters:
+        `columns`: The model columns that the field reads.
+
+        `serialize`: The function that takes a row, or a model instance, and returns the value of the field.
+        Defaults to the value of the first column.
+    """
+    def __init__(self, *columns, serialize=None):
+        self.columns = columns
+        key = columns[0].key
+        self.serialize = serialize or (lambda row: getattr(row, key))
+
+class Schema:
+    """
+    The declarative serializer of a resource. The read endpoints select only the columns of the requested fields
+    and serialize the row tuples, so no model instance is built nor tracked by the session.
+
+    Parameters:
+        `fields`: The fields of the resource, by name, in the order they are returned.
+    """
+    def __init__(self, fields : dict[str, Field]):
+        self.fields = fields
+
+    def parse_fields(self, value : str, default : list[str] = None):
+        """
+        Parses the sparse fieldset of a request.
+
+        Parameters:
+            `value`: The comma-separated `fields` of the request, if any.
+
+            `default`: The fields returned without a fieldset. Defaults to every field.
+
+        Returns:
+            `list[str]`: The requested fields.
+
+        Raises:
+            `ValueError`: If a requested field is unknown.
+        """
+        if not value:
+            return list(default or self.fields)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+        return list(dict.fromkeys(names))
+
+    def get_columns(self, names : list[str], *columns):
+        """
+        Gets the columns that the fields read, each once.
+
+        Parameters:
+            `names`: The fields to be serialized.
+
+            `columns`: Other columns to be selected, e.g. the keys of a page.
+
+        Returns:
+            `list`: The columns to be selected.
+        """
+        selected = {column.key: column for column in columns}
+        for name in names:
+            selected.update({column.key: column for column in self.fields[name].columns})
+        return list(selected.values())
+
+    def select(self, query, names : list[str], *columns):
+        """
+        Restricts a query to the columns of the fields.
+
+        Parameters:
+            `query`: The filtered query of the model.
+
+            `names`: The fields to be serialized.
+
+            `columns`: Other columns to be selected.
+
+        Returns:
+            `Query`: The query of the row tuples.
+        """
+        return query.with_entities(*self.get_columns(names, *columns))
+
+    def dump(self, row, names : list[str] = None):
+        """
+        Serializes a row.
+
+        Parameters:
+            `row`: The row tuple from `select`, or a model instance.
+
+            `names`: The fields to be serialized. Defaults to every field.
+
+        Returns:
+            `dict`: The value of each field.
+        """
+        fields = self.fields
+        return {name: fields[name].serialize(row) for name in names or fields}
+
+    def dump_all(self, rows, names : list[str] = None):
+        """
+        Serializes several rows.
+
+        Parameters:
+            `rows`: The row tuples from `select`, or model instances.
+
+            `names`: The fields to be serialized. Defaults to every field.
+
+        Returns:
+            `list[dict]`: The value of each field of each row.
+        """
+        serializers = [(name, self.fields[name].serialize) for name in names or self.fields]
+        return [{name: serialize(row) for name, serialize in serializers} for row in rows]
@@ -0,0 +1,243 @@
+from datetime import date
+from math import floor
+from sqlalchemy import and_, bindparam, case, delete, func, insert, select, update
+from extensions import db
+from src.models.file_stats import FileStats
+from src.models.files import Files
+
+# The confidences are counted in buckets of 1%, so the percentiles are exact to the percent.
+CONFIDENCE_BUCKETS = 100
+
+def get_confidence_bucket(confidence : float):
+    """
+    Gets the histogram bucket of a confidence.
+
+    Parameters:
+        `confidence`: The confidence of the prediction, from 0 to 1.
+
+    Returns:
+        `int`: The percent of the confidence rounded down, or -1 if it is unknown.
+    """
+    if confidence is None:
+        return -1
+    return floor(confidence * CONFIDENCE_BUCKETS)
+
+def get_stats_key(file : Files):
+    """
+    Gets the row of the summary table that counts a file.
+
+    Parameters:
+        `file`: The file, flushed so that its `created_at` is set.
+
+    Returns:
+        `tuple`: The `user_id`, `weight_id`, `classification`, `day`, and `confidence_bucket` of the file.
+    """
+    return (
+        file.user_id, file.weight_id or '', file.classification or '',
+        file.created_at.date(), get_confidence_bucket(file.confidence)
+    )
+
+def upsert_file_stats(values : list[dict]):
+    """
+    Adds counts to the summary table in the session, inserting the rows that don't exist yet. The counts are added
+    by the database, so concurrent transactions don't overwrite each other.
+
+    Parameters:
+        `values`: The key columns, `file_count`, and `confidence_sum` of each row.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        statement = mysql_insert(FileStats).values(values)
+        db.session.execute(statement.on_duplicate_key_update(
+            file_count=FileStats.file_count + statement.inserted['file_count'],
+            confidence_sum=FileStats.confidence_sum + statement.inserted['confidence_sum']
+        ))
+    elif dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(FileStats).values(values)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[column.name for column in FileStats.__table__.primary_key],
+            set_={
+                'file_count': FileStats.file_count + statement.excluded['file_count'],
+                'confidence_sum': FileStats.confidence_sum + statement.excluded['confidence_sum']
+            }
+        ))
+    else:
+        for value in values:
+            key = [column == value[column.name] for column in FileStats.__table__.primary_key]
+            result = db.session.execute(
+                update(FileStats).where(*key).values(
+                    file_count=FileStats.file_count + value['file_count'],
+                    confidence_sum=FileStats.confidence_sum + value['confidence_sum']
+                )
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(FileStats).values(value))
+
+def add_file_stats(files : list[Files]):
+    """
+    Counts new files in the summary table, in the transaction that saves them. The caller commits the session.
+
+    Parameters:
+        `files`: The files added to the session.
+    """
+    if not files:
+        return
+    db.session.flush()
+    deltas = {}
+    for file in files:
+        delta = deltas.setdefault(get_stats_key(file), [0, 0.0])
+        delta[0] += 1
+        delta[1] += file.confidence or 0.0
+    upsert_file_stats([
+        {
+            'user_id': user_id, 'weight_id': weight_id, 'classification': classification, 'day': day,
+            'confidence_bucket': confidence_bucket, 'file_count': file_count, 'confidence_sum': confidence_sum
+        }
+        for (user_id, weight_id, classification, day, confidence_bucket), (file_count, confidence_sum) in deltas.items()
+    ])
+
+def get_stats_columns():
+    """
+    Gets the columns that group the files by the rows of the summary table.
+
+    Returns:
+        `list`: The `user_id`, `weight_id`, `classification`, `day`, and `confidence_bucket` columns.
+    """
+    return [
+        Files.user_id,
+        func.coalesce(Files.weight_id, ''),
+        func.coalesce(Files.classification, ''),
+        func.date(Files.created_at),
+        case((Files.confidence.is_(None), -1), else_=func.floor(Files.confidence * CONFIDENCE_BUCKETS))
+    ]
+
+def remove_file_stats(query):
+    """
+    Uncounts the files of a query from the summary table, in the transaction that deletes them. The files are grouped
+    by the database, so only one row per group is read. The caller commits the session.
+
+    Parameters:
+        `query`: The query of the `Files` to be deleted.
+    """
+    columns = get_stats_columns()
+    groups = query.with_entities(*columns, func.count(), func.coalesce(func.sum(Files.confidence), 0)).group_by(*columns).all()
+    if not groups:
+        return
+    stats = FileStats.__table__
+    db.session.execute(
+        update(stats)
+        .where(
+            stats.c.user_id == bindparam('key_user_id'), stats.c.weight_id == bindparam('key_weight_id'),
+            stats.c.classification == bindparam('key_classification'), stats.c.day == bindparam('key_day'),
+            stats.c.confidence_bucket == bindparam('key_confidence_bucket')
+        )
+        .values(
+            file_count=stats.c.file_count - bindparam('removed_count'),
+            confidence_sum=stats.c.confidence_sum - bindparam('removed_sum')
+        ),
+        [
+            {
+                # SQLite returns the day as text.
+                'key_user_id': user_id, 'key_weight_id': weight_id, 'key_classification': classification,
+                'key_day': date.fromisoformat(day) if isinstance(day, str) else day,
+                'key_confidence_bucket': int(confidence_bucket), 'removed_count': file_count, 'removed_sum': confidence_sum
+            }
+            for user_id, weight_id, classification, day, confidence_bucket, file_count, confidence_sum in groups
+        ]
+    )
+    db.session.execute(
+        delete(FileStats).where(FileStats.user_id.in_({group[0] for group in groups}), FileStats.file_count <= 0)
+    )
+
+def get_percentile(histogram : list[tuple[int, int]], total : int, percentile : float):
+    """
+    Gets a percentile of the confidences from their histogram.
+
+    Parameters:
+        `histogram`: The `confidence_bucket` and count of each bucket, sorted by bucket.
+
+        `total`: The number of confidences.
+
+        `percentile`: The percentile, from 0 to 100.
+
+    Returns:
+        `float`: The middle of the bucket of the percentile, from 0 to 1.
+    """
+    rank = percentile / 100 * total
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen >= rank:
+            return round(min((bucket + 0.5) / CONFIDENCE_BUCKETS, 1.0), 4)
+    return None
+
+def get_file_stats(user_id : str, weight_id : str = None, start_day = None, end_day = None):
+    """
+    Gets the statistics of the files of a user from the summary table. Its size depends on the number of days, weights,
+    and classifications, not on the number of files.
+
+    Parameters:
+        `user_id`: The id of the user.
+
+        `weight_id`: Only the files analyzed with these weights, if any.
+
+        `start_day`: Only the files created on this day or after, if any.
+
+        `end_day`: Only the files created before this day, if any.
+
+    Returns:
+        `dict`: The `total` number of files, the count of each of their `classifications`, the `count`, `mean_confidence`,
+        `p50`, `p90`, and `p99` confidence of each of their `weights`, and their daily `volumes`.
+    """
+    conditions = [FileStats.user_id == user_id]
+    if weight_id:
+        conditions.append(FileStats.weight_id == weight_id)
+    if start_day:
+        conditions.append(FileStats.day >= start_day)
+    if end_day:
+        conditions.append(FileStats.day < end_day)
+    where = and_(*conditions)
+
+    classifications = {
+        classification: int(file_count) for classification, file_count in db.session.execute(
+            select(FileStats.classification, func.sum(FileStats.file_count)).where(where).group_by(FileStats.classification)
+        )
+    }
+    volumes = [
+        {'date': str(day), 'count': int(file_count)} for day, file_count in db.session.execute(
+            select(FileStats.day, func.sum(FileStats.file_count)).where(where).group_by(FileStats.day).order_by(FileStats.day)
+        )
+    ]
+
+    histograms = {}
+    for weight, bucket, file_count, confidence_sum in db.session.execute(
+        select(FileStats.weight_id, FileStats.confidence_bucket, func.sum(FileStats.file_count), func.sum(FileStats.confidence_sum))
+        .where(where)
+        .group_by(FileStats.weight_id, FileStats.confidence_bucket)
+        .order_by(FileStats.weight_id, FileStats.confidence_bucket)
+    ):
+        histograms.setdefault(weight, []).append((int(bucket), int(file_count), float(confidence_sum)))
+    weights = []
+    for weight, buckets in histograms.items():
+        scored = [(bucket, file_count) for bucket, file_count, _ in buckets if bucket >= 0]
+        scored_count = sum(file_count for _, file_count in scored)
+        weights.append({
+            'weight_id': weight or None,
+            'count': sum(file_count for _, file_count, _ in buckets),
+            'mean_confidence': round(sum(total for bucket, _, total in buckets if bucket >= 0) / scored_count, 4) if scored_count else None,
+            'p50': get_percentile(scored, scored_count, 50),
+            'p90': get_percentile(scored, scored_count, 90),
+            'p99': get_percentile(scored, scored_count, 99)
+        })
+
+    return {
+        'total': sum(classifications.values()),
+        'classifications': classifications,
+        'weights': weights,
+        'volumes': volumes
+    }
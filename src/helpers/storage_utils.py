@@ -0,0 +1,426 @@
+from abc import ABC, abstractmethod
+from io import BytesIO
+from os import getpid, makedirs, path as os_path, remove, replace, urandom
+from shutil import copyfile
+from threading import Lock
+from time import perf_counter
+from urllib.parse import unquote, urlsplit
+from flask import current_app, has_request_context, request
+from httpx import Limits, Timeout
+from storage3 import SyncStorageClient
+from storage3.utils import SyncClient
+from werkzeug.security import safe_join
+
+# Supabase Storage doesn't let the expiry of a signed upload URL be chosen.
+SIGNED_UPLOAD_URL_TTL = 2 * 60 * 60
+
+_storage_client = None
+_storage_client_pid = None
+_storage_client_lock = Lock()
+
+class PooledStorageClient(SyncStorageClient):
+    """
+    A Supabase Storage client whose HTTP session keeps its connections alive and is shared by the threads of a process.
+    `create_client` builds a new session for every storage operation instead, which pays for a TCP and TLS handshake each time.
+
+    Parameters:
+        `url`: The URL of the Storage API, i.e. `SUPABASE_URL` followed by `/storage/v1`.
+
+        `key`: The API key of the project.
+
+        `limits`: The size of the connection pool.
+
+        `timeout`: The timeouts of the requests.
+    """
+    def __init__(self, url : str, key : str, limits : Limits, timeout : Timeout):
+        self.limits = limits
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self._stats_lock = Lock()
+        super().__init__(url, {'apiKey': key, 'Authorization': f"Bearer {key}"}, timeout)
+
+    def _create_session(self, base_url : str, headers : dict[str, str], timeout, *args, **kwargs):
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=self.limits,
+            event_hooks={'request': [self._on_request], 'response': [self._on_response]}
+        )
+
+    def _on_request(self, request):
+        request.extensions['started_at'] = perf_counter()
+
+    def _on_response(self, response):
+        elapsed_ms = (perf_counter() - response.request.extensions.get('started_at', perf_counter())) * 1000
+        with self._stats_lock:
+            self.requests += 1
+            self.total_ms += elapsed_ms
+            if response.is_error:
+                self.errors += 1
+
+    def stats(self):
+        """
+        Gets the counters of the client and its connection pool.
+
+        Returns:
+            `dict`: The `requests`, `errors`, `average_ms`, the `connections` and `idle_connections` of the pool,
+            and its `max_connections` and `max_keepalive_connections`.
+        """
+        pool = getattr(getattr(self.session, '_transport', None), '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        with self._stats_lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'average_ms': round(self.total_ms / self.requests, 2) if self.requests else None,
+                'connections': len(connections),
+                'idle_connections': sum(1 for connection in connections if connection.is_idle()),
+                'max_connections': self.limits.max_connections,
+                'max_keepalive_connections': self.limits.max_keepalive_connections
+            }
+
+def get_storage_client():
+    """
+    Gets the storage client of the process, pooled by `STORAGE_MAX_CONNECTIONS`, `STORAGE_MAX_KEEPALIVE_CONNECTIONS`,
+    and `STORAGE_KEEPALIVE_EXPIRY`, and bounded by `STORAGE_TIMEOUT` and `STORAGE_CONNECT_TIMEOUT`.
+    A forked worker builds its own client, since the sockets of its parent can't be shared.
+
+    Returns:
+        `PooledStorageClient`: The storage client of the process.
+    """
+    global _storage_client, _storage_client_pid
+    if _storage_client is None or _storage_client_pid != getpid():
+        with _storage_client_lock:
+            if _storage_client is None or _storage_client_pid != getpid():
+                config = current_app.config
+                _storage_client = PooledStorageClient(
+                    f"{config['SUPABASE_URL']}/storage/v1",
+                    config['SUPABASE_KEY'],
+                    limits=Limits(
+                        max_connections=int(config.get('STORAGE_MAX_CONNECTIONS') or 20),
+                        max_keepalive_connections=int(config.get('STORAGE_MAX_KEEPALIVE_CONNECTIONS') or 10),
+                        keepalive_expiry=float(config.get('STORAGE_KEEPALIVE_EXPIRY') or 30)
+                    ),
+                    timeout=Timeout(
+                        float(config.get('STORAGE_TIMEOUT') or 20),
+                        connect=float(config.get('STORAGE_CONNECT_TIMEOUT') or 5)
+                    )
+                )
+                _storage_client_pid = getpid()
+    return _storage_client
+
+def get_bucket_type(bucket : str):
+    """
+    Gets the bucket type from the bucket name.
+    
+    Parameters:
+        `bucket`: The bucket name that the user want to get the type.
+        
+    Returns:
+        `str`: The bucket type, i.e. `SUPABASE_BUCKET_<bucket>`, which is also the folder of the bucket on the local disk.
+    """
+    return current_app.config.get(f"SUPABASE_BUCKET_{bucket}") or bucket.lower()
+
+def get_upload_body(data):
+    """
+    Gets the body of an upload that the storage client can send.
+    
+    Parameters:
+        `data`: The data of the file as bytes, or a spooled upload from `SpooledUploadRequest`.
+        
+    Returns:
+        `bytes | str`: The bytes of the data, or the path of a spooled upload that rolled over to the disk,
+        which the client opens and streams in chunks instead of reading it into memory.
+    """
+    if isinstance(data, bytes):
+        return data
+    if getattr(data, 'path', None):
+        data.flush()
+        return data.path
+    data.seek(0)
+    return data.read()
+
+class StorageBackend(ABC):
+    """
+    The interface of the storage of a bucket, used by the helpers of `supabase_utils`.
+    The methods raise an error if the operation fails.
+    """
+    name = None
+
+    @abstractmethod
+    def upload(self, bucket_name : str, path : str, data, content_type : str, upsert : bool = False):
+        """
+        Stores a file.
+
+        Parameters:
+            `bucket_name`: The name of the bucket, e.g. `SUPABASE_BUCKET_FILES`.
+
+            `path`: The path of the file in the bucket.
+
+            `data`: The data of the file as bytes, or a spooled upload.
+
+            `content_type`: The content type of the data.
+
+            `upsert`: Whether to overwrite the file if it already exists, instead of failing.
+        """
+
+    @abstractmethod
+    def delete(self, bucket_name : str, paths : list[str]):
+        """
+        Deletes several files at once. The files that don't exist are ignored.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `paths`: The paths of the files in the bucket.
+        """
+
+    @abstractmethod
+    def read(self, bucket_name : str, path : str):
+        """
+        Opens a file for reading.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `path`: The path of the file in the bucket.
+
+        Returns:
+            `BinaryIO`: The stream of the file, which the caller closes.
+        """
+
+    @abstractmethod
+    def get_size(self, bucket_name : str, path : str):
+        """
+        Gets the size of a file from its metadata, without reading it.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `path`: The path of the file in the bucket.
+
+        Returns:
+            `int`: The size of the file in bytes.
+        """
+
+    @abstractmethod
+    def read_head(self, bucket_name : str, path : str, length : int):
+        """
+        Reads the beginning of a file, e.g. the header of an image, without reading the rest of it.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `path`: The path of the file in the bucket.
+
+            `length`: The maximum number of bytes to be read.
+
+        Returns:
+            `bytes`: The first `length` bytes of the file.
+        """
+
+    def create_upload_url(self, bucket_name : str, path : str):
+        """
+        Creates a short-lived URL that a client uploads a file to directly, without sending it through the application.
+        The backends that can't sign uploads keep this default, which raises `NotImplementedError`.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `path`: The path of the file in the bucket.
+
+        Returns:
+            `dict`: The signed `upload_url`, its `token`, and the number of seconds it `expires_in`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_public_url(self, bucket_name : str):
+        """
+        Gets the public URL of a bucket, i.e. `STORAGE_PUBLIC_URL` if the files are served through a CDN.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+        Returns:
+            `str`: The public URL of the bucket, without a trailing slash.
+        """
+
+    def get_path(self, bucket_name : str, url : str):
+        """
+        Gets the path of a file from its public URL.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `url`: The public URL of the file.
+
+        Returns:
+            `str`: The path of the file in the bucket, or none if the URL isn't in the bucket.
+        """
+        bucket_url = f"{self.get_public_url(bucket_name)}/"
+        if url and url.startswith(bucket_url):
+            return unquote(url[len(bucket_url):])
+        return None
+
+class SupabaseBackend(StorageBackend):
+    """
+    Stores the files in Supabase Storage through the pooled client of the process.
+    """
+    name = 'supabase'
+
+    def upload(self, bucket_name : str, path : str, data, content_type : str, upsert : bool = False):
+        file_options = {"content-type": content_type, "x-upsert": "true" if upsert else "false"}
+        get_storage_client().from_(bucket_name).upload(path, get_upload_body(data), file_options)
+
+    def delete(self, bucket_name : str, paths : list[str]):
+        get_storage_client().from_(bucket_name).remove(paths)
+
+    def read(self, bucket_name : str, path : str):
+        return BytesIO(get_storage_client().from_(bucket_name).download(path))
+
+    # storage3 has no call for the metadata or a range of a file, so the object is requested through the session of the bucket.
+    def request_object(self, bucket_name : str, path : str, method : str, headers : dict = None):
+        bucket = get_storage_client().from_(bucket_name)
+        response = bucket._client.request(method, f"object/{bucket._get_final_path(path)}", headers=headers or {})
+        if response.status_code in (400, 404):
+            raise FileNotFoundError(f"The resource was not found: {path}")
+        response.raise_for_status()
+        return response
+
+    def get_size(self, bucket_name : str, path : str):
+        return int(self.request_object(bucket_name, path, 'HEAD').headers['content-length'])
+
+    def read_head(self, bucket_name : str, path : str, length : int):
+        return self.request_object(bucket_name, path, 'GET', {'Range': f"bytes=0-{length - 1}"}).content[:length]
+
+    def create_upload_url(self, bucket_name : str, path : str):
+        signed_upload = get_storage_client().from_(bucket_name).create_signed_upload_url(path)
+        return {
+            'upload_url': signed_upload['signed_url'],
+            'token': signed_upload['token'],
+            'expires_in': SIGNED_UPLOAD_URL_TTL
+        }
+
+    def get_public_url(self, bucket_name : str):
+        public_url = current_app.config.get('STORAGE_PUBLIC_URL') or f"{current_app.config['SUPABASE_URL']}/storage/v1/object/public"
+        return f"{public_url.rstrip('/')}/{bucket_name}"
+
+class LocalBackend(StorageBackend):
+    """
+    Stores the files on the local disk under `STORAGE_LOCAL_ROOT`, served by `/api/v1/storage/<bucket>/<path>`.
+
+    Parameters:
+        `root`: The folder of the buckets.
+    """
+    name = 'local'
+
+    def __init__(self, root : str):
+        self.root = os_path.abspath(root)
+
+    def get_file_path(self, bucket_name : str, path : str):
+        """
+        Gets the path of a file on the disk.
+
+        Parameters:
+            `bucket_name`: The name of the bucket.
+
+            `path`: The path of the file in the bucket.
+
+        Returns:
+            `str`: The absolute path of the file.
+        """
+        file_path = safe_join(self.root, bucket_name, path)
+        if file_path is None:
+            raise ValueError(f"Invalid path: {path}")
+        return file_path
+
+    def upload(self, bucket_name : str, path : str, data, content_type : str, upsert : bool = False):
+        file_path = self.get_file_path(bucket_name, path)
+        if not upsert and os_path.exists(file_path):
+            raise FileExistsError(f"The resource already exists: {path}")
+        makedirs(os_path.dirname(file_path), exist_ok=True)
+        # The file is written next to its destination then renamed, so it is never served half-written.
+        temporary_path = f"{file_path}.{urandom(4).hex()}.tmp"
+        body = get_upload_body(data)
+        if isinstance(body, str):
+            copyfile(body, temporary_path)
+        else:
+            with open(temporary_path, 'wb') as file:
+                file.write(body)
+        replace(temporary_path, file_path)
+
+    def delete(self, bucket_name : str, paths : list[str]):
+        for path in paths:
+            try:
+                remove(self.get_file_path(bucket_name, path))
+            except FileNotFoundError:
+                pass
+
+    def read(self, bucket_name : str, path : str):
+        return open(self.get_file_path(bucket_name, path), 'rb')
+
+    def get_size(self, bucket_name : str, path : str):
+        return os_path.getsize(self.get_file_path(bucket_name, path))
+
+    def read_head(self, bucket_name : str, path : str, length : int):
+        with open(self.get_file_path(bucket_name, path), 'rb') as file:
+            return file.read(length)
+
+    def get_public_url(self, bucket_name : str):
+        public_url = current_app.config.get('STORAGE_PUBLIC_URL') or (request.host_url if has_request_context() else '')
+        return f"{public_url.rstrip('/')}/api/v1/storage/{bucket_name}"
+
+    def get_path(self, bucket_name : str, url : str):
+        # The host of the URL depends on the request that built it, so only its path is compared.
+        prefix = f"/api/v1/storage/{bucket_name}/"
+        url_path = urlsplit(url).path if url else ''
+        if url_path.startswith(prefix):
+            return unquote(url_path[len(prefix):])
+        return super().get_path(bucket_name, url)
+
+STORAGE_BUCKETS = ('FILES', 'WEIGHTS', 'PROFILE_IMAGES')
+
+STORAGE_BACKENDS = {
+    'supabase': SupabaseBackend,
+    'local': LocalBackend
+}
+
+def get_storage_backend(bucket : str):
+    """
+    Gets the storage backend of a bucket, selected by `STORAGE_BACKEND_<bucket>` (e.g. `STORAGE_BACKEND_FILES`),
+    otherwise by `STORAGE_BACKEND` (`supabase` or `local`).
+
+    Parameters:
+        `bucket`: The bucket, e.g. `FILES`, `WEIGHTS`, or `PROFILE_IMAGES`.
+
+    Returns:
+        `StorageBackend`: The storage backend of the bucket.
+
+    Raises:
+        `ValueError`: If the selected backend isn't one of the `STORAGE_BACKENDS`.
+    """
+    config = current_app.config
+    name = config.get(f"STORAGE_BACKEND_{bucket}") or config.get('STORAGE_BACKEND') or 'supabase'
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"The storage backend {name!r} of the bucket {bucket} must be one of: {', '.join(STORAGE_BACKENDS)}.")
+    if name == 'local':
+        return LocalBackend(config.get('STORAGE_LOCAL_ROOT') or 'storage')
+    return STORAGE_BACKENDS[name]()
+
+def check_storage_backends(app):
+    """
+    Checks the storage backend of every bucket at startup, so a misspelled `STORAGE_BACKEND` stops the application
+    instead of failing its storage requests.
+
+    Parameters:
+        `app`: The Flask application.
+
+    Raises:
+        `ValueError`: If the backend of a bucket isn't one of the `STORAGE_BACKENDS`.
+    """
+    with app.app_context():
+        for bucket in STORAGE_BUCKETS:
+            get_storage_backend(bucket)
@@ -1,20 +1,34 @@
+from mimetypes import guess_type
 from flask import current_app, jsonify
-from supabase import create_client
-from src.constants.status_codes import HTTP_200_OK
+from src.constants.status_codes import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_409_CONFLICT, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_501_NOT_IMPLEMENTED
+from src.helpers.concurrency_utils import map_concurrently
+from src.helpers.storage_utils import LocalBackend, get_bucket_type, get_storage_backend
+from src.helpers.timing_utils import span
 
-def get_bucket_type(bucket : str):
+def get_storage_error(error : Exception):
     """
-    Gets the bucket type from the bucket name.
+    Gets the message and status code of an error raised by a storage backend.
     
     Parameters:
-        `bucket`: The bucket name that the user want to get the type.
+        `error`: The error raised by the backend, e.g. a `StorageException` of Supabase, whose first argument is its response.
         
     Returns:
-        `str`: The bucket type.
+        `tuple`: The `error` message and the status code.
     """
-    return current_app.config.get(f"SUPABASE_BUCKET_{bucket}")
+    if error.args and type(error.args[0]) is dict:
+        return error.args[0].get('error', str(error)) + '.', int(error.args[0].get('statusCode', HTTP_500_INTERNAL_SERVER_ERROR))
+    if isinstance(error, FileExistsError):
+        return 'Duplicate.', HTTP_409_CONFLICT
+    if isinstance(error, FileNotFoundError):
+        return 'Not found.', HTTP_404_NOT_FOUND
+    if isinstance(error, ValueError):
+        return 'Invalid path.', HTTP_400_BAD_REQUEST
+    if isinstance(error, NotImplementedError):
+        return 'Not supported by the storage backend.', HTTP_501_NOT_IMPLEMENTED
+    return f"{error}.", HTTP_500_INTERNAL_SERVER_ERROR
 
-def upload_file_to_bucket(bucket : str, name : str, data : bytes):
+
+def upload_file_to_bucket(bucket : str, name : str, data : bytes, content_type : str = None, upsert : bool = False):
     """
     Uploads a file to a specified bucket.
     
@@ -23,67 +37,189 @@ def upload_file_to_bucket(bucket : str, name : str, data : bytes):
         
         `name`: The name of the file.
         
-        `data`: The data of the file as bytes.
+        `data`: The data of the file as bytes, or a spooled upload.
+        
+        `content_type`: The content type of the data. Defaults to the one guessed from the extension of the name.
+        
+        `upsert`: Whether to overwrite the file if it already exists, instead of failing.
         
     Returns:
-        `str`: The public url of the file.
+        `str`: The path of the file in the bucket, i.e. its `name`, which is stored instead of its URL.
         
         `JSON Supabase Response`: If there is an error while uploading the file to Supabase.
     """
     try:
-        supabase = create_client(current_app.config['SUPABASE_URL'], current_app.config['SUPABASE_KEY'])
-        content_type = {"content-type": f"image/{name.split('.')[-1]}"}
-        supabase.storage.from_(get_bucket_type(bucket)).upload(name, data, content_type)
-        return get_file_url_by_name(bucket, name)
+        with span('storage_upload'):
+            content_type = content_type or guess_type(name)[0] or f"image/{name.split('.')[-1]}"
+            get_storage_backend(bucket).upload(get_bucket_type(bucket), name, data, content_type, upsert)
+        return name
     except Exception as e:
+        error, status_code = get_storage_error(e)
         return jsonify({
-            'error': e.args[0]['error'] + '.',
+            'error': error,
             'message': 'Failed to upload the file to the bucket. File URL retrieval failed.'
-        }), e.args[0]['statusCode']
+        }), status_code
 
-def get_file_url_by_name(bucket : str, name : str):
+def create_signed_upload_url(bucket : str, name : str):
     """
-    Gets the public url of a file from a specified bucket.
+    Creates a signed URL that a client uploads a file to directly, so the file doesn't pass through the application.
     
     Parameters:
-        `bucket`: The bucket name that the user want to get the file.
+        `bucket`: The bucket name that the client will upload the file.
         
         `name`: The name of the file.
         
     Returns:
-        `str`: The public url of the file.
+        `dict`: The signed `upload_url`, its `token`, and the number of seconds it `expires_in`.
         
-        `JSON Supabase Response`: If there is an error while getting the file url from Supabase.
+        `JSON Supabase Response`: If there is an error while signing the URL, or `501` if the backend can't sign URLs.
     """
     try:
-        supabase = create_client(current_app.config['SUPABASE_URL'], current_app.config['SUPABASE_KEY'])
-        return supabase.storage.from_(get_bucket_type(bucket)).get_public_url(name)
+        with span('storage_sign'):
+            return get_storage_backend(bucket).create_upload_url(get_bucket_type(bucket), name)
     except Exception as e:
+        error, status_code = get_storage_error(e)
         return jsonify({
-            'error': e.args[0]['error'] + '.',
-            'message': 'File URL retrieval failed.'
-        }), e.args[0]['statusCode']
+            'error': error,
+            'message': 'Failed to create the upload URL.'
+        }), status_code
 
-def delete_file_by_name(bucket : str, name : str):
+def read_file_header(bucket : str, name : str, length : int):
     """
-    Deletes a file from a specified bucket.
+    Reads the size and the beginning of a file of a specified bucket, without downloading the rest of it.
     
     Parameters:
-        `bucket`: The bucket name that the user want to delete the file.
+        `bucket`: The bucket name of the file.
         
         `name`: The name of the file.
         
+        `length`: The maximum number of bytes to be read, e.g. enough for the header of an image.
+        
     Returns:
-        `JSON Response (200)`: The response from the server with the file details.
-    
-        `JSON Supabase Response`: If there is an error while deleting the file from Supabase.
+        `tuple`: The size of the file in bytes, and its first `length` bytes.
+        
+        `JSON Supabase Response`: If there is an error while retrieving the file.
     """
+    backend = get_storage_backend(bucket)
     try:
-        supabase = create_client(current_app.config['SUPABASE_URL'], current_app.config['SUPABASE_KEY'])
-        supabase.storage.from_(get_bucket_type(bucket)).remove(name)
-        return HTTP_200_OK
+        with span('storage_read'):
+            byte_size = backend.get_size(get_bucket_type(bucket), name)
+            if not byte_size:
+                return 0, b''
+            return byte_size, backend.read_head(get_bucket_type(bucket), name, min(length, byte_size))
     except Exception as e:
+        error, status_code = get_storage_error(e)
         return jsonify({
-            'error': e.args[0]['error'] + '.',
-            'message': 'File deletion failed.'
-        }), e.args[0]['statusCode']
\ No newline at end of file
+            'error': error,
+            'message': 'Failed to retrieve the file from the bucket.'
+        }), status_code
+
+def get_bucket_url(bucket : str):
+    """
+    Gets the public URL of a bucket, i.e. `STORAGE_PUBLIC_URL` if the files are served through a CDN,
+    otherwise the public URL of Supabase Storage, or `/api/v1/storage` on the local disk.
+    
+    Parameters:
+        `bucket`: The bucket name that the user want to get the URL.
+        
+    Returns:
+        `str`: The public URL of the bucket, without a trailing slash.
+    """
+    return get_storage_backend(bucket).get_public_url(get_bucket_type(bucket))
+
+def get_file_url_by_name(bucket : str, name : str):
+    """
+    Gets the public url of a file from a specified bucket. The URL is computed from the configuration, without a request.
+    
+    Parameters:
+        `bucket`: The bucket name that the user want to get the file.
+        
+        `name`: The name of the file.
+        
+    Returns:
+        `str`: The public url of the file.
+    """
+    return f"{get_bucket_url(bucket)}/{name}"
+
+def get_file_url(bucket : str, path : str):
+    """
+    Gets the public url of a stored path, when a row is serialized.
+    
+    Parameters:
+        `bucket`: The bucket name of the file.
+        
+        `path`: The path of the file in the bucket. An absolute URL, e.g. of an image hosted elsewhere, is kept as it is.
+        
+    Returns:
+        `str`: The public url of the file, or none if there is no path.
+    """
+    if not path:
+        return None
+    if '://' in path:
+        return path
+    return get_file_url_by_name(bucket, path)
+
+def get_file_path(bucket : str, url : str):
+    """
+    Gets the path of a file from its public url, so that the path is stored instead.
+    
+    Parameters:
+        `bucket`: The bucket name of the file.
+        
+        `url`: The public url of the file.
+        
+    Returns:
+        `str`: The path of the file in the bucket, or the url itself if it isn't in the bucket.
+    """
+    path = get_storage_backend(bucket).get_path(get_bucket_type(bucket), url)
+    return url if path is None else path
+
+def read_file_by_url(bucket : str, url : str):
+    """
+    Reads a file of a local bucket from its public url on the disk instead of requesting it over HTTP.
+    The files of the other backends are left to be downloaded through their public url, e.g. from the CDN.
+    
+    Parameters:
+        `bucket`: The bucket name of the file.
+        
+        `url`: The public url of the file.
+        
+    Returns:
+        `bytes`: The data of the file, or none if the bucket isn't local or the url isn't in the bucket.
+    """
+    backend = get_storage_backend(bucket)
+    if not isinstance(backend, LocalBackend):
+        return None
+    path = backend.get_path(get_bucket_type(bucket), url)
+    if path is None:
+        return None
+    with backend.read(get_bucket_type(bucket), path) as file:
+        return file.read()
+
+def delete_files_by_name(bucket : str, names : list[str]):
+    """
+    Deletes several files from a specified bucket. The names are removed in chunks of `STORAGE_DELETE_CHUNK_SIZE`
+    per request, and the chunks are sent concurrently up to `IO_CONCURRENCY`.
+    
+    Parameters:
+        `bucket`: The bucket name that the user want to delete the files.
+        
+        `names`: The names of the files.
+        
+    Returns:
+        `list[dict]`: The `name` and `error` of each file that failed to be deleted, which is empty if every file was deleted.
+    """
+    chunk_size = int(current_app.config.get('STORAGE_DELETE_CHUNK_SIZE') or 100)
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    backend = get_storage_backend(bucket)
+    
+    def delete_chunk(chunk : list[str]):
+        try:
+            with span('storage_delete'):
+                backend.delete(get_bucket_type(bucket), chunk)
+            return []
+        except Exception as e:
+            error = e.args[0].get('error', str(e)) if e.args and type(e.args[0]) is dict else str(e)
+            return [{'name': name, 'error': error} for name in chunk]
+    
+    return [failure for failures in map_concurrently(delete_chunk, chunks) for failure in failures]
\ No newline at end of file
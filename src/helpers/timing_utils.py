@@ -0,0 +1,164 @@
+from bisect import bisect_left
+from contextlib import nullcontext
+from threading import Lock
+from time import perf_counter
+from flask import current_app, g, has_app_context, has_request_context, request
+
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+_null_span = nullcontext()
+
+class StageHistograms:
+    """
+    Aggregates the durations of the pipeline stages of the process into fixed-bucket histograms.
+    """
+    def __init__(self, buckets : tuple = HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = Lock()
+
+    def observe(self, stage : str, duration_ms : float):
+        """
+        Records the duration of a stage.
+
+        Parameters:
+            `stage`: The name of the stage.
+
+            `duration_ms`: The duration in milliseconds.
+        """
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.buckets)}
+            histogram['count'] += 1
+            histogram['sum'] += duration_ms
+            histogram['max'] = max(histogram['max'], duration_ms)
+            histogram['buckets'][bisect_left(self.buckets, duration_ms)] += 1
+
+    def _get_percentile(self, histogram : dict, percentile : float):
+        rank = histogram['count'] * percentile
+        seen = 0
+        for bound, count in zip(self.buckets, histogram['buckets']):
+            seen += count
+            if seen >= rank:
+                return histogram['max'] if bound == float('inf') else bound
+        return histogram['max']
+
+    def stats(self):
+        """
+        Gets the histograms of every stage.
+
+        Returns:
+            `dict`: The `count`, `mean_ms`, `max_ms`, the upper bounds of `p50_ms`, `p95_ms`, and `p99_ms`, and the
+            cumulative `buckets` of each stage.
+        """
+        with self._lock:
+            stats = {}
+            for stage, histogram in self._stages.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    cumulative += count
+                    buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+                stats[stage] = {
+                    'count': histogram['count'],
+                    'mean_ms': round(histogram['sum'] / histogram['count'], 3),
+                    'max_ms': round(histogram['max'], 3),
+                    'p50_ms': self._get_percentile(histogram, 0.5),
+                    'p95_ms': self._get_percentile(histogram, 0.95),
+                    'p99_ms': self._get_percentile(histogram, 0.99),
+                    'buckets': buckets
+                }
+            return stats
+
+    def clear(self):
+        """
+        Removes every histogram.
+        """
+        with self._lock:
+            self._stages.clear()
+
+stage_histograms = StageHistograms()
+
+class Span:
+    """
+    Times a stage of the pipeline. Use `span` instead so that nothing is timed while `SERVER_TIMING_ENABLED` is off.
+
+    Parameters:
+        `stage`: The name of the stage.
+    """
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage : str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_timing(self.stage, (perf_counter() - self.start) * 1000)
+        return False
+
+def is_timing_enabled():
+    """
+    Checks if the stages are timed.
+
+    Returns:
+        `bool`: True if there is an application context and `SERVER_TIMING_ENABLED` is on, otherwise False.
+    """
+    return has_app_context() and bool(current_app.config.get('SERVER_TIMING_ENABLED'))
+
+def span(stage : str):
+    """
+    Times a stage of the pipeline.
+
+    Parameters:
+        `stage`: The name of the stage, e.g. `download`, `predict`, or `storage_upload`.
+
+    Example:
+        >>> with span('encode'):
+        >>>     image.save(buf, format='PNG')
+
+    Returns:
+        `Span`: The context manager that records the duration, otherwise a no-op one if timing is disabled.
+    """
+    return Span(stage) if is_timing_enabled() else _null_span
+
+def record_timing(stage : str, duration_ms : float):
+    """
+    Records the duration of a stage in the histograms and, within a request, in its `Server-Timing` header.
+
+    Parameters:
+        `stage`: The name of the stage.
+
+        `duration_ms`: The duration in milliseconds.
+    """
+    stage_histograms.observe(stage, duration_ms)
+    if has_request_context():
+        timings = g.setdefault('server_timings', [])
+        timings.append((stage, duration_ms))
+
+def init_server_timing(app):
+    """
+    Registers the hooks that time every request and emit its stages as a `Server-Timing` header.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    @app.before_request
+    def start_request_timer():
+        if app.config.get('SERVER_TIMING_ENABLED'):
+            g.request_started_at = perf_counter()
+
+    @app.after_request
+    def add_server_timing_header(response):
+        started_at = g.get('request_started_at')
+        if started_at is None:
+            return response
+
+        total_ms = (perf_counter() - started_at) * 1000
+        stage_histograms.observe(f"request:{request.endpoint}", total_ms)
+        timings = [f"{stage};dur={duration_ms:.2f}" for stage, duration_ms in g.get('server_timings', [])]
+        timings.append(f"total;dur={total_ms:.2f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,123 @@
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from flask import Request, current_app, jsonify
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from src.constants.status_codes import HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+class UploadSpool:
+    """
+    A binary file that keeps an upload in memory up to `max_memory` bytes, then rolls it over to a named temporary file.
+    The name lets the storage client stream the file from the disk instead of reading it back into memory.
+
+    Parameters:
+        `max_memory`: The number of bytes kept in memory before rolling over to the disk.
+
+        `directory`: The directory of the temporary file. Defaults to the temporary directory of the system.
+    """
+    def __init__(self, max_memory : int, directory : str = None):
+        self.max_memory = max_memory
+        self.directory = directory
+        self.path = None
+        self._file = BytesIO()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    def write(self, data):
+        written = self._file.write(data)
+        if self.path is None and self._file.tell() > self.max_memory:
+            self._rollover()
+        return written
+
+    def _rollover(self):
+        # The temporary file is deleted once it is closed, which Flask does when the request ends.
+        file = NamedTemporaryFile(dir=self.directory, prefix='upload-')
+        file.write(self._file.getbuffer())
+        file.seek(self._file.tell())
+        self._file = file
+        self.path = file.name
+
+    def get_size(self):
+        """
+        Gets the size of the upload without reading it.
+
+        Returns:
+            `int`: The size in bytes.
+        """
+        position = self._file.tell()
+        size = self._file.seek(0, 2)
+        self._file.seek(position)
+        return size
+
+class SpooledUploadRequest(Request):
+    """
+    The request of the application, whose uploaded files are spooled to an `UploadSpool` bounded by `UPLOAD_SPOOL_MAX_MEMORY`.
+    The whole body is capped by `MAX_CONTENT_LENGTH` and the non-file form fields by `UPLOAD_MAX_FORM_MEMORY`.
+    """
+    @property
+    def max_form_memory_size(self):
+        return int(current_app.config.get('UPLOAD_MAX_FORM_MEMORY') or 512 * 1024)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(int(current_app.config.get('UPLOAD_SPOOL_MAX_MEMORY') or 1024 * 1024), current_app.config.get('UPLOAD_TMP_DIR'))
+
+def get_file_stream(file_storage : FileStorage):
+    """
+    Get the file from the request without reading it into memory.
+
+    Parameters:
+        `file_storage`: The file storage that the user want to get.
+
+    Returns:
+        `dict`: The file name, the `stream` rewound to its start, and its `size` in bytes.
+    """
+    stream = file_storage.stream
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+    return {
+        'name': secure_filename(file_storage.filename),
+        'stream': stream,
+        'size': size
+    }
+
+def handle_request_entity_too_large(error : RequestEntityTooLarge):
+    """
+    Handles a request whose body is larger than `MAX_CONTENT_LENGTH`.
+
+    Parameters:
+        `error`: The error raised by Werkzeug, before the body is read if the `Content-Length` header is too large.
+
+    Returns:
+        `JSON Response (413)`: The response from the server with the `error` and `max_bytes`.
+    """
+    return jsonify({
+        'error': 'File is too large.',
+        'max_bytes': current_app.config.get('MAX_CONTENT_LENGTH')
+    }), HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+def init_uploads(app):
+    """
+    Makes the application spool its uploads and reject the oversized ones with a JSON response.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    app.request_class = SpooledUploadRequest
+    app.register_error_handler(RequestEntityTooLarge, handle_request_entity_too_large)
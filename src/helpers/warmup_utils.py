@@ -0,0 +1,136 @@
+from datetime import datetime
+from threading import Lock, Thread
+from time import perf_counter
+from numpy import zeros, uint8
+from PIL import Image
+from extensions import db
+from src.helpers.encoder_utils import encode_image, get_encoder_options
+from src.helpers.file_utils import draw_boxes_on_image
+from src.helpers.job_utils import resume_pending_jobs
+from src.helpers.roboflow_utils import get_inference_backend
+from src.helpers.storage_utils import get_storage_client
+
+_warm_up_state = {'state': 'pending', 'started_at': None, 'finished_at': None, 'steps': {}}
+_warm_up_lock = Lock()
+
+def warm_up_model(app):
+    """
+    Preloads the default model handle, i.e. the `ROBOFLOW_PROJECT` model or the local weights of `LOCAL_MODEL_PATH`,
+    then predicts a blank image if `WARMUP_DUMMY_INFERENCE` is on.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    backend = get_inference_backend()
+    if app.config.get('WARMUP_DUMMY_INFERENCE'):
+        backend.predict(zeros((64, 64, 3), dtype=uint8))
+
+def warm_up_rendering(app):
+    """
+    Loads the fonts and the image plugins by drawing and encoding a dummy prediction with the `ANNOTATION_RENDERER`
+    and the `ANNOTATED_IMAGE_FORMAT`.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    image = Image.new('RGB', (64, 64))
+    prediction = {'x': 32, 'y': 32, 'width': 32, 'height': 32, 'confidence': 1.0, 'class': 'Good', 'class_id': 0}
+    encode_image(draw_boxes_on_image(image, [prediction]), **get_encoder_options())
+
+def warm_up_storage(app):
+    """
+    Imports and builds the pooled storage client of the process.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    if app.config.get('SUPABASE_URL') and app.config.get('SUPABASE_KEY'):
+        get_storage_client()
+
+WARM_UP_STEPS = {
+    'model': warm_up_model,
+    'rendering': warm_up_rendering,
+    'storage': warm_up_storage
+}
+
+def warm_up(app):
+    """
+    Runs every warm-up step, recording how long each one took. A failing step is recorded without stopping the others,
+    so that a flaky dependency doesn't keep the worker out of rotation forever.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    with _warm_up_lock:
+        _warm_up_state.update({'state': 'running', 'started_at': datetime.now(), 'steps': {}})
+    with app.app_context():
+        for name, step in WARM_UP_STEPS.items():
+            started_at = perf_counter()
+            try:
+                step(app)
+                result = {'ok': True}
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+            result['duration_ms'] = round((perf_counter() - started_at) * 1000, 2)
+            with _warm_up_lock:
+                _warm_up_state['steps'][name] = result
+    with _warm_up_lock:
+        _warm_up_state.update({'state': 'ready', 'finished_at': datetime.now()})
+
+def start_warm_up(app):
+    """
+    Starts the warm-up of the process if `WARMUP_ENABLED` is on, otherwise marks it as ready right away.
+    With `WARMUP_ASYNC`, the warm-up runs in a background thread so the worker can still answer health checks.
+    Under gunicorn's `preload_app`, the warm-up must run synchronously in the master so the forked workers share its state.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    if not app.config.get('WARMUP_ENABLED'):
+        with _warm_up_lock:
+            _warm_up_state.update({'state': 'ready', 'finished_at': datetime.now()})
+        return
+
+    if app.config.get('WARMUP_ASYNC') and not app.config.get('PRELOAD_APP'):
+        Thread(target=warm_up, args=(app,), name='warm-up', daemon=True).start()
+    else:
+        warm_up(app)
+
+def init_worker(app):
+    """
+    Starts the background work that belongs to a single worker process, like resuming the queued analysis jobs.
+    Under gunicorn's `preload_app`, this is called by the `post_worker_init` hook instead of `create_app`,
+    since the threads of the master process don't survive the fork.
+
+    The pooled database connections inherited from the master process are dropped first, without closing them,
+    so that the worker opens its own instead of sharing the sockets of the master and its siblings.
+
+    Parameters:
+        `app`: The Flask application.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    try:
+        resume_pending_jobs(app)
+    except Exception:
+        app.logger.exception('Failed to resume the pending analysis jobs.')
+
+def is_ready():
+    """
+    Checks if the warm-up of the process has finished.
+
+    Returns:
+        `bool`: True if the process is ready to serve requests, otherwise False.
+    """
+    return _warm_up_state['state'] == 'ready'
+
+def get_warm_up_state():
+    """
+    Gets the state of the warm-up of the process.
+
+    Returns:
+        `dict`: The `state`, `started_at`, `finished_at`, and the `steps` with their `ok`, `error`, and `duration_ms`.
+    """
+    with _warm_up_lock:
+        return {**_warm_up_state, 'steps': dict(_warm_up_state['steps'])}
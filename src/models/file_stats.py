@@ -0,0 +1,10 @@
+from extensions import db
+
+class FileStats(db.Model):
+    user_id = db.Column(db.String(50), primary_key=True)
+    weight_id = db.Column(db.String(50), primary_key=True, default='')
+    classification = db.Column(db.String(50), primary_key=True, default='')
+    day = db.Column(db.Date, primary_key=True)
+    confidence_bucket = db.Column(db.Integer, primary_key=True, default=-1)
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0)
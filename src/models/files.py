@@ -2,6 +2,11 @@ from extensions import db
 from datetime import datetime
 
 class Files(db.Model):
+    __table_args__ = (
+        db.Index('ix_files_user_id_name', 'user_id', 'name'),
+        db.Index('ix_files_user_id_weight_id', 'user_id', 'weight_id'),
+        db.Index('ix_files_user_id_created_at_id', 'user_id', 'created_at', 'id')
+    )
     id = db.Column(db.String(50), primary_key=True)
     user_id=db.Column(db.String(50), db.ForeignKey('users.id'))
     weight_id=db.Column(db.String(50), db.ForeignKey('weights.id'))
@@ -11,7 +16,13 @@ class Files(db.Model):
     classification=db.Column(db.String(50), nullable=True)
     accuracy=db.Column(db.String(50), nullable=True)
     error_rate=db.Column(db.String(50), nullable=True)
+    width=db.Column(db.Integer, nullable=True)
+    height=db.Column(db.Integer, nullable=True)
+    byte_size=db.Column(db.BigInteger, nullable=True)
+    confidence=db.Column(db.Float, nullable=True)
     url=db.Column(db.Text, nullable=True)
-    created_at=db.Column(db.DateTime, default=datetime.now())
-    updated_at=db.Column(db.DateTime, onupdate=datetime.now())
+    source_url=db.Column(db.Text, nullable=True)
+    predictions=db.Column(db.Text, nullable=True)
+    created_at=db.Column(db.DateTime, default=datetime.now)
+    updated_at=db.Column(db.DateTime, onupdate=datetime.now)
         
\ No newline at end of file
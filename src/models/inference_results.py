@@ -0,0 +1,7 @@
+from extensions import db
+from datetime import datetime
+
+class InferenceResults(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    predictions = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
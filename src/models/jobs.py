@@ -0,0 +1,13 @@
+from extensions import db
+from datetime import datetime
+
+class Jobs(db.Model):
+    id = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.String(50), db.ForeignKey('users.id'))
+    type = db.Column(db.String(50), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,6 @@
+from extensions import db
+from datetime import datetime
+
+class SchemaMigrations(db.Model):
+    version = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,9 @@
+from extensions import db
+from datetime import datetime
+
+class StoredObjects(db.Model):
+    bucket = db.Column(db.String(50), primary_key=True)
+    path = db.Column(db.String(255), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=1)
+    missing = db.Column(db.Boolean, nullable=True, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,17 @@
+from extensions import db
+from datetime import datetime
+
+class Uploads(db.Model):
+    __table_args__ = (
+        db.Index('ix_uploads_user_id_path', 'user_id', 'path'),
+    )
+    id = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.String(50), db.ForeignKey('users.id'))
+    name = db.Column(db.String(50), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    byte_size = db.Column(db.BigInteger, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
@@ -2,6 +2,10 @@ from extensions import db
 from datetime import datetime
 
 class Weights(db.Model):
+    __table_args__ = (
+        db.Index('ix_weights_user_id', 'user_id'),
+        db.Index('ix_weights_user_id_created_at_id', 'user_id', 'created_at', 'id')
+    )
     id = db.Column(db.String(50), primary_key=True)
     user_id=db.Column(db.String(50), db.ForeignKey('users.id'))
     workspace=db.Column(db.String(50), nullable=True)
@@ -9,7 +13,8 @@ class Weights(db.Model):
     api_key=db.Column(db.String(50),unique=False, nullable=False)
     version=db.Column(db.Integer, nullable=True)
     model_type=db.Column(db.String(50), nullable=True)
-    created_at=db.Column(db.DateTime, default=datetime.now())
-    updated_at=db.Column(db.DateTime, onupdate=datetime.now())
+    model_path=db.Column(db.String(255), nullable=True)
+    created_at=db.Column(db.DateTime, default=datetime.now)
+    updated_at=db.Column(db.DateTime, onupdate=datetime.now)
     type=db.Column(db.String(50), nullable=False)
         
\ No newline at end of file
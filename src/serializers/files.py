@@ -0,0 +1,22 @@
+from src.helpers.format_utils import format_accuracy, format_dimensions, format_error_rate, format_size
+from src.helpers.serializer_utils import Field, Schema
+from src.helpers.supabase_utils import get_file_url
+from src.models.files import Files
+
+# The rows saved before the metrics were typed, and not backfilled yet, fall back to their formatted strings.
+FILE_SCHEMA = Schema({
+    'id': Field(Files.id),
+    'name': Field(Files.name),
+    'dimensions': Field(Files.width, Files.height, Files.dimensions, serialize=lambda file: format_dimensions(file.width, file.height) or file.dimensions),
+    'size': Field(Files.byte_size, Files.size, serialize=lambda file: format_size(file.byte_size) or file.size),
+    'url': Field(Files.url, serialize=lambda file: get_file_url("FILES", file.url)),
+    'classification': Field(Files.classification),
+    'accuracy': Field(Files.confidence, Files.accuracy, serialize=lambda file: format_accuracy(file.confidence) or file.accuracy),
+    'error_rate': Field(Files.confidence, Files.error_rate, serialize=lambda file: format_error_rate(file.confidence) or file.error_rate),
+    'weight_id': Field(Files.weight_id),
+    'created_at': Field(Files.created_at),
+    'updated_at': Field(Files.updated_at)
+})
+
+# The fields returned when a file is saved.
+FILE_DETAILS = ['id', 'name', 'dimensions', 'size', 'url', 'classification', 'accuracy', 'error_rate']
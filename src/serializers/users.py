@@ -0,0 +1,18 @@
+from src.helpers.serializer_utils import Field, Schema
+from src.helpers.supabase_utils import get_file_url
+from src.models.users import Users
+
+USER_SCHEMA = Schema({
+    'id': Field(Users.id),
+    'username': Field(Users.username),
+    'email': Field(Users.email),
+    'profile_image': Field(Users.profile_image, serialize=lambda user: get_file_url("PROFILE_IMAGES", user.profile_image)),
+    'created_at': Field(Users.created_at),
+    'updated_at': Field(Users.updated_at)
+})
+
+# The fields returned when a user is edited.
+USER_DETAILS = ['id', 'username', 'email', 'created_at', 'updated_at']
+
+# The fields returned when a user logs in. The hash of the password is selected along to be checked, but never returned.
+LOGIN_USER_FIELDS = ['id', 'username', 'email', 'profile_image']
@@ -0,0 +1,17 @@
+from src.helpers.serializer_utils import Field, Schema
+from src.models.weights import Weights
+
+WEIGHT_SCHEMA = Schema({
+    'id': Field(Weights.id),
+    'user_id': Field(Weights.user_id),
+    'project_name': Field(Weights.project_name),
+    'api_key': Field(Weights.api_key),
+    'version': Field(Weights.version),
+    'model_type': Field(Weights.model_type),
+    'type': Field(Weights.type),
+    'created_at': Field(Weights.created_at),
+    'udpated_at': Field(Weights.updated_at)
+})
+
+# The fields of the weights returned when a user logs in.
+LOGIN_WEIGHT_FIELDS = ['id', 'user_id', 'project_name', 'api_key', 'version', 'model_type']
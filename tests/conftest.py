@@ -0,0 +1,38 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from extensions import db
+from src.models.file_stats import FileStats
+from src.models.files import Files
+from src.models.inference_results import InferenceResults
+from src.models.jobs import Jobs
+from src.models.schema_migrations import SchemaMigrations
+from src.models.stored_objects import StoredObjects
+from src.models.uploads import Uploads
+from src.models.users import Users
+from src.models.weights import Weights
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        JWT_SECRET_KEY='test-secret-of-the-inspector-api-tests',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        STORAGE_BACKEND='local',
+        STORAGE_LOCAL_ROOT=str(tmp_path / 'storage'),
+        SUPABASE_BUCKET_FILES='files',
+        SUPABASE_BUCKET_WEIGHTS='weights',
+        SUPABASE_BUCKET_PROFILE_IMAGES='profile-images'
+    )
+    db.init_app(app)
+    JWTManager(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def auth_headers(app):
+    return {'Authorization': f"Bearer {create_access_token(identity='user')}"}
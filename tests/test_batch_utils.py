@@ -0,0 +1,53 @@
+from threading import Event
+import pytest
+from src.helpers.batch_utils import MicroBatcher
+
+class FakeBackend:
+    name = 'fake'
+
+    def __init__(self, release : Event = None):
+        self.model = object()
+        self.batches = []
+        self.release = release
+
+    def predict(self, image, confidence=20, overlap=30):
+        if image == 'bad':
+            raise ValueError('Bad image.')
+        return {'predictions': [image]}
+
+    def predict_batch(self, images, confidence=20, overlap=30):
+        self.batches.append(images)
+        if self.release is not None:
+            assert self.release.wait(5)
+        return [self.predict(image, confidence, overlap) for image in images]
+
+def test_the_images_of_a_model_are_predicted_together():
+    batcher = MicroBatcher(max_batch_size=3, max_wait=5)
+    backend = FakeBackend()
+
+    futures = [batcher.submit(backend, image) for image in ('first', 'second', 'third')]
+
+    assert [future.result(timeout=5) for future in futures] == [{'predictions': [image]} for image in ('first', 'second', 'third')]
+    assert backend.batches == [['first', 'second', 'third']]
+
+def test_a_slow_model_does_not_hold_back_another_model():
+    release = Event()
+    slow, fast = FakeBackend(release), FakeBackend()
+    batcher = MicroBatcher(max_batch_size=1, max_wait=0, max_concurrency=2)
+
+    slow_future = batcher.submit(slow, 'slow')
+    assert batcher.submit(fast, 'fast').result(timeout=5) == {'predictions': ['fast']}
+    assert not slow_future.done()
+
+    release.set()
+    assert slow_future.result(timeout=5) == {'predictions': ['slow']}
+
+def test_a_failed_batch_is_retried_image_by_image():
+    batcher = MicroBatcher(max_batch_size=2, max_wait=5)
+    backend = FakeBackend()
+
+    good, bad = batcher.submit(backend, 'good'), batcher.submit(backend, 'bad')
+
+    assert good.result(timeout=5) == {'predictions': ['good']}
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
@@ -0,0 +1,36 @@
+from src.helpers import cache_utils
+from src.helpers.cache_utils import TTLCache
+
+def test_an_entry_expires_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_utils, 'monotonic', lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set('key', 'value')
+
+    now[0] += 5
+    assert cache.get('key') == 'value'
+    now[0] += 6
+    assert cache.get('key') is None
+
+def test_an_entry_that_does_not_expire_is_kept_until_it_is_evicted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_utils, 'monotonic', lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=10)
+    assert cache.get_or_set('model', lambda: 'loaded', expires=False) == 'loaded'
+
+    now[0] += 3600
+    assert cache.get_or_set('model', lambda: 'reloaded', expires=False) == 'loaded'
+
+    cache.set('first', 1)
+    cache.set('second', 2)
+    assert cache.get('model') is None
+    assert cache.stats()['evictions'] == 1
+
+def test_the_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set('first', 1)
+    cache.set('second', 2)
+    cache.get('first')
+    cache.set('third', 3)
+
+    assert (cache.get('first'), cache.get('second'), cache.get('third')) == (1, None, 3)
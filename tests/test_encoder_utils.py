@@ -0,0 +1,30 @@
+from io import BytesIO
+import pytest
+from numpy import asarray, uint8, zeros
+from PIL import Image
+from src.helpers.encoder_utils import IMAGE_FORMATS, encode_image, get_encoder_options
+
+@pytest.mark.parametrize('image_format', list(IMAGE_FORMATS))
+def test_encode_image_encodes_an_ndarray(image_format):
+    image = zeros((32, 48, 3), dtype=uint8)
+    image[:, :, 0] = 255
+
+    encoded = encode_image(image, image_format, quality=95, compress_level=1)
+
+    assert encoded.format == image_format
+    assert encoded.content_type == IMAGE_FORMATS[image_format]['content_type']
+    decoded = Image.open(BytesIO(encoded.data))
+    assert decoded.format == image_format
+    assert decoded.size == (48, 32)
+    red, green, blue = asarray(decoded.convert('RGB'))[16, 24]
+    assert red > 200 and green < 50 and blue < 50
+
+def test_get_encoder_options_clamps_the_values_of_a_request():
+    options = get_encoder_options({'format': 'jpg', 'quality': '150', 'compress_level': '-1'})
+
+    assert options == {'format': 'JPEG', 'quality': 100, 'compress_level': 0}
+
+@pytest.mark.parametrize('values', [{'quality': 'high'}, {'compress_level': '1.5'}])
+def test_get_encoder_options_rejects_a_non_integer_value(values):
+    with pytest.raises(ValueError):
+        get_encoder_options(values)
@@ -0,0 +1,49 @@
+from io import BytesIO
+from uuid import uuid4
+import pytest
+from PIL import Image
+from extensions import db
+from src.controllers import files as files_controller
+from src.controllers.files import files
+from src.helpers import roboflow_utils
+from src.models.files import Files
+from src.models.weights import Weights
+
+@pytest.fixture
+def client(app, monkeypatch):
+    app.register_blueprint(files)
+    db.session.add(Weights(id='weights', user_id='user', project_name='custom', api_key='key', version=2, type='custom'))
+    db.session.commit()
+    predicted = []
+    def predict_image(image_meta, *model):
+        predicted.append(image_meta.array.shape)
+        return {'predictions': [{'x': 8, 'y': 8, 'width': 8, 'height': 8, 'confidence': 0.9, 'class': 'Good', 'class_id': 0}]}
+    monkeypatch.setattr(roboflow_utils, 'predict_image', predict_image)
+    monkeypatch.setattr(files_controller, 'uuid4', lambda: str(uuid4()))
+    client = app.test_client()
+    client.predicted = predicted
+    return client
+
+def get_image_bytes():
+    with BytesIO() as buf:
+        Image.new('RGB', (32, 16), (255, 0, 0)).save(buf, format='PNG')
+        return buf.getvalue()
+
+def test_upload_and_analyze_predicts_the_spooled_upload(client, auth_headers):
+    for _ in range(2):
+        response = client.post('/api/v1/files/upload-and-analyze', headers=auth_headers, data={
+            'weight_id': 'weights', 'format': 'png', 'file': (BytesIO(get_image_bytes()), 'image.png')
+        })
+        assert response.status_code == 201
+
+    assert response.json['classification'] == 'Good'
+    assert client.predicted == [(16, 32, 3), (16, 32, 3)]
+    assert db.session.query(Files).count() == 2
+
+def test_upload_and_analyze_rejects_a_file_that_is_not_an_image(client, auth_headers):
+    response = client.post('/api/v1/files/upload-and-analyze', headers=auth_headers, data={
+        'weight_id': 'weights', 'file': (BytesIO(b'not an image'), 'image.png')
+    })
+
+    assert response.status_code == 415
+    assert client.predicted == []
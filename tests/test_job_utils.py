@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from flask import jsonify
+from extensions import db
+from src.helpers import job_utils
+from src.helpers.job_utils import JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, reserve_job_slot, resume_pending_jobs, run_job, submit_job
+from src.models.jobs import Jobs
+
+@pytest.fixture
+def jobs(app, monkeypatch):
+    app.config.update(ANALYSIS_QUEUE_SIZE=2, ANALYSIS_JOB_TIMEOUT=60)
+    monkeypatch.setattr(job_utils, '_pending_jobs', 0)
+    handled = []
+    def analyze(user_id, payload):
+        handled.append(payload['url'])
+        return jsonify({'url': payload['url']}), 201
+    monkeypatch.setitem(job_utils.JOB_HANDLERS, 'analyze', analyze)
+    scheduled = []
+    monkeypatch.setattr(job_utils, 'schedule_job', scheduled.append)
+    return handled, scheduled
+
+def add_job(job_id, state, updated_at=None):
+    db.session.add(Jobs(id=job_id, user_id='user', type='analyze', state=state, payload='{"url": "image.png"}', updated_at=updated_at))
+    db.session.commit()
+
+def get_state(job_id):
+    return db.session.execute(db.select(Jobs.state).where(Jobs.id == job_id)).scalar_one()
+
+def test_a_job_is_only_run_by_the_worker_that_claims_it(app, jobs):
+    handled, _ = jobs
+    add_job('queued', JOB_QUEUED)
+    add_job('running', JOB_RUNNING)
+
+    for job_id in ('queued', 'queued', 'running'):
+        assert reserve_job_slot()
+        run_job(app, job_id)
+
+    assert handled == ['image.png']
+    assert (get_state('queued'), get_state('running')) == (JOB_SUCCEEDED, JOB_RUNNING)
+    assert job_utils._pending_jobs == 0
+
+def test_only_the_jobs_whose_lease_expired_are_queued_again(app, jobs):
+    _, scheduled = jobs
+    add_job('expired', JOB_RUNNING, datetime.now() - timedelta(minutes=5))
+    add_job('alive', JOB_RUNNING, datetime.now())
+
+    assert resume_pending_jobs(app) == 1
+    assert scheduled == ['expired']
+    assert (get_state('expired'), get_state('alive')) == (JOB_QUEUED, JOB_RUNNING)
+
+def test_a_full_queue_rejects_new_jobs(app, jobs):
+    _, scheduled = jobs
+    def reserve(_):
+        with app.app_context():
+            return reserve_job_slot()
+    with ThreadPoolExecutor(8) as executor:
+        reserved = list(executor.map(reserve, range(8)))
+    assert reserved.count(True) == 2
+
+    assert submit_job('analyze', 'user', {'url': 'image.png'}) is None
+    assert db.session.query(Jobs).count() == 0 and scheduled == []
+
+def test_the_resume_is_capped_at_the_queue_size(app, jobs):
+    _, scheduled = jobs
+    for i in range(3):
+        add_job(str(i), JOB_QUEUED)
+    assert submit_job('analyze', 'user', {'url': 'image.png'}) is not None
+
+    assert resume_pending_jobs(app) == 1
+    assert job_utils._pending_jobs == 2
+    assert len(scheduled) == 2 and scheduled[1] == '0'
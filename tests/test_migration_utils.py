@@ -0,0 +1,58 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from extensions import db
+from src.helpers import migration_utils
+from src.helpers.migration_utils import DATA_MIGRATIONS, run_data_migrations, store_file_metrics
+from src.models.file_stats import FileStats
+from src.models.files import Files
+from src.models.schema_migrations import SchemaMigrations
+
+def add_files(count, url='main/user/image.jpg'):
+    for i in range(count):
+        db.session.add(Files(
+            id=f"file-{i}", user_id='user', name=f"{i}.jpg", url=url, dimensions='640x480', size='2.00 kB',
+            classification='Good', accuracy='85%', created_at=datetime(2024, 1, 1)
+        ))
+    db.session.commit()
+
+def get_applied_versions():
+    return set(db.session.execute(select(SchemaMigrations.version)).scalars())
+
+def test_the_migrations_run_without_supabase(app):
+    add_files(3)
+
+    assert run_data_migrations() == list(DATA_MIGRATIONS)
+    assert get_applied_versions() == set(DATA_MIGRATIONS)
+    assert db.session.execute(select(Files.url, Files.width, Files.height, Files.byte_size, Files.confidence)).first() == (
+        'main/user/image.jpg', 640, 480, 2048, 0.85
+    )
+    assert db.session.execute(select(func.sum(FileStats.file_count))).scalar() == 3
+    assert run_data_migrations() == []
+
+def test_the_public_urls_of_supabase_are_replaced_by_their_paths(app):
+    app.config['SUPABASE_URL'] = 'https://project.supabase.co'
+    add_files(1, 'https://project.supabase.co/storage/v1/object/public/files/main/user/image.jpg')
+
+    run_data_migrations()
+
+    assert db.session.execute(select(Files.url)).scalar() == 'main/user/image.jpg'
+
+def test_a_failed_migration_is_retried_without_blocking_the_next_ones(app, monkeypatch):
+    add_files(2)
+    def fail(connection):
+        raise ValueError('Broken migration.')
+    monkeypatch.setitem(DATA_MIGRATIONS, '0001_store_object_paths', fail)
+
+    assert run_data_migrations() == ['0002_store_file_metrics', '0003_store_file_stats']
+    assert get_applied_versions() == {'0002_store_file_metrics', '0003_store_file_stats'}
+    assert db.session.execute(select(func.sum(FileStats.file_count))).scalar() == 2
+
+    monkeypatch.setitem(DATA_MIGRATIONS, '0001_store_object_paths', migration_utils.store_object_paths)
+    assert run_data_migrations() == ['0001_store_object_paths']
+
+def test_the_metrics_are_backfilled_in_committed_batches(app):
+    add_files(5)
+    with db.engine.connect() as connection:
+        store_file_metrics(connection, batch_size=2)
+
+    assert db.session.execute(select(func.count()).where(Files.width == 640)).scalar() == 5
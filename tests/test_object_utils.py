@@ -0,0 +1,87 @@
+from os import path
+from threading import Barrier
+import pytest
+from extensions import db
+from src.helpers import object_utils
+from src.helpers.object_utils import add_reference, collect_garbage, delete_files, store_file
+from src.helpers.storage_utils import LocalBackend
+from src.helpers.supabase_utils import upload_file_to_bucket
+from src.models.files import Files
+from src.models.stored_objects import StoredObjects
+
+@pytest.fixture
+def content_addressed(app):
+    app.config['STORAGE_CONTENT_ADDRESSED'] = True
+    return app
+
+def get_stored_path(app, object_path):
+    return path.join(app.config['STORAGE_LOCAL_ROOT'], 'files', object_path)
+
+def add_file(file_id, url):
+    db.session.add(Files(id=file_id, user_id='user', name=file_id, url=url))
+    db.session.commit()
+
+def test_a_shared_file_is_removed_with_its_last_reference(content_addressed):
+    first = store_file("FILES", "main/user/aaimage.jpg", b"same")
+    second = store_file("FILES", "main/user/bbimage.jpg", b"same")
+    add_file('first', first)
+    add_file('second', second)
+
+    assert first == second
+    assert db.session.get(StoredObjects, ("FILES", first)).ref_count == 2
+
+    deleted, released = delete_files(db.session.query(Files).filter_by(id='first'))
+    db.session.commit()
+    assert (deleted, released, collect_garbage("FILES", released)) == (1, [], [])
+    assert path.exists(get_stored_path(content_addressed, first))
+
+    deleted, released = delete_files(db.session.query(Files).filter_by(id='second'))
+    db.session.commit()
+    assert (deleted, released, collect_garbage("FILES", released)) == (1, [first], [])
+    assert not path.exists(get_stored_path(content_addressed, first))
+    assert db.session.get(StoredObjects, ("FILES", first)) is None
+
+def test_a_file_referenced_while_it_is_removed_is_uploaded_again(content_addressed, monkeypatch):
+    stored_path = store_file("FILES", "main/user/aaimage.jpg", b"same")
+    add_file('first', stored_path)
+    _, released = delete_files(db.session.query(Files).filter_by(id='first'))
+    db.session.commit()
+
+    delete_files_by_name = object_utils.delete_files_by_name
+    def delete_while_referenced(bucket, names):
+        assert add_reference(bucket, stored_path)
+        return delete_files_by_name(bucket, names)
+    monkeypatch.setattr(object_utils, 'delete_files_by_name', delete_while_referenced)
+
+    assert collect_garbage("FILES", released) == []
+    stored_object = db.session.get(StoredObjects, ("FILES", stored_path))
+    assert (stored_object.ref_count, stored_object.missing) == (1, True)
+    assert not path.exists(get_stored_path(content_addressed, stored_path))
+
+    assert store_file("FILES", "main/user/bbimage.jpg", b"same") == stored_path
+    db.session.refresh(stored_object)
+    assert (stored_object.ref_count, stored_object.missing) == (2, False)
+    assert path.exists(get_stored_path(content_addressed, stored_path))
+
+def test_the_files_of_a_clear_are_removed_in_concurrent_chunks(app, monkeypatch):
+    app.config.update(STORAGE_DELETE_CHUNK_SIZE=2, IO_CONCURRENCY=3)
+    paths = [upload_file_to_bucket("FILES", f"main/user/{i}image.jpg", b"data") for i in range(5)]
+    for i, url in enumerate(paths):
+        add_file(str(i), url)
+
+    chunks = []
+    barrier = Barrier(3, timeout=5)
+    delete = LocalBackend.delete
+    def delete_together(self, bucket_name, names):
+        chunks.append(sorted(names))
+        barrier.wait()
+        delete(self, bucket_name, names)
+    monkeypatch.setattr(LocalBackend, 'delete', delete_together)
+
+    deleted, released = delete_files(db.session.query(Files).filter_by(user_id='user'))
+    db.session.commit()
+
+    assert deleted == 5
+    assert collect_garbage("FILES", released) == []
+    assert sorted(chunks) == [sorted(paths[0:2]), sorted(paths[2:4]), paths[4:]]
+    assert not any(path.exists(get_stored_path(app, url)) for url in paths)
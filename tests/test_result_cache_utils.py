@@ -0,0 +1,36 @@
+import pytest
+from src.helpers.result_cache_utils import MemoryResultCache, SQLResultCache, get_inference_cache_key
+
+MODEL = ('key', 'custom', 2)
+OTHER_MODEL = ('key', 'custom', 3)
+
+@pytest.fixture(params=[MemoryResultCache, SQLResultCache])
+def cache(request, app):
+    return request.param(max_size=10, ttl=60)
+
+def test_a_cached_result_is_shared_by_the_same_image_and_model(cache):
+    cache.set(get_inference_cache_key('image', MODEL, 20, 30), {'predictions': [{'class': 'Good'}]})
+
+    assert cache.get(get_inference_cache_key('image', MODEL, 20, 30)) == {'predictions': [{'class': 'Good'}]}
+    assert cache.get(get_inference_cache_key('image', MODEL, 50, 30)) is None
+    assert cache.get(get_inference_cache_key('image', OTHER_MODEL, 20, 30)) is None
+
+def test_a_redeployed_model_loses_its_cached_results(cache):
+    for content_hash in ('first', 'second'):
+        cache.set(get_inference_cache_key(content_hash, MODEL, 20, 30), {'predictions': []})
+    cache.set(get_inference_cache_key('first', OTHER_MODEL, 20, 30), {'predictions': []})
+
+    assert cache.invalidate_model(MODEL) == 2
+    assert cache.get(get_inference_cache_key('first', MODEL, 20, 30)) is None
+    assert cache.get(get_inference_cache_key('first', OTHER_MODEL, 20, 30)) == {'predictions': []}
+
+def test_the_sql_cache_overwrites_a_key_and_evicts_the_oldest_rows(app):
+    cache = SQLResultCache(max_size=2, ttl=60)
+    for i in range(3):
+        cache.set(get_inference_cache_key(str(i), MODEL, 20, 30), {'predictions': [i]})
+        cache._evicted_at = None
+    cache.set(get_inference_cache_key('2', MODEL, 20, 30), {'predictions': ['again']})
+
+    assert cache.get(get_inference_cache_key('0', MODEL, 20, 30)) is None
+    assert cache.get(get_inference_cache_key('2', MODEL, 20, 30)) == {'predictions': ['again']}
+    assert cache.stats()['size'] == 2
@@ -0,0 +1,42 @@
+from time import sleep
+import pytest
+from extensions import db
+from src.helpers import roboflow_utils
+from src.helpers.inference_utils import UnsupportedModelError
+from src.helpers.roboflow_utils import get_inference_backend, get_model_cache, get_model_key, invalidate_model
+from src.models.weights import Weights
+
+@pytest.fixture
+def local_backend(app, monkeypatch):
+    app.config.update(
+        INFERENCE_BACKEND='local', ROBOFLOW_PROJECT='lsc', ROBOFLOW_PRIVATE_API_KEY='private', LOCAL_MODEL_PATH='models/lsc'
+    )
+    monkeypatch.setattr(roboflow_utils, '_model_cache', None)
+    loads = []
+    monkeypatch.setattr(roboflow_utils, 'load_local_model', lambda model_path: loads.append(model_path) or model_path)
+    db.session.add(Weights(
+        id='weights', project_name='custom', api_key='key', version=2, model_path='models/custom', type='custom'
+    ))
+    db.session.commit()
+    return loads
+
+def test_the_local_backend_serves_the_deployed_weights(local_backend):
+    assert get_model_key('key', 'custom', 2) == ('local', 'models/custom', 0)
+    assert get_model_key() == ('local', 'models/lsc', 0)
+    assert get_model_key('key') == ('local', 'models/lsc', 0)
+    with pytest.raises(UnsupportedModelError):
+        get_model_key('other', 'custom', 2)
+    with pytest.raises(UnsupportedModelError):
+        get_model_key('key', 'custom', 3)
+
+def test_a_local_model_is_loaded_once_until_it_is_redeployed(app, local_backend):
+    app.config['MODEL_CACHE_TTL'] = 0.001
+    assert get_inference_backend('key', 'custom', 2).model == 'models/custom'
+    sleep(0.01)
+    assert get_inference_backend('key', 'custom', 2).model == 'models/custom'
+    assert local_backend == ['models/custom']
+    assert get_model_cache().ttl == 0.001
+
+    assert invalidate_model('key', 'custom', 2, 'models/custom') == 1
+    get_inference_backend('key', 'custom', 2)
+    assert local_backend == ['models/custom', 'models/custom']
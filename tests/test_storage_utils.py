@@ -0,0 +1,25 @@
+import pytest
+from src.controllers.storage import storage
+from src.helpers.storage_utils import LocalBackend, SupabaseBackend, check_storage_backends, get_storage_backend
+from src.helpers.supabase_utils import upload_file_to_bucket
+
+def test_the_backend_of_a_bucket_overrides_the_default(app):
+    app.config.update(STORAGE_BACKEND='supabase', STORAGE_BACKEND_FILES='local')
+
+    assert isinstance(get_storage_backend('FILES'), LocalBackend)
+    assert isinstance(get_storage_backend('WEIGHTS'), SupabaseBackend)
+
+def test_an_unknown_backend_stops_the_application(app):
+    app.config['STORAGE_BACKEND_WEIGHTS'] = 'lcoal'
+
+    with pytest.raises(ValueError, match="'lcoal' of the bucket WEIGHTS must be one of: supabase, local"):
+        check_storage_backends(app)
+
+def test_only_the_images_are_served_without_authentication(app):
+    app.register_blueprint(storage)
+    for bucket in ('FILES', 'WEIGHTS'):
+        upload_file_to_bucket(bucket, 'main/model.pt', b'data')
+    client = app.test_client()
+
+    assert client.get('/api/v1/storage/files/main/model.pt').data == b'data'
+    assert client.get('/api/v1/storage/weights/main/model.pt').status_code == 404
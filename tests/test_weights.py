@@ -0,0 +1,30 @@
+from extensions import db
+from src.controllers import weights as weights_controller
+from src.controllers.metrics import metrics
+from src.controllers.weights import weights
+from src.models.files import Files
+from src.models.weights import Weights
+
+def test_deleting_weights_invalidates_their_model(app, auth_headers, monkeypatch):
+    app.register_blueprint(weights)
+    invalidated = []
+    monkeypatch.setattr(weights_controller, 'invalidate_model', lambda *model: invalidated.append(model))
+    db.session.add(Weights(
+        id='5f0c6a3e-1d5b-4d6e-9a53-8a0f2b8f3c11', user_id='user', project_name='custom', api_key='key', version=2,
+        model_path='models/custom', type='custom'
+    ))
+    db.session.add(Files(id='file', user_id='user', weight_id='5f0c6a3e-1d5b-4d6e-9a53-8a0f2b8f3c11', name='image.jpg'))
+    db.session.commit()
+
+    response = app.test_client().delete('/api/v1/weights/5f0c6a3e-1d5b-4d6e-9a53-8a0f2b8f3c11/delete', headers=auth_headers)
+
+    assert response.status_code == 200
+    assert invalidated == [('key', 'custom', 2, 'models/custom')]
+    assert db.session.query(Weights).count() == db.session.query(Files).count() == 0
+
+def test_the_metrics_require_a_user(app, auth_headers):
+    app.register_blueprint(metrics)
+    client = app.test_client()
+
+    assert client.get('/api/v1/metrics/models').status_code == 401
+    assert client.get('/api/v1/metrics/models', headers=auth_headers).status_code == 200